@@ -1,5 +1,5 @@
+import asyncio
 import os
-import openai
 import firebase_admin
 from firebase_admin import credentials, firestore
 from fastapi import FastAPI, HTTPException
@@ -83,7 +83,45 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     print("⚠️ ATTENZIONE: Chiave API OpenAI mancante.")
     raise RuntimeError("❌ Chiave API non trovata.")
-client = openai.OpenAI(api_key=openai_api_key)
+
+# 🔌 Chiude il pool HTTP del gateway OpenAI allo shutdown
+from utils import llmGateway
+from dispatchers import logUtils
+from utils import localIntentModel
+from dispatchers import circuitBreaker
+from utils import usageLedger
+
+@app.on_event("startup")
+async def start_log_sink():
+    await logUtils.start()
+
+# 💥 Ripristina i circuit breaker aperti (se la persistenza è attiva)
+@app.on_event("startup")
+async def restore_circuit_breakers():
+    try:
+        await circuitBreaker.load_state()
+    except Exception as e:
+        print(f"⚠️ Ripristino circuit breaker fallito: {e}")
+
+# 🧠 Addestra in background il classificatore intent locale dagli intent_history
+@app.on_event("startup")
+async def train_local_intent_model():
+    async def _train():
+        try:
+            await localIntentModel.train_from_history()
+        except Exception as e:
+            print(f"⚠️ Addestramento intent locale fallito: {e}")
+    asyncio.create_task(_train())
+
+@app.on_event("shutdown")
+async def close_llm_gateway():
+    await llmGateway.close()
+
+# 🧾 Scrive i log ancora in buffer prima di uscire
+@app.on_event("shutdown")
+async def flush_log_sink():
+    await usageLedger.shutdown()
+    await logUtils.shutdown()
 
 # 🔥 Inizializza Firebase
 firebase_credentials_path = "E:/ATBot/backend/serviceAccountKey.json"
@@ -1,6 +1,6 @@
 from datetime import datetime
 from uuid import uuid4
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from dispatchers.logUtils import log_info, log_error
 from dispatchers.memoryUtils import get_memory  # ✅ Import memoria
 
@@ -18,7 +18,7 @@ async def handle_generic_action(context: dict) -> dict:
         log_info(user_id, "genericDispatcher", intent, context)  # 🟢 Log inizio
 
         # ✅ Salva un'azione generica nell'hub
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set({
+        await hub(user_id).actions.set(action_id, {
             "actionId": action_id,
             "type": intent,
             "status": "completed",
@@ -1,4 +1,5 @@
-from firebase_config import db
+from firebase_config import async_db
+from utils.hubRepository import hub, daily_stats_payload  # ⚡ Firestore async
 from datetime import datetime
 from uuid import uuid4
 from dispatchers.logUtils import log_info, log_error
@@ -23,8 +24,7 @@ async def handle(user_id: str, context: dict):
         log_info(user_id, "alertDispatcher", f"register_alert_{severity}", context)
 
         # 🔥 Scrivi l’alert nella collezione dedicata
-        alert_ref = db.collection("ai_agent_hub").document(user_id).collection("alerts").document(alert_id)
-        alert_ref.set({
+        await hub(user_id).collection("alerts").set(alert_id, {
             "alertId": alert_id,
             "title": title,
             "description": description,
@@ -33,8 +33,9 @@ async def handle(user_id: str, context: dict):
             "timestamp": now
         })
 
-        # 🔔 Crea una notifica IA per l’utente (collegata all’alert)
-        db.collection("notifications").add({
+        # 🔔 Crea una notifica IA per l’utente (collegata all’alert) + contatore giornaliero
+        batch = async_db.batch()
+        batch.set(async_db.collection("notifications").document(), {
             "userId": user_id,
             "type": "alert",
             "title": f"⚠️ {title}",
@@ -43,6 +44,8 @@ async def handle(user_id: str, context: dict):
             "read": False,
             "createdAt": now
         })
+        batch.set(hub(user_id).daily_stats_ref(), daily_stats_payload({"notifications_created": 1}), merge=True)
+        await batch.commit()
 
         output = {
             "status": "completed",
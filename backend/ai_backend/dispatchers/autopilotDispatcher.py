@@ -1,18 +1,17 @@
 from datetime import datetime, timedelta
 from uuid import uuid4
-import asyncio, math, httpx, random
+import asyncio, os, random
 
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from dispatchers.logUtils import log_info, log_error
-from dispatchers.memoryUtils import (
-    get_memory,          # memoria classica (30 gg)
-    get_vector_memory,   # 🔄 nuova: vettoriale, se disponibile
-)
+from dispatchers import circuitBreaker  # 💥 breaker in-process per utente/agente
+from dispatchers.memoryUtils import gather_memory_sources  # memoria classica + vettoriale
 # opz. se hai già un wrapper per inviare notifiche admin/email
 # from dispatchers.notifyUtils import notify_admin
 
 MAX_RETRIES = 3          # 🔁 retry per singolo task
-CB_THRESHOLD = 5         # 💥 circuit-breaker su 5 fallimenti in 15 min
+MAX_CONCURRENCY = int(os.getenv("AUTOPILOT_CONCURRENCY", "4"))        # ⚡ agenti in parallelo
+TASK_DEADLINE   = float(os.getenv("AUTOPILOT_TASK_DEADLINE", "90"))   # ⏱️ sec per task, retry inclusi
 
 def compute_priority_score(ctx: dict, negatives_30d: int) -> int:
     """Calcola un punteggio 0-100 da occupancy, ai_mode & feedback 👎"""
@@ -22,20 +21,29 @@ def compute_priority_score(ctx: dict, negatives_30d: int) -> int:
     raw = 50 + mode_bonus + occ_penalty - fb_penalty
     return max(0, min(100, round(raw)))
 
-async def safe_post(client: httpx.AsyncClient, url: str, json_payload: dict):
-    """POST con retry esponenziale; restituisce (success, result|exception)"""
+async def safe_dispatch(request):
+    """Dispatch in-process con retry esponenziale; restituisce (success, result|exception)"""
+    from routes.dispatchRoutes import dispatch_master_agent
     delay = 1
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            r = await client.post(url, json=json_payload, timeout=30)
-            r.raise_for_status()
-            return True, r.json()
+            result = await asyncio.wait_for(dispatch_master_agent(request), timeout=30)
+            return True, result
         except Exception as exc:
             if attempt == MAX_RETRIES:
                 return False, exc
             await asyncio.sleep(delay + random.random())
             delay *= 2
 
+async def run_task(task: str, request, semaphore: asyncio.Semaphore):
+    """Esegue un task della decision map entro la deadline, rispettando il cap di concorrenza"""
+    async with semaphore:
+        try:
+            success, result = await asyncio.wait_for(safe_dispatch(request), timeout=TASK_DEADLINE)
+        except asyncio.TimeoutError:
+            success, result = False, TimeoutError(f"deadline {TASK_DEADLINE}s superata")
+    return task, request, success, result
+
 async def handle(user_id: str, context: dict):
     now        = datetime.utcnow()
     action_id  = str(uuid4())
@@ -47,27 +55,18 @@ async def handle(user_id: str, context: dict):
         log_info(user_id, "autopilotDispatcher", "start", context)
 
         # ── 1️⃣ Contesto persistente (+ memoria classica & vettoriale) ──
-        state_ref = (
-            db.collection("ai_agent_hub").document(user_id)
-              .collection("context").document("state")
-        )
-        ctx_doc   = state_ref.get()
-        user_ctx  = ctx_doc.to_dict() if ctx_doc.exists else {}
-
-        # • memoria classica (30 gg)
-        memory = await get_memory(user_id)
-        # • memoria vettoriale (long-term) – se Pinecone/Weaviate configurato
-        vector_mem = await get_vector_memory(user_id, limit=100) or []
-        user_ctx.update({"memory": memory, "vector_memory": vector_mem})
+        repo      = hub(user_id)
+        user_ctx  = dict(await repo.get_context_state())
+
+        # • memoria classica (30 gg) + vettoriale (long-term), in parallelo con budget per fonte
+        sources = await gather_memory_sources(user_id, vector_k=100)
+        user_ctx.update({"memory": sources["short"], "vector_memory": sources["vector"]})
 
         # negativi ultimi 30 gg per priorità
-        negatives_30d = (
-            db.collection("ai_agent_hub").document(user_id)
-              .collection("feedback")
-              .where("rating", "==", "down")
-              .where("timestamp", ">", now - timedelta(days=30))
-              .get()
-        )
+        negatives_30d = await repo.feedback.list(filters=[
+            ("rating", "==", "down"),
+            ("timestamp", ">", now - timedelta(days=30)),
+        ])
         priority_score = compute_priority_score(user_ctx, len(negatives_30d))
 
         # ── 2️⃣ Decision Map dinamica ──
@@ -97,57 +96,67 @@ async def handle(user_id: str, context: dict):
             decision_map.append("insight")
             log_lines.append("🧠 Fallback → insight")
 
-        # ── 3️⃣ Circuit-breaker: troppi fallimenti recenti? ──
-        fails_recent = (
-            db.collection("ai_agent_hub").document(user_id)
-              .collection("failed_tasks")
-              .where("timestamp", ">", now - timedelta(minutes=15))
-              .get()
-        )
-        if len(fails_recent) >= CB_THRESHOLD:
+        # ── 3️⃣ Circuit-breaker: stato in memoria, nessuna lettura Firestore ──
+        user_cb_key = circuitBreaker.user_key(user_id)
+        if not circuitBreaker.get_breaker(user_cb_key).allow():
             circuit_ok = False
             log_lines.append("⛔ Circuit-breaker attivo: skip dispatch")
 
-        # ── 4️⃣ Dispatch asíncrono con retry ──
+        # ── 4️⃣ Dispatch concorrente con retry (cap + deadline per task) ──
         if circuit_ok:
-            async with httpx.AsyncClient() as client:
-                for task in decision_map:
-                    payload = {
-                        "user_id": user_id,
-                        "intent": task,
-                        "context": {
-                            **context,
-                            "session_id": f"autopilot-{task}-{now.isoformat()}",
-                            "auto_triggered_by": "autopilot",
-                            "priority_score": priority_score,
-                        },
-                    }
-                    success, result = await safe_post(client,
-                        "http://127.0.0.1:8000/agent/dispatch", payload
-                    )
-
-                    if success:
-                        triggered.append({"task": task, "result": result})
-                    else:
-                        err_msg = str(result)
-                        log_lines.append(f"❌ {task} errore: {err_msg}")
-                        triggered.append({"task": task, "result": {"status":"error","msg": err_msg}})
-
-                        # salva nel registro fail & (opz) notifica admin
-                        db.collection("ai_agent_hub").document(user_id) \
-                          .collection("failed_tasks").add({
-                              "timestamp": now,
-                              "task": task,
-                              "error": err_msg,
-                              "context": payload["context"],
-                          })
-                        # notify_admin(user_id, f"Task {task} fallito", err_msg)
+            from routes.dispatchRoutes import DispatchRequest
+            semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+            # agenti con breaker aperto saltati senza dispatch
+            runnable = []
+            for task in decision_map:
+                if circuitBreaker.get_breaker(circuitBreaker.agent_key(user_id, task)).allow():
+                    runnable.append(task)
+                else:
+                    log_lines.append(f"⛔ {task}: circuit-breaker agente aperto")
+                    triggered.append({"task": task, "result": {"status": "circuit_open"}})
+
+            jobs = [
+                run_task(task, DispatchRequest(
+                    user_id=user_id,
+                    intent=task,
+                    context={
+                        **context,
+                        "session_id": f"autopilot-{task}-{now.isoformat()}",
+                        "auto_triggered_by": "autopilot",
+                        "priority_score": priority_score,
+                    },
+                ), semaphore)
+                for task in runnable
+            ]
+
+            # risultati raccolti man mano che i task terminano
+            for finished in asyncio.as_completed(jobs):
+                task, request, success, result = await finished
+                cb_keys = (user_cb_key, circuitBreaker.agent_key(user_id, task))
+
+                if success:
+                    triggered.append({"task": task, "result": result})
+                    await circuitBreaker.record_success(*cb_keys)
+                else:
+                    await circuitBreaker.record_failure(*cb_keys)
+                    err_msg = str(result)
+                    log_lines.append(f"❌ {task} errore: {err_msg}")
+                    triggered.append({"task": task, "result": {"status":"error","msg": err_msg}})
+
+                    # registro fail solo per audit (non più letto dal breaker) & (opz) notifica admin
+                    await repo.collection("failed_tasks").add({
+                        "timestamp": now,
+                        "task": task,
+                        "error": err_msg,
+                        "context": request.context,
+                    })
+                    # notify_admin(user_id, f"Task {task} fallito", err_msg)
         else:
             triggered.append({"status": "circuit_open"})
 
         # ── 5️⃣ Persistenza finale azione + insight ──
-        db.collection("ai_agent_hub").document(user_id)\
-          .collection("actions").document(action_id).set({
+        await repo.actions.set(action_id, {
             "actionId": action_id,
             "type": "autopilot",
             "status": "completed",
@@ -158,8 +167,7 @@ async def handle(user_id: str, context: dict):
             "output": {"decisions": decision_map, "triggered": triggered, "log": log_lines},
         })
 
-        db.collection("ai_agent_hub").document(user_id)\
-          .collection("insights").add({
+        await repo.collection("insights").add({
             "timestamp": now,
             "source": "autopilot",
             "message": f"Autopilot ha avviato {', '.join(decision_map)} (prio {priority_score})",
@@ -1,10 +1,10 @@
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from datetime import datetime, timedelta
 import uuid
 from dispatchers.logUtils import log_info, log_error
 
 # ✅ Crea e salva prenotazione
-def run(user_id: str, context: dict) -> dict:
+async def run(user_id: str, context: dict) -> dict:
     now = datetime.utcnow()
     try:
         log_info(user_id, "bookingDispatcher", "new_booking", context)
@@ -22,7 +22,8 @@ def run(user_id: str, context: dict) -> dict:
             "createdAt": now
         }
 
-        db.collection("ai_agent_hub").document(user_id).collection("bookings").document(booking_id).set(data)
+        repo = hub(user_id)
+        await repo.collection("bookings").set(booking_id, data)
 
         # 🧠 Tracciamento azione IA
         action_id = f"booking-{uuid.uuid4().hex[:6]}"
@@ -35,7 +36,7 @@ def run(user_id: str, context: dict) -> dict:
             "completedAt": now
         }
 
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set(action)
+        await repo.actions.set(action_id, action)
 
         output = {
             "status": "completed",
@@ -56,11 +57,11 @@ async def handle_booking_request(user_id: str, context: dict):
         today = datetime.utcnow().date()
         tomorrow = today + timedelta(days=1)
 
-        docs = db.collection("ai_agent_hub").document(user_id).collection("bookings").stream()
+        docs = await hub(user_id).collection("bookings").list()
         bookings = [
-            b.to_dict() for b in docs
-            if "checkin_date" in b.to_dict()
-            and datetime.strptime(b.to_dict()["checkin_date"], "%Y-%m-%d").date() == tomorrow
+            b for b in docs
+            if "checkin_date" in b
+            and datetime.strptime(b["checkin_date"], "%Y-%m-%d").date() == tomorrow
         ]
 
         if not bookings:
@@ -76,4 +77,4 @@ async def handle_booking_request(user_id: str, context: dict):
 
 # ✅ Entry point del dispatcher master
 async def handle(user_id: str, context: dict):
-    return run(user_id, context)
+    return await run(user_id, context)
@@ -1,4 +1,4 @@
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from datetime import datetime
 import httpx
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging IA
@@ -32,8 +32,9 @@ async def handle(user_id: str, context: dict) -> dict:
 
         # ✅ Registra documento IA
         now = datetime.utcnow()
-        doc_ref = db.collection("ai_agent_hub").document(user_id).collection("documents").document()
-        doc_ref.set({
+        documents = hub(user_id).documents
+        doc_ref = documents.doc()
+        await documents.set(doc_ref.id, {
             "documentId": doc_ref.id,
             "type": "checkin_confirmation",
             "content": welcome_msg,
@@ -0,0 +1,168 @@
+"""
+circuitBreaker.py
+Registro in-process di circuit breaker (closed → open → half_open) per utente e per agente.
+Finestra scorrevole dei fallimenti in memoria e cooldown esponenziale: il percorso caldo
+non legge Firestore. Persistenza opzionale (solo sulle transizioni di stato) per
+sopravvivere ai riavvii.
+"""
+
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict
+
+from firebase_config import async_db
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+FAILURE_THRESHOLD = int(os.getenv("CB_FAILURE_THRESHOLD", "5"))     # fallimenti nella finestra
+WINDOW_SECONDS = int(os.getenv("CB_WINDOW_SECONDS", "900"))         # 15 min
+BASE_COOLDOWN = int(os.getenv("CB_BASE_COOLDOWN", "60"))            # primo cooldown
+MAX_COOLDOWN = int(os.getenv("CB_MAX_COOLDOWN", "3600"))
+MAX_BREAKERS = int(os.getenv("CB_MAX_BREAKERS", "10000"))         # chiavi utente/agente in memoria
+PERSIST = os.getenv("CB_PERSIST", "false").lower() == "true"
+COLLECTION = "circuit_breakers"
+
+
+class CircuitBreaker:
+    def __init__(self, key: str, threshold: int = FAILURE_THRESHOLD, window: int = WINDOW_SECONDS):
+        self.key = key
+        self.threshold = threshold
+        self.window = window
+        self.state = CLOSED
+        self.failures = deque()
+        self.trips = 0          # aperture consecutive → cooldown esponenziale
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+
+    @property
+    def cooldown(self) -> float:
+        return min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** max(0, self.trips - 1))
+
+    def _prune(self, now: float):
+        while self.failures and self.failures[0] <= now - self.window:
+            self.failures.popleft()
+
+    def allow(self) -> bool:
+        """True se la chiamata può partire (in half_open passa una sola sonda per volta)."""
+        now = time.time()
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if now < self.opened_at + self.cooldown:
+                return False
+            self.state = HALF_OPEN
+            self.probe_started = now
+            return True
+        # HALF_OPEN: nuova sonda solo se la precedente non ha mai riportato l'esito
+        if now >= self.probe_started + self.cooldown:
+            self.probe_started = now
+            return True
+        return False
+
+    def record_success(self) -> bool:
+        """Registra un successo; True se lo stato è cambiato."""
+        if self.state == CLOSED:
+            return False
+        self.state = CLOSED
+        self.trips = 0
+        self.failures.clear()
+        return True
+
+    def record_failure(self) -> bool:
+        """Registra un fallimento; True se lo stato è cambiato."""
+        now = time.time()
+        self.failures.append(now)
+        self._prune(now)
+        if self.state == HALF_OPEN or (self.state == CLOSED and len(self.failures) >= self.threshold):
+            self.state = OPEN
+            self.trips += 1
+            self.opened_at = now
+            return True
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "state": self.state,
+            "trips": self.trips,
+            "openedAt": self.opened_at,
+            "failures": list(self.failures),
+        }
+
+    def load(self, data: dict):
+        self.state = data.get("state", CLOSED)
+        self.trips = data.get("trips", 0)
+        self.opened_at = data.get("openedAt", 0.0)
+        self.failures = deque(data.get("failures") or [])
+        if self.state == HALF_OPEN:
+            self.state = OPEN  # la sonda in volo è andata persa col riavvio
+
+
+_breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()  # LRU
+
+
+def _evict():
+    """Scarta il breaker chiuso usato meno di recente (quelli aperti portano stato da non perdere)."""
+    for key, breaker in _breakers.items():
+        if breaker.state == CLOSED:
+            del _breakers[key]
+            return
+    _breakers.popitem(last=False)
+
+
+def get_breaker(key: str) -> CircuitBreaker:
+    breaker = _breakers.get(key)
+    if breaker is None:
+        if len(_breakers) >= MAX_BREAKERS:
+            _evict()
+        breaker = _breakers[key] = CircuitBreaker(key)
+    _breakers.move_to_end(key)
+    return breaker
+
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def agent_key(user_id: str, agent: str) -> str:
+    return f"agent:{user_id}:{agent}"
+
+
+async def _persist(breaker: CircuitBreaker):
+    if not PERSIST:
+        return
+    try:
+        await async_db.collection(COLLECTION).document(breaker.key).set(breaker.to_dict())
+    except Exception as e:
+        print(f"[CIRCUIT] ⚠️ Persistenza stato {breaker.key} fallita: {e}")
+
+
+async def record_success(*keys: str):
+    for key in keys:
+        breaker = _breakers.get(key)  # nessun breaker = già chiuso: non serve crearne uno
+        if breaker and breaker.record_success():
+            await _persist(breaker)
+
+
+async def record_failure(*keys: str):
+    for key in keys:
+        breaker = get_breaker(key)
+        if breaker.record_failure():
+            await _persist(breaker)
+
+
+async def load_state() -> int:
+    """Ripristina all'avvio i breaker non chiusi salvati su Firestore."""
+    if not PERSIST:
+        return 0
+    loaded = 0
+    query = async_db.collection(COLLECTION).where("state", "in", [OPEN, HALF_OPEN])
+    async for doc in query.stream():
+        get_breaker(doc.id).load(doc.to_dict())
+        loaded += 1
+    return loaded
+
+
+def snapshot() -> Dict[str, dict]:
+    return {key: breaker.to_dict() for key, breaker in _breakers.items() if breaker.state != CLOSED}
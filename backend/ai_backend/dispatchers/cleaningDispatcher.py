@@ -1,28 +1,25 @@
 from datetime import datetime
-from firebase_config import db
-import openai
+import json
 import os
+from utils.hubRepository import hub  # ⚡ Firestore async
 from uuid import uuid4
 from dispatchers.logUtils import log_info, log_error
 from dispatchers.memoryUtils import get_memory_context
+from utils.cleaningScheduler import build_schedule, render_plan  # 🧮 Assegnazione locale deterministica
+from utils.llmGateway import chat_completion  # ✅ Gateway OpenAI async
 
-# ✅ Configura OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("❌ OpenAI API key non trovata")
-client = openai.OpenAI(api_key=openai_api_key)
+# 💬 GPT solo per riformulare il piano già calcolato (opzionale)
+GPT_PHRASING = os.getenv("CLEANING_GPT_PHRASING", "false").lower() == "true"
 
 # ✅ Prompt dinamico
-def build_prompt(checkouts, checkins, staff):
+def build_prompt(schedule, memory):
     return f"""
 Sei un assistente IA specializzato nella gestione delle pulizie per hotel e B&B.
-Organizza le pulizie post check-out ottimizzando le risorse disponibili.
+Il piano pulizie di oggi è già stato calcolato: NON modificare assegnazioni né orari.
+Riformulalo in modo chiaro e cordiale per lo staff, evidenziando le camere prioritarie (check-in oggi).
 
-🏨 Check-out di oggi: {checkouts}
-🛬 Check-in previsti: {checkins}
-👥 Staff disponibile: {staff}
-
-Genera un piano dettagliato indicando chi pulisce quali camere, priorità alta se la stanza è in check-in immediato.
+📋 Piano: {json.dumps(schedule, ensure_ascii=False)}
+🧠 Memoria: {memory}
 """
 
 # ✅ Funzione principale
@@ -31,33 +28,29 @@ async def handle(user_id: str, context: dict):
     action_id = str(uuid4())
 
     try:
-        # 🧠 Recupera memoria IA
-        context["memory"] = await get_memory_context(user_id, context, intent="cleaning")
-
         # 🔍 Estrai contesto
         checkouts_today = context.get("checkouts_today", [])
         checkins_today = context.get("checkins_today", [])
         staff_available = context.get("staff", [])
 
-        # 🔁 Fallback intelligenti
-        if not checkouts_today:
-            checkouts_today = ["Nessun check-out registrato oggi"]
-        if not staff_available:
-            staff_available = ["Nessuno disponibile"]
-
-        # 💬 Costruzione prompt
-        prompt = build_prompt(checkouts_today, checkins_today, staff_available)
-
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Sei un assistente IA specializzato nella gestione delle pulizie alberghiere."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.4
-        )
+        # 🧮 Piano strutturato calcolato localmente (millisecondi, nessun token)
+        schedule = build_schedule(checkouts_today, checkins_today, staff_available)
+        cleaning_plan = render_plan(schedule)
 
-        cleaning_plan = response.choices[0].message.content.strip()
+        if context.get("phrase_with_gpt", GPT_PHRASING) and schedule["summary"]["rooms"]:
+            # 🧠 Recupera memoria IA (solo per la formulazione GPT)
+            context["memory"] = await get_memory_context(user_id, context, intent="cleaning")
+            response = await chat_completion(
+                model="gpt-4",
+                messages=[
+                    {"role": "system", "content": "Sei un assistente IA specializzato nella gestione delle pulizie alberghiere."},
+                    {"role": "user", "content": build_prompt(schedule, context["memory"])}
+                ],
+                temperature=0.4,
+                source="cleaningDispatcher",
+                user_id=user_id
+            )
+            cleaning_plan = response.choices[0].message.content.strip()
 
         # 💾 Salva su Firestore
         action_data = {
@@ -68,20 +61,23 @@ async def handle(user_id: str, context: dict):
             "completedAt": datetime.utcnow(),
             "context": context,
             "output": {
-                "cleaning_plan": cleaning_plan
+                "cleaning_plan": cleaning_plan,
+                "schedule": schedule
             }
         }
 
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set(action_data)
-        db.collection("ai_agent_hub").document(user_id).set({
+        repo = hub(user_id)
+        await repo.actions.set(action_id, action_data)
+        await repo.set_root({
             "lastActive": now,
             "lastCompletedAction": action_id
-        }, merge=True)
+        })
 
-        log_info(user_id, "cleaningDispatcher", "generate_cleaning_plan", context, action_data["output"])
+        log_info(user_id, "cleaningDispatcher", "generate_cleaning_plan", context, schedule["summary"])
         return {
             "status": "completed",
             "plan": cleaning_plan,
+            "schedule": schedule,
             "actionId": action_id
         }
 
@@ -1,11 +1,10 @@
-from firebase_config import db
-from firebase_admin import firestore
+from utils.hubRepository import hub  # ⚡ Firestore async
 from datetime import datetime
 import uuid
 from dispatchers.logUtils import log_info, log_error
 
-# 🔁 FUNZIONE PRINCIPALE (sincrona)
-def run(user_id: str, context: dict) -> dict:
+# 🔁 FUNZIONE PRINCIPALE
+async def run(user_id: str, context: dict) -> dict:
     now = datetime.utcnow()
     try:
         log_info(user_id, "crmDispatcher", "update_customer", context)
@@ -16,14 +15,8 @@ def run(user_id: str, context: dict) -> dict:
 
         customer_id = customer_data.get("id") or f"cust-{uuid.uuid4().hex[:8]}"
 
-        doc_ref = (
-            db.collection("ai_agent_hub")
-            .document(user_id)
-            .collection("crm")
-            .document("customers")
-            .collection("list")
-            .document(customer_id)
-        )
+        repo = hub(user_id)
+        doc_ref = repo.collection("crm").doc("customers").collection("list").document(customer_id)
 
         data = {
             "fullName": customer_data.get("fullName"),
@@ -36,7 +29,7 @@ def run(user_id: str, context: dict) -> dict:
             "lastUpdate": now
         }
 
-        doc_ref.set(data, merge=True)
+        await doc_ref.set(data, merge=True)
 
         action_id = f"crm-{uuid.uuid4().hex[:6]}"
         action_data = {
@@ -51,7 +44,7 @@ def run(user_id: str, context: dict) -> dict:
             "completedAt": now
         }
 
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set(action_data)
+        await repo.actions.set(action_id, action_data)
 
         output = {
             "status": "completed",
@@ -66,7 +59,7 @@ def run(user_id: str, context: dict) -> dict:
         log_error(user_id, "crmDispatcher", "update_customer", e, context)
         return {"status": "error", "message": f"Errore salvataggio CRM: {str(e)}"}
 
-# ✅ VERSIONE ASYNC richiesta dal dispatcher
+# ✅ Entry point richiesto dal dispatcher
 async def handle(user_id: str, context: dict):
-    return run(user_id, context)
+    return await run(user_id, context)
 
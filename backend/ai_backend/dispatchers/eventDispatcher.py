@@ -1,7 +1,6 @@
 from datetime import datetime
 from uuid import uuid4
-from firebase_config import db
-import httpx
+from utils.hubRepository import hub  # ⚡ Firestore async
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging
 from dispatchers.memoryUtils import get_memory_context  # ✅ (futura integrazione)
 
@@ -22,8 +21,8 @@ async def handle(user_id: str, context: dict):
             raise ValueError("❌ Parametri insufficienti per evento IA")
 
         # 🔹 Salva l'evento su Firestore
-        event_ref = db.collection("ai_agent_hub").document(user_id).collection("events").document(event_id)
-        event_ref.set({
+        events = hub(user_id).events
+        await events.set(event_id, {
             "eventId": event_id,
             "trigger": trigger,
             "next_agent": next_agent,
@@ -32,23 +31,19 @@ async def handle(user_id: str, context: dict):
             "createdAt": now
         })
 
-        # 🔁 Chiama il dispatcher master via API interna
-        async with httpx.AsyncClient() as client:
-            dispatch_response = await client.post(
-                "http://127.0.0.1:8000/agent/dispatch",
-                json={
-                    "user_id": user_id,
-                    "intent": next_agent,
-                    "context": params
-                }
-            )
+        # 🔁 Chiama il dispatcher master via bus in-process
+        from routes.dispatchRoutes import dispatch_master_agent, DispatchRequest
+        output = await dispatch_master_agent(DispatchRequest(
+            user_id=user_id,
+            intent=next_agent,
+            context=params
+        ))
 
         # 📦 Risposta ricevuta
-        output = dispatch_response.json()
         linked_action_id = output.get("actionId")
 
         # 🔄 Aggiorna evento con ID azione collegata
-        event_ref.update({
+        await events.update(event_id, {
             "linked_action_id": linked_action_id,
             "dispatchedAt": datetime.utcnow(),
             "output_summary": output.get("output", {})
@@ -1,16 +1,11 @@
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
+from utils import profileCache  # ⚡ Profilo struttura in cache
+from utils import faqCache  # ⚡ Risposte FAQ per struttura (cache semantica)
 from datetime import datetime
 from uuid import uuid4
-import openai
-import os
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging IA
 from dispatchers.memoryUtils import get_memory_context  # ✅ Opzionale per futura integrazione
-
-# ✅ Configura OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("❌ OPENAI_API_KEY mancante")
-client = openai.OpenAI(api_key=openai_api_key)
+from utils.llmGateway import chat_completion  # ✅ Gateway OpenAI async
 
 # ✅ Funzione principale
 async def handle(user_id: str, context: dict):
@@ -24,33 +19,18 @@ async def handle(user_id: str, context: dict):
         if not question:
             raise ValueError("❌ Domanda mancante nel context")
 
-        # 🔍 Recupera profilo struttura
-        profile_ref = db.collection("ai_agent_hub").document(user_id).collection("properties").document("main")
-        profile_doc = profile_ref.get()
-        structure_profile = profile_doc.to_dict() if profile_doc.exists else {}
-
-        # 📤 Prompt personalizzato
-        prompt = f"""
-        Sei un assistente virtuale per un hotel.
-        Questa è la descrizione della struttura: {structure_profile}.
-        Rispondi alla seguente domanda del cliente in modo cortese, preciso e personalizzato:
-        → {question}
-        """
-
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Sei un assistente specializzato in hotel di lusso."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.6
-        )
-
-        answer = response.choices[0].message.content.strip()
+        repo = hub(user_id)
+        # ⚡ Domanda già vista (o quasi identica) per questa struttura → risposta senza LLM
+        generation = faqCache.generation(user_id)
+        cached = faqCache.lookup(user_id, question)
+        if cached:
+            answer = cached["answer"]
+        else:
+            answer = await _ask_llm(user_id, question)
+            faqCache.store(user_id, question, answer, generation)
 
         # 🧠 Salva azione nel Firestore
-        actions_ref = db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id)
-        actions_ref.set({
+        await repo.actions.set(action_id, {
             "actionId": action_id,
             "type": "faq",
             "status": "completed",
@@ -59,13 +39,15 @@ async def handle(user_id: str, context: dict):
             "context": context,
             "output": {
                 "question": question,
-                "answer": answer
+                "answer": answer,
+                "cached": bool(cached)
             }
         })
 
         output = {
             "status": "completed",
             "answer": answer,
+            "cached": bool(cached),
             "actionId": action_id
         }
 
@@ -79,3 +61,29 @@ async def handle(user_id: str, context: dict):
             "message": "❌ Errore generazione risposta FAQ",
             "error": str(e)
         }
+
+# 🤖 Risposta GPT (solo su cache miss)
+async def _ask_llm(user_id: str, question: str) -> str:
+    # 🔍 Recupera profilo struttura (cache, niente lettura Firestore a regime)
+    structure_profile = await profileCache.get_profile(user_id)
+
+    # 📤 Prompt personalizzato
+    prompt = f"""
+    Sei un assistente virtuale per un hotel.
+    Questa è la descrizione della struttura: {structure_profile}.
+    Rispondi alla seguente domanda del cliente in modo cortese, preciso e personalizzato:
+    → {question}
+    """
+
+    response = await chat_completion(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "Sei un assistente specializzato in hotel di lusso."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.6,
+        source="faqDispatcher",
+        user_id=user_id
+    )
+
+    return response.choices[0].message.content.strip()
@@ -1,24 +1,18 @@
-from firebase_config import db
 from datetime import datetime
 from uuid import uuid4
-import openai
-import os
 import re
-import httpx
+import asyncio
 from google.cloud.firestore import Query
+from utils.hubRepository import hub  # ⚡ Firestore async
+from utils import profileCache  # ⚡ Profilo struttura in cache
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging IA
 from dispatchers.memoryUtils import get_memory_context  # ✅ Nuova memoria IA
-
-# ✅ Configura OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("❌ OPENAI_API_KEY mancante")
-client = openai.OpenAI(api_key=openai_api_key)
+from utils.llmGateway import chat_completion  # ✅ Gateway OpenAI async
 
 # 🔍 Riassume documenti
 def summarize_docs(docs, limit=5):
     return "\n".join([
-        f"- {d.to_dict().get('type', 'doc')} | {d.to_dict().get('content', '')[:60]}..."
+        f"- {d.get('type', 'doc')} | {(d.get('content') or '')[:60]}..."
         for d in list(docs)[:limit]
     ])
 
@@ -69,19 +63,18 @@ async def handle(user_id: str, context: dict):
 
         note = context.get("note") or context.get("notes") or ""
 
-        base_ref = db.collection("ai_agent_hub").document(user_id)
-        profile_doc = base_ref.collection("properties").document("main").get()
-        profile = profile_doc.to_dict() if profile_doc.exists else {}
-
-        actions = base_ref.collection("actions").order_by("startedAt", direction=Query.DESCENDING).limit(5).stream()
-        events = base_ref.collection("events").order_by("createdAt", direction=Query.DESCENDING).limit(5).stream()
-        feedbacks_stream = base_ref.collection("feedback").stream()
-        documents = base_ref.collection("documents").order_by("generatedAt", direction=Query.DESCENDING).limit(5).stream()
+        repo = hub(user_id)
 
-        feedbacks = list(feedbacks_stream)
-        feedback_texts = [fb.to_dict().get("comment", "") for fb in feedbacks]
-
-        memory_trace = await get_memory_context(user_id)
+        # ⚡ Letture indipendenti in parallelo
+        profile, actions, events, feedbacks, documents, memory_trace = await asyncio.gather(
+            profileCache.get_profile(user_id),
+            repo.actions.list(order_by="startedAt", direction=Query.DESCENDING, limit=5),
+            repo.events.list(order_by="createdAt", direction=Query.DESCENDING, limit=5),
+            repo.feedback.list(),
+            repo.documents.list(order_by="generatedAt", direction=Query.DESCENDING, limit=5),
+            get_memory_context(user_id),
+        )
+        feedback_texts = [fb.get("comment") or "" for fb in feedbacks]
 
         prompt = f"""
 Sei un analista IA esperto nel settore hospitality.
@@ -96,13 +89,15 @@ Memoria storica:\n{memory_trace}
             prompt += f"\nNota dal gestore: {note}"
         prompt += "\nFornisci un insight strategico per ottimizzare la struttura."
 
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Sei un analista strategico alberghiero."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.6
+            temperature=0.6,
+            source="insightDispatcher",
+            user_id=user_id
         )
 
         insight = response.choices[0].message.content.strip()
@@ -111,8 +106,9 @@ Memoria storica:\n{memory_trace}
         next_steps = extract_next_steps(insight)
         agents_to_trigger = suggest_agents(insight, note)
 
-        recent_insights = base_ref.collection("insights_from_agents").order_by("timestamp", direction=Query.DESCENDING).limit(10).stream()
-        duplicates = [doc for doc in recent_insights if insight[:50] in doc.to_dict().get("comment", "")[:70]]
+        insights_log = repo.collection("insights_from_agents")
+        recent_insights = await insights_log.list(order_by="timestamp", direction=Query.DESCENDING, limit=10)
+        duplicates = [doc for doc in recent_insights if insight[:50] in (doc.get("comment") or "")[:70]]
         is_duplicate = len(duplicates) > 0
 
         priority_score = 50
@@ -136,8 +132,8 @@ Memoria storica:\n{memory_trace}
             "timestamp": now
         }
 
-        base_ref.collection("insights_from_agents").document(action_id).set(insight_data)
-        base_ref.collection("actions").document(action_id).set({
+        await insights_log.set(action_id, insight_data)
+        await repo.actions.set(action_id, {
             "actionId": action_id,
             "type": "insight",
             "status": "completed",
@@ -149,16 +145,14 @@ Memoria storica:\n{memory_trace}
 
         # 🔁 Attiva agenti suggeriti
         triggered_agents = []
-        async with httpx.AsyncClient() as client:
-            for agent in agents_to_trigger:
-                dispatch_payload = {
-                    "user_id": user_id,
-                    "intent": agent,
-                    "context": context
-                }
-                r = await client.post("http://127.0.0.1:8000/agent/dispatch", json=dispatch_payload)
-                dispatch_result = r.json()
-                triggered_agents.append({"agent": agent, "result": dispatch_result})
+        from routes.dispatchRoutes import dispatch_master_agent, DispatchRequest
+        for agent in agents_to_trigger:
+            dispatch_result = await dispatch_master_agent(DispatchRequest(
+                user_id=user_id,
+                intent=agent,
+                context=context
+            ))
+            triggered_agents.append({"agent": agent, "result": dispatch_result})
 
         output = {
             "status": "completed",
@@ -1,9 +1,118 @@
 from datetime import datetime
+from collections import deque
+import asyncio
+import os
 import traceback
-from firebase_config import db
+from firebase_config import async_db
 
 MAX_LEN = 300  # Limite di caratteri visualizzati in log
 
+# ⚙️ Pipeline log in background: ring buffer → WriteBatch Firestore
+LOG_COLLECTION = "ai_agent_logs"
+BATCH_SIZE = 500  # limite massimo di operazioni per WriteBatch
+BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "10000"))
+FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2.0"))  # secondi
+DROP_POLICY = os.getenv("LOG_DROP_POLICY", "oldest")  # oldest | newest (a buffer pieno)
+
+_buffer = deque()
+_stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed_batches": 0}
+_worker = None
+_wakeup = None
+
+
+def log_record(entry: dict):
+    """Accoda un documento log senza toccare Firestore sul percorso critico."""
+    if len(_buffer) >= BUFFER_SIZE:
+        # 🚦 Backpressure: a buffer pieno si scarta, gli errori non vengono mai sacrificati per un info
+        is_error = entry.get("level") == "error"
+        _stats["dropped"] += 1
+        if DROP_POLICY == "newest" and not is_error:
+            return
+        if not _evict_oldest_info():
+            if not is_error:
+                return  # in coda solo errori: si scarta l'info in arrivo
+            _buffer.popleft()  # errore nuovo al posto dell'errore più vecchio
+
+    _buffer.append(entry)
+    _stats["enqueued"] += 1
+    _ensure_worker()
+    if _wakeup and len(_buffer) >= BATCH_SIZE:
+        _wakeup.set()
+
+
+def _evict_oldest_info() -> bool:
+    """Scarta la voce non-errore più vecchia (di norma in testa: la scansione si ferma subito)."""
+    for i, queued in enumerate(_buffer):
+        if queued.get("level") != "error":
+            del _buffer[i]
+            return True
+    return False
+
+
+def get_log_stats() -> dict:
+    return {**_stats, "buffered": len(_buffer)}
+
+
+def _ensure_worker():
+    global _worker, _wakeup
+    if _worker and not _worker.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # fuori dall'event loop: i log restano nel buffer fino al prossimo flush()
+    _wakeup = asyncio.Event()
+    _worker = loop.create_task(_run())
+
+
+async def _run():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await flush()
+
+
+async def flush():
+    """Svuota il buffer in WriteBatch da max 500 documenti."""
+    while _buffer:
+        entries = [_buffer.popleft() for _ in range(min(BATCH_SIZE, len(_buffer)))]
+        batch = async_db.batch()
+        for entry in entries:
+            batch.set(async_db.collection(LOG_COLLECTION).document(), entry)
+        try:
+            await batch.commit()
+            _stats["written"] += len(entries)
+        except Exception as firestore_error:
+            _stats["failed_batches"] += 1
+            print(f"[LOGGER] ❌ Errore flush batch log ({len(entries)} voci): {firestore_error}")
+            # 🔁 Rimette in testa ciò che ci sta e riprova al prossimo ciclo
+            room = max(0, BUFFER_SIZE - len(_buffer))
+            _stats["dropped"] += len(entries) - min(room, len(entries))
+            _buffer.extendleft(reversed(entries[:room]))
+            return
+
+
+async def start():
+    """Avvia il worker di flush (startup server)."""
+    _ensure_worker()
+
+
+async def shutdown():
+    """Ferma il worker e scrive tutto ciò che è ancora in buffer."""
+    global _worker
+    if _worker and not _worker.done():
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+    _worker = None
+    await flush()
+
+
 def log_info(user_id, dispatcher, action, context=None, output=None):
     timestamp = datetime.utcnow().isoformat()
     print(f"[INFO] {timestamp} | {dispatcher} | user: {user_id} | action: {action}")
@@ -13,18 +122,15 @@ def log_info(user_id, dispatcher, action, context=None, output=None):
     if context:
         print(f"       ↳ Context: {str(context)[:MAX_LEN]}")
 
-    try:
-        db.collection("ai_agent_logs").add({
-            "user_id": user_id,
-            "dispatcher": dispatcher,
-            "action": action,
-            "output": str(output)[:1000] if output else None,
-            "context": str(context)[:1000] if context else None,
-            "timestamp": timestamp,
-            "level": "info"
-        })
-    except Exception as firestore_error:
-        print(f"[LOGGER] ❌ Errore salvataggio log INFO: {firestore_error}")
+    log_record({
+        "user_id": user_id,
+        "dispatcher": dispatcher,
+        "action": action,
+        "output": str(output)[:1000] if output else None,
+        "context": str(context)[:1000] if context else None,
+        "timestamp": timestamp,
+        "level": "info"
+    })
 
 
 def log_error(user_id, dispatcher, action, error, context=None):
@@ -37,16 +143,13 @@ def log_error(user_id, dispatcher, action, error, context=None):
     if context:
         print(f"        ↳ Context: {str(context)[:MAX_LEN]}")
 
-    try:
-        db.collection("ai_agent_logs").add({
-            "user_id": user_id,
-            "dispatcher": dispatcher,
-            "action": action,
-            "error": str(error),
-            "traceback": tb,
-            "context": str(context)[:1000] if context else None,
-            "timestamp": timestamp,
-            "level": "error"
-        })
-    except Exception as firestore_error:
-        print(f"[LOGGER] ❌ Errore salvataggio log ERROR: {firestore_error}")
+    log_record({
+        "user_id": user_id,
+        "dispatcher": dispatcher,
+        "action": action,
+        "error": str(error),
+        "traceback": tb,
+        "context": str(context)[:1000] if context else None,
+        "timestamp": timestamp,
+        "level": "error"
+    })
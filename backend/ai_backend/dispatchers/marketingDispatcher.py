@@ -1,4 +1,4 @@
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from datetime import datetime
 import uuid
 from dispatchers.logUtils import log_info, log_error
@@ -50,7 +50,7 @@ Grazie per aver scelto {structure_name}! 💙
             }
         }
 
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set(action_data)
+        await hub(user_id).actions.set(action_id, action_data)
 
         output = {
             "status": "completed",
@@ -4,125 +4,242 @@ Utility helpers for retrieving short-term (Firestore) and long-term (vector-DB)
 for HOXY / StayPro AI agent dispatchers.
 """
 
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timezone
 from typing import List, Dict
+import asyncio
 import os
+import time
 
-from firebase_config import db
+from google.cloud.firestore import Query
 
+from utils.hubRepository import hub, on_record, on_write
+from utils.vectorMemory import get_backend as get_vector_backend
 
-# ░░░ SHORT-TERM MEMORY (Firestore) ░░░
-def get_memory(user_id: str, limit: int = 3) -> List[Dict]:
-    """Return the last <limit> completed actions + generated documents for the user."""
+MEMORY_CACHE_TTL = float(os.getenv("MEMORY_CACHE_TTL", "30"))  # seconds, fallback if a write bypasses the repo
+MEMORY_CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "5000"))  # cached users
+MEMORY_SOURCES = {"actions", "documents"}
+
+
+# ░░░ SHORT-TERM MEMORY CACHE ░░░
+_memory_cache: "OrderedDict[str, Dict[int, tuple]]" = OrderedDict()  # user_id -> {limit: (expires_at, generation, memory)}
+_inflight: Dict[tuple, asyncio.Task] = {}
+_generation: Dict[str, int] = {}
+
+
+@on_write
+def invalidate_memory(user_id: str, collection: str = "actions") -> None:
+    """Write-through invalidation: any action/document write drops the user's cached memory."""
+    if collection not in MEMORY_SOURCES:
+        return
+    _generation[user_id] = _generation.get(user_id, 0) + 1
+    _memory_cache.pop(user_id, None)  # O(1): entries are grouped per user
+
+
+async def _load_memory(key: tuple) -> List[Dict]:
+    user_id, limit = key
+    generation = _generation.get(user_id, 0)
     try:
-        memory: List[Dict] = []
-
-        # Completed actions
-        actions_ref = (
-            db.collection("ai_agent_hub")
-            .document(user_id)
-            .collection("actions")
-            .where("status", "==", "completed")
-            .order_by("completedAt", direction="DESCENDING")
-            .limit(limit)
-        )
-        for doc in actions_ref.stream():
-            data = doc.to_dict()
-            memory.append(
-                {
-                    "type": data.get("type"),
-                    "output": data.get("output"),
-                    "timestamp": data.get("completedAt").isoformat() if data.get("completedAt") else None,
-                }
-            )
-
-        # Recent documents
-        docs_ref = (
-            db.collection("ai_agent_hub")
-            .document(user_id)
-            .collection("documents")
-            .order_by("generatedAt", direction="DESCENDING")
-            .limit(limit)
-        )
-        for doc in docs_ref.stream():
-            data = doc.to_dict()
-            memory.append(
-                {
-                    "type": data.get("type", "document"),
-                    "output": data.get("content"),
-                    "timestamp": data.get("generatedAt").isoformat() if data.get("generatedAt") else None,
-                }
-            )
-
-        # Order by timestamp desc
-        memory.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        return memory[:limit]
+        memory = await _fetch_memory(user_id, limit)
+    finally:
+        _inflight.pop(key, None)
+    # Don't cache a result that an invalidation made stale while it was in flight
+    if _generation.get(user_id, 0) == generation:
+        _memory_cache.setdefault(user_id, {})[limit] = (time.monotonic() + MEMORY_CACHE_TTL, generation, memory)
+        _memory_cache.move_to_end(user_id)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return memory
+
+
+# ░░░ SHORT-TERM MEMORY (Firestore) ░░░
+async def get_memory(user_id: str, limit: int = 3) -> List[Dict]:
+    """Return the last <limit> completed actions + generated documents for the user.
+    Cached per user; concurrent misses share a single Firestore fetch."""
+    key = (user_id, limit)
+    cached = _memory_cache.get(user_id, {}).get(limit)
+    if cached and cached[0] > time.monotonic():
+        _memory_cache.move_to_end(user_id)
+        return list(cached[2])
 
+    try:
+        task = _inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(_load_memory(key))
+            _inflight[key] = task
+        return list(await asyncio.shield(task))
     except Exception as e:
         print(f"[MEMORY ERROR] {e}")
         return []
 
 
-def get_memory_context(user_id: str, context: dict) -> dict:
-    """Synchronous helper: merges short-term memory into the provided context."""
-    context["memory"] = get_memory(user_id)
-    return context
+async def _fetch_memory(user_id: str, limit: int) -> List[Dict]:
+    memory: List[Dict] = []
+    repo = hub(user_id)
 
+    # Completed actions
+    actions = await repo.actions.list(
+        filters=[("status", "==", "completed")],
+        order_by="completedAt",
+        direction=Query.DESCENDING,
+        limit=limit,
+    )
+    for data in actions:
+        memory.append(
+            {
+                "type": data.get("type"),
+                "output": data.get("output"),
+                "timestamp": data.get("completedAt").isoformat() if data.get("completedAt") else None,
+            }
+        )
 
-async def get_memory_context_async(user_id: str, context: dict | None = None) -> List[Dict]:
-    """Async wrapper for pipelines that already work with `await`. Returns short-term memory list."""
-    return get_memory(user_id)
+    # Recent documents
+    documents = await repo.documents.list(order_by="generatedAt", direction=Query.DESCENDING, limit=limit)
+    for data in documents:
+        memory.append(
+            {
+                "type": data.get("type", "document"),
+                "output": data.get("content"),
+                "timestamp": data.get("generatedAt").isoformat() if data.get("generatedAt") else None,
+            }
+        )
 
+    # Order by timestamp desc
+    memory.sort(key=lambda x: x.get("timestamp") or "", reverse=True)
+    return memory[:limit]
 
-# ░░░ LONG-TERM MEMORY (Vector DB, e.g. Weaviate) ░░░
-# Optional — returns [] if vector backend is not configured / dependency missing.
-try:
-    import weaviate  # type: ignore[import]  # <- sopprime l'avviso Pylance
-except ImportError:
-    weaviate = None  # Graceful fallback if library is absent
 
+async def get_memory_context(user_id: str, context: dict | None = None, **_) -> List[Dict]:
+    """Short-term memory list for dispatchers (context/intent accepted for call-site compatibility)."""
+    return await get_memory(user_id)
+
+
+async def get_memory_context_async(user_id: str, context: dict | None = None) -> List[Dict]:
+    """Async wrapper for pipelines that already work with `await`. Returns short-term memory list."""
+    return await get_memory(user_id)
 
-async def get_vector_memory(user_id: str, k: int = 5) -> List[Dict]:
-    """Fetch top-k vector memories for user (if service configured), else empty list."""
-    if weaviate is None:
-        return []
 
-    url = os.getenv("VECTOR_DB_URL")
-    api_key = os.getenv("VECTOR_DB_API_KEY")
-    if not url or not api_key:
+# ░░░ LONG-TERM MEMORY (pluggable vector store) ░░░
+# Backend from utils.vectorMemory: embedded NumPy store (default, offline) or Weaviate adapter.
+async def get_vector_memory(user_id: str, k: int = 5, query: str | None = None) -> List[Dict]:
+    """Top-k vector memories for user (similar to <query> if given, else most recent); [] if disabled."""
+    backend = get_vector_backend()
+    if backend is None:
         return []
 
     try:
-        client = weaviate.Client(
-            url=url,
-            additional_headers={"X-OpenAI-Api-Key": api_key},
-        )
-
-        result = (
-            client.query.get("MemoryChunk", ["text", "createdAt"])
-            .with_where({"path": ["userId"], "operator": "Equal", "valueString": user_id})
-            .with_limit(k)
-            .do()
-        )
-        memories: List[Dict] = [
+        results = await backend.search(user_id, query, k)
+        return [
             {
                 "type": "vector_memory",
                 "output": obj.get("text"),
                 "timestamp": obj.get("createdAt"),
+                "score": obj.get("score"),
             }
-            for obj in result.get("data", {}).get("Get", {}).get("MemoryChunk", [])
+            for obj in results
         ]
-        return memories
     except Exception as e:
         print(f"[VECTOR MEMORY ERROR] {e}")
         return []
 
 
+async def add_vector_memory(user_id: str, text: str, metadata: dict | None = None) -> bool:
+    """Store a long-term memory chunk for the user in the configured vector backend."""
+    backend = get_vector_backend()
+    if backend is None or not text:
+        return False
+    try:
+        await backend.add(user_id, text, metadata)
+        return True
+    except Exception as e:
+        print(f"[VECTOR MEMORY ERROR] {e}")
+        return False
+
+
+_indexing: set = set()  # background embedding tasks (strong refs until done)
+
+
+@on_record
+def index_vector_memory(user_id: str, collection: str, doc_id: str, data: Dict) -> None:
+    """Long-term memory producer: generated documents and completed action outputs are embedded in the background."""
+    if collection == "documents":
+        text = data.get("content")
+    elif collection == "actions" and data.get("status") == "completed":
+        text = data.get("output")
+    else:
+        return
+    if not isinstance(text, str) or not text.strip():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    metadata = {"type": data.get("type") or collection, "source": collection, "docId": doc_id}
+    task = loop.create_task(add_vector_memory(user_id, text, metadata))
+    _indexing.add(task)
+    task.add_done_callback(_indexing.discard)
+
+
 # ░░░ COMBINED HELPER ░░░
-async def get_full_memory(user_id: str, short_limit: int = 3, vector_k: int = 5) -> List[Dict]:
-    """Fuse short-term Firestore memory with long-term vector memory (if available)."""
-    short_mem = get_memory(user_id, short_limit)
-    vector_mem = await get_vector_memory(user_id, vector_k)
-    all_mem = short_mem + vector_mem
-    all_mem.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-    return all_mem
+SHORT_MEMORY_TIMEOUT = float(os.getenv("MEMORY_SHORT_TIMEOUT", "2.0"))    # seconds per source
+VECTOR_MEMORY_TIMEOUT = float(os.getenv("MEMORY_VECTOR_TIMEOUT", "1.5"))
+RECENCY_HALF_LIFE_HOURS = float(os.getenv("MEMORY_RECENCY_HALF_LIFE_H", "72"))
+RELEVANCE_WEIGHT = 0.6
+RECENCY_WEIGHT = 0.4
+SHORT_TERM_RELEVANCE = 0.5  # Firestore items carry no similarity score
+
+
+async def _within_budget(coro, timeout: float, source: str) -> List[Dict]:
+    """Run one memory source under its own deadline; degrade to [] on timeout/error."""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        print(f"[MEMORY] ⏱️ {source} memory exceeded {timeout}s budget")
+    except Exception as e:
+        print(f"[MEMORY ERROR] {source}: {e}")
+    return []
+
+
+async def gather_memory_sources(user_id: str, short_limit: int = 3, vector_k: int = 5, query: str | None = None) -> Dict[str, List[Dict]]:
+    """Fetch all memory sources concurrently: latency is max(source), not the sum."""
+    short_mem, vector_mem = await asyncio.gather(
+        _within_budget(get_memory(user_id, short_limit), SHORT_MEMORY_TIMEOUT, "short-term"),
+        _within_budget(get_vector_memory(user_id, vector_k, query), VECTOR_MEMORY_TIMEOUT, "vector"),
+    )
+    return {"short": short_mem, "vector": vector_mem}
+
+
+def _age_hours(timestamp, now: datetime) -> float | None:
+    if not timestamp:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return max(0.0, (now - ts).total_seconds() / 3600)
+
+
+def rank_memory(items: List[Dict], now: datetime | None = None) -> List[Dict]:
+    """Order by weighted relevance (vector similarity) + recency (exponential half-life decay)."""
+    now = now or datetime.utcnow()
+    ranked, seen = [], set()
+    for item in items:
+        text = str(item.get("output"))
+        if text in seen:
+            continue
+        seen.add(text)
+        relevance = item.get("score")
+        relevance = SHORT_TERM_RELEVANCE if relevance is None else float(relevance)
+        age = _age_hours(item.get("timestamp"), now)
+        recency = 0.0 if age is None else 0.5 ** (age / RECENCY_HALF_LIFE_HOURS)
+        ranked.append({**item, "rank_score": round(RELEVANCE_WEIGHT * relevance + RECENCY_WEIGHT * recency, 4)})
+    ranked.sort(key=lambda x: x["rank_score"], reverse=True)
+    return ranked
+
+
+async def get_full_memory(user_id: str, short_limit: int = 3, vector_k: int = 5, query: str | None = None) -> List[Dict]:
+    """Fuse short-term Firestore memory with long-term vector memory (if available), ranked."""
+    sources = await gather_memory_sources(user_id, short_limit, vector_k, query)
+    return rank_memory(sources["short"] + sources["vector"])
@@ -1,21 +1,50 @@
-from firebase_config import db
+from firebase_config import async_db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from uuid import uuid4
 from datetime import datetime
-import openai
-import os
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging
+from utils.llmGateway import chat_completion  # ✅ Gateway OpenAI async
+from utils.pricingEngine import local_price, price_calendar, save_calendars, summarize  # ⚡ Pricing vettoriale NumPy
+from utils.pricingCompletion import PRICE_TOOLS, PRICE_TOOL_CHOICE, resolve_price  # 🧾 Output strutturato
+
+# ✅ Calendario completo (camere × date) per una o più strutture: NumPy, nessuna chiamata LLM
+async def handle_calendars(user_id: str, context: dict):
+    now = datetime.utcnow()
+    action_id = str(uuid4())
+    calendars = context.get("calendars") or [context["calendar"]]
+
+    priced = [price_calendar(calendar) for calendar in calendars]
+    written = await save_calendars(user_id, priced)
+
+    output = {
+        "status": "completed",
+        "properties": [summarize(p) for p in priced],
+        "documents_written": written,
+        "model_used": "pricingEngine"
+    }
+    await hub(user_id).actions.set(action_id, {
+        "actionId": action_id,
+        "type": "pricing",
+        "status": "completed",
+        "startedAt": now,
+        "completedAt": datetime.utcnow(),
+        "context": {k: v for k, v in context.items() if k not in ("calendar", "calendars")},
+        "output": output
+    })
+    return output
 
-# ✅ Configura OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("⚠️ OPENAI_API_KEY mancante")
-client = openai.OpenAI(api_key=openai_api_key)
 
 # ✅ Funzione principale del dispatcher
 async def handle(user_id: str, context: dict):
     now = datetime.utcnow()
     action_id = str(uuid4())
     try:
+        # 📅 Griglia completa → engine vettoriale
+        if context.get("calendars") or context.get("calendar"):
+            output = await handle_calendars(user_id, context)
+            log_info(user_id, "pricingDispatcher", "calendar_repricing", {"properties": len(output["properties"])}, output)
+            return output
+
         # 📥 Estrai parametri dal context
         property_id = context.get("property_id")
         current_price = context.get("current_price")
@@ -36,25 +65,34 @@ Il prezzo attuale è {current_price}€.
 Tasso occupazione: {occupancy_rate*100:.1f}%.
 Prezzo medio competitor: {avg_competitor_price:.2f}€.
 Fattore stagionalità: {seasonality_factor}.
+Prezzo base calcolato: {base_price:.2f}€.
 Suggerisci il miglior prezzo di vendita per massimizzare occupazione e profitto.
-Rispondi solo con il prezzo consigliato in euro.
+Rispondi chiamando la funzione suggest_price con il prezzo in euro.
 """
 
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Sei un esperto di pricing hotel."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.5
+            temperature=0.5,
+            tools=PRICE_TOOLS,
+            tool_choice=PRICE_TOOL_CHOICE,
+            source="pricingDispatcher",
+            user_id=user_id
         )
 
-        price_raw = response.choices[0].message.content.strip()
-        optimized_price = float(price_raw.replace("€", "").replace(",", ".").split()[0])
+        # 🧾 Parser tollerante + limiti rispetto al base_price; se illeggibile → prezzo locale
+        optimized_price, price_source = resolve_price(
+            response.choices[0].message,
+            base_price,
+            fallback_price=local_price(current_price, occupancy_rate, competitor_prices, seasonality_factor),
+        )
         delta_percentage = round((optimized_price - current_price) / current_price * 100, 2)
 
         # 💾 Salva prezzi ottimizzati
-        db.collection("DynamicPricing").document(property_id).set({
+        await async_db.collection("DynamicPricing").document(property_id).set({
             "userId": user_id,
             "propertyId": property_id,
             "current_price": current_price,
@@ -64,6 +102,7 @@ Rispondi solo con il prezzo consigliato in euro.
             "competitor_prices": competitor_prices,
             "seasonality_factor": seasonality_factor,
             "delta_percentage": delta_percentage,
+            "price_source": price_source,
             "generatedAt": now
         })
 
@@ -79,17 +118,18 @@ Rispondi solo con il prezzo consigliato in euro.
                 "optimized_price": optimized_price,
                 "base_price": round(base_price, 2),
                 "delta_percentage": delta_percentage,
+                "price_source": price_source,
                 "model_used": "gpt-4"
             }
         }
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set(action_data)
+        await hub(user_id).actions.set(action_id, action_data)
 
         log_info(user_id, "pricingDispatcher", "price_optimization", context, action_data["output"])
         return action_data["output"]
 
     except Exception as e:
         log_error(user_id, "pricingDispatcher", "price_optimization", e, context)
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set({
+        await hub(user_id).actions.set(action_id, {
             "actionId": action_id,
             "type": "pricing",
             "status": "error",
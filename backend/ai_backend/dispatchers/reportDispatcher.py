@@ -1,4 +1,4 @@
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from datetime import datetime
 from uuid import uuid4
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging centralizzato
@@ -29,7 +29,8 @@ async def handle(user_id: str, context: dict):
         }
 
         # 💾 Salva documento
-        db.collection("ai_agent_hub").document(user_id).collection("documents").document(action_id).set(doc_data)
+        repo = hub(user_id)
+        await repo.documents.set(action_id, doc_data)
 
         # 🧠 Tracciamento azione IA
         action_data = {
@@ -44,7 +45,7 @@ async def handle(user_id: str, context: dict):
                 "linkedSession": session_id
             }
         }
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set(action_data)
+        await repo.actions.set(action_id, action_data)
 
         log_info(user_id, "reportDispatcher", "generate_report", context, action_data["output"])
 
@@ -1,6 +1,6 @@
 from datetime import datetime
 from uuid import uuid4
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging standard
 
 # ✅ Funzione principale dell'agente Security
@@ -43,10 +43,11 @@ async def handle(user_id: str, context: dict):
             }
         }
 
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set(action_data)
+        repo = hub(user_id)
+        await repo.actions.set(action_id, action_data)
 
         # 📝 Salva anche come documento log
-        db.collection("ai_agent_hub").document(user_id).collection("documents").document(action_id).set({
+        await repo.documents.set(action_id, {
             "documentId": action_id,
             "type": "security_log",
             "generatedAt": now,
@@ -56,10 +57,10 @@ async def handle(user_id: str, context: dict):
         })
 
         # 🆙 Aggiorna stato utente
-        db.collection("ai_agent_hub").document(user_id).set({
+        await repo.set_root({
             "lastActive": now,
             "lastCompletedAction": action_id
-        }, merge=True)
+        })
 
         log_info(user_id, "securityDispatcher", "security_event", context, action_data["output"])
         return {
@@ -1,9 +1,9 @@
 from datetime import datetime, timedelta
 import uuid
-import openai
-import os
-from firebase_config import db  # ✅ Connessione centralizzata
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging
+from utils.llmGateway import chat_completion  # ✅ Gateway OpenAI async
+from utils.keywordMatcher import KeywordMatcher, longest_match  # 🔎 Aho-Corasick
 
 MODEL = "gpt-4"
 
@@ -29,53 +29,68 @@ FALLBACKS = {
     "problema sincronizzazione": "La sincronizzazione potrebbe impiegare alcuni minuti. Attendi e riprova.",
 }
 
+# 🚦 Parole chiave di priorità (la più alta trovata vince)
+PRIORITY_KEYWORDS = {
+    "alta": ["login", "errore", "bloccato", "non accede", "non funziona", "check-in", "pagamento", "accesso"],
+    "media": ["ota", "sincronizzazione", "email", "grafico", "backup"],
+}
+PRIORITY_RANK = {"alta": 2, "media": 1, "bassa": 0}
+
+# ⚡ Automa unico (fallback + priorità) costruito all'import: un solo passaggio lineare sul testo
+SUPPORT_MATCHER = KeywordMatcher(
+    [(keyword, ("fallback", keyword)) for keyword in FALLBACKS]
+    + [(kw, ("priority", level)) for level, keywords in PRIORITY_KEYWORDS.items() for kw in keywords]
+)
+
+def _priority_from(matches) -> str:
+    levels = [m.value[1] for m in matches if m.value[0] == "priority"]
+    return max(levels, key=PRIORITY_RANK.get, default="bassa")
+
+def _fallback_from(matches):
+    match = longest_match(m for m in matches if m.value[0] == "fallback")
+    return (match.value[1], FALLBACKS[match.value[1]]) if match else None
+
 # 🔍 Classifica la priorità
 def classify_priority(issue: str) -> str:
-    issue = issue.lower()
-    if any(kw in issue for kw in ["login", "errore", "bloccato", "non accede", "non funziona", "check-in", "pagamento", "accesso"]):
-        return "alta"
-    if any(kw in issue for kw in ["ota", "sincronizzazione", "email", "grafico", "backup"]):
-        return "media"
-    return "bassa"
+    return _priority_from(SUPPORT_MATCHER.find_all(issue))
 
 # ✅ Funzione principale del dispatcher
 async def handle(user_id: str, context: dict):
     now = datetime.utcnow()
     support_id = str(uuid.uuid4())
     issue = context.get("message", "").lower()
-    priority = classify_priority(issue)
+    matches = SUPPORT_MATCHER.find_all(issue)
+    priority = _priority_from(matches)
 
-    # 🔍 Cerca risposta tra fallback
-    for keyword, reply in FALLBACKS.items():
-        if keyword in issue:
-            _log_ticket(user_id, support_id, issue, reply, handled=True, method="fallback", priority=priority)
-            return {
-                "status": "completed",
-                "handledBy": "fallback",
-                "response": reply,
-                "ticketId": support_id
-            }
+    # 🔍 Cerca risposta tra fallback (longest-match-wins)
+    fallback = _fallback_from(matches)
+    if fallback:
+        keyword, reply = fallback
+        await _log_ticket(user_id, support_id, issue, reply, handled=True, method="fallback", priority=priority)
+        return {
+            "status": "completed",
+            "handledBy": "fallback",
+            "response": reply,
+            "ticketId": support_id
+        }
 
     # 🤖 Se non trovato → usa GPT
     try:
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
-            raise RuntimeError("❌ OPENAI_API_KEY mancante")
-
-        client = openai.OpenAI(api_key=openai_api_key)
         messages = [
             {"role": "system", "content": "Sei un assistente supporto tecnico per utenti SaaS. Dai risposte brevi, utili e amichevoli."},
             {"role": "user", "content": issue}
         ]
-        completion = client.chat.completions.create(
+        completion = await chat_completion(
             model=MODEL,
             messages=messages,
             temperature=0.2,
-            max_tokens=400
+            max_tokens=400,
+            source="supportDispatcher",
+            user_id=user_id
         )
 
         response = completion.choices[0].message.content.strip()
-        _log_ticket(user_id, support_id, issue, response, handled=True, method="gpt", priority=priority)
+        await _log_ticket(user_id, support_id, issue, response, handled=True, method="gpt", priority=priority)
 
         log_info(user_id, "supportDispatcher", "support_request", context, {"response": response})
         return {
@@ -87,7 +102,7 @@ async def handle(user_id: str, context: dict):
 
     except Exception as e:
         fallback_msg = "Al momento non riesco a risolvere il problema. Ti ricontatteremo a breve con una soluzione."
-        _log_ticket(user_id, support_id, issue, fallback_msg, handled=False, method="fallback_error", error=str(e), priority=priority)
+        await _log_ticket(user_id, support_id, issue, fallback_msg, handled=False, method="fallback_error", error=str(e), priority=priority)
         log_error(user_id, "supportDispatcher", "support_request", e, context)
         return {
             "status": "error",
@@ -98,10 +113,10 @@ async def handle(user_id: str, context: dict):
         }
 
 # 📝 Logging del ticket su Firestore
-def _log_ticket(user_id, ticket_id, issue, response, handled=True, method="fallback", error=None, priority="media"):
+async def _log_ticket(user_id, ticket_id, issue, response, handled=True, method="fallback", error=None, priority="media"):
     deadline = datetime.utcnow() + timedelta(minutes=30) if priority == "alta" else None
 
-    db.collection("support_tickets").document(ticket_id).set({
+    await async_db.collection("support_tickets").document(ticket_id).set({
         "user_id": user_id,
         "ticket_id": ticket_id,
         "issue": issue,
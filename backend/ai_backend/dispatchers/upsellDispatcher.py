@@ -1,6 +1,9 @@
 from datetime import datetime
 from uuid import uuid4
-from firebase_config import db
+from typing import Dict, Iterable, List, Set
+from utils.hubRepository import hub  # ⚡ Firestore async
+from utils import profileCache  # ⚡ Profilo struttura in cache
+from utils.textUtils import normalize  # 🔤 minuscolo, senza accenti/punteggiatura
 from dispatchers.logUtils import log_info, log_error  # ✅ Logging uniforme
 
 # ✅ Mappa suggerimenti up-sell standard
@@ -17,53 +20,133 @@ UPSERVICES_SUGGESTIONS = {
     "Late check-out": "Late check-out garantito gratuito."
 }
 
+# ✅ Catalogo: sinonimi con cui il servizio può comparire nel profilo, priorità di ranking
+#    e livello camera offerto (solo upgrade verso un livello superiore a quello prenotato)
+UPSELL_CATALOG = {
+    "Deluxe": {"synonyms": ("camera deluxe", "upgrade deluxe"), "priority": 90, "room_tier": 2},
+    "Suite": {"synonyms": ("junior suite", "upgrade suite"), "priority": 100, "room_tier": 3},
+    "Spa": {"synonyms": ("wellness", "centro benessere", "benessere", "sauna"), "priority": 70},
+    "Parcheggio": {"synonyms": ("parking", "garage", "posto auto"), "priority": 30},
+    "Colazione": {"synonyms": ("breakfast", "colazione in camera"), "priority": 50},
+    "Shuttle": {"synonyms": ("navetta", "transfer", "shuttle service"), "priority": 40},
+    "Cena": {"synonyms": ("dinner", "ristorante", "cena romantica"), "priority": 60},
+    "Wine tasting": {"synonyms": ("degustazione vini", "degustazione", "wine"), "priority": 55},
+    "Early check-in": {"synonyms": ("early checkin", "check-in anticipato"), "priority": 45},
+    "Late check-out": {"synonyms": ("late checkout", "check-out posticipato"), "priority": 45},
+}
+
+# ✅ Livelli camera: gli upgrade sono proposti solo a chi ha prenotato un livello inferiore
+ROOM_TIERS = {"economy": 0, "standard": 0, "classic": 0, "superior": 1, "deluxe": 2, "junior suite": 3, "suite": 3}
+
+MAX_NGRAM = max(len(normalize(term).split()) for key, item in UPSELL_CATALOG.items() for term in (key, *item["synonyms"]))
+
+
+# 🧭 Indice precompilato: frase normalizzata (1..MAX_NGRAM token) → voce di catalogo
+def build_index(catalog: Dict[str, dict]) -> Dict[str, str]:
+    index = {}
+    for key, item in catalog.items():
+        for term in (key, *item["synonyms"]):
+            index[normalize(term)] = key
+    return index
+
+
+UPSELL_INDEX = build_index(UPSELL_CATALOG)
+
+
+def match_catalog(texts: Iterable[str]) -> Set[str]:
+    """Voci di catalogo citate nei testi (servizi del profilo, extra già acquistati...)."""
+    matched = set()
+    for text in texts:
+        tokens = normalize(text or "").split()
+        for n in range(1, MAX_NGRAM + 1):
+            for i in range(len(tokens) - n + 1):
+                key = UPSELL_INDEX.get(" ".join(tokens[i:i + n]))
+                if key:
+                    matched.add(key)
+    return matched
+
+
+def room_tier(room_type: str) -> int:
+    return ROOM_TIERS.get(normalize(room_type or ""), 0)
+
+
+def rank_suggestions(booking: dict, available: Set[str]) -> List[str]:
+    """Suggerimenti per una prenotazione: servizi disponibili, idonei alla camera, per priorità."""
+    tier = room_tier(booking.get("room_type", "Standard"))
+    already = match_catalog(booking.get("extras") or [])
+    eligible = [
+        key for key in available
+        if key not in already and UPSELL_CATALOG[key].get("room_tier", tier + 1) > tier
+    ]
+    eligible.sort(key=lambda key: UPSELL_CATALOG[key]["priority"], reverse=True)
+    return [UPSERVICES_SUGGESTIONS[key] for key in eligible]
+
+
+def _booking_action(action_id: str, booking: dict, context: dict, suggestions: List[str], now: datetime) -> dict:
+    return {
+        "actionId": action_id,
+        "type": "upsell",
+        "status": "completed",
+        "startedAt": now,
+        "completedAt": now,
+        "context": context,
+        "output": {
+            "suggestions": suggestions,
+            "guest_name": booking.get("guest_name", "Valued Guest"),
+            "booking_id": booking.get("booking_id", "N/A"),
+            "checkin_date": booking.get("checkin_date", "N/A"),
+            "room_type": booking.get("room_type", "Standard"),
+        }
+    }
+
+
+# ✅ Batch: tutte le prenotazioni (es. arrivi del giorno) in un solo passaggio
+async def handle_batch(user_id: str, bookings: List[dict], context: dict):
+    now = datetime.utcnow()
+
+    # 📦 Profilo letto (dalla cache) e indicizzato una volta per tutto il batch
+    profile = await profileCache.get_snapshot(user_id)
+    available = match_catalog(profile.services)
+
+    results, actions = [], []
+    for booking in bookings:
+        action_id = str(uuid4())
+        suggestions = rank_suggestions(booking, available)
+        if not suggestions:
+            suggestions = ["🎯 Nessun servizio extra disponibile per l'up-sell al momento."]
+        action_context = {**context, "booking": booking} if context else booking
+        actions.append((action_id, _booking_action(action_id, booking, action_context, suggestions, now)))
+        results.append({"booking_id": booking.get("booking_id", "N/A"), "actionId": action_id, "suggestions": suggestions})
+
+    # 💾 Tutte le azioni in WriteBatch (contatori daily_stats nello stesso commit)
+    await hub(user_id).actions.set_many(actions)
+    return results
+
+
 # ✅ Funzione principale dell'agente upsell
 async def handle(user_id: str, context: dict):
     now = datetime.utcnow()
     action_id = str(uuid4())
 
     try:
-        # 🎯 Estrai dettagli booking
-        guest_name = context.get("guest_name", "Valued Guest")
-        booking_id = context.get("booking_id", "N/A")
-        checkin_date = context.get("checkin_date", "N/A")
-        room_type = context.get("room_type", "Standard")
-
-        # 📦 Recupera profilo struttura
-        profile_doc = db.collection("ai_agent_hub").document(user_id).collection("properties").document("main").get()
-        profile_data = profile_doc.to_dict() if profile_doc.exists else {}
-
-        # 🔎 Servizi disponibili effettivi
-        available_services = profile_data.get("services", []) + profile_data.get("extraServices", [])
-        available_services_lower = [s.lower() for s in available_services]
-
-        # 🔍 Crea suggerimenti coerenti
-        suggestions = []
-        for keyword, message in UPSERVICES_SUGGESTIONS.items():
-            if keyword.lower() in available_services_lower:
-                suggestions.append(message)
-
-        if not suggestions:
-            suggestions.append("🎯 Nessun servizio extra disponibile per l'up-sell al momento.")
-
-        # 💾 Salva azione IA
-        action_data = {
-            "actionId": action_id,
-            "type": "upsell",
-            "status": "completed",
-            "startedAt": now,
-            "completedAt": now,
-            "context": context,
-            "output": {
-                "suggestions": suggestions,
-                "guest_name": guest_name,
-                "booking_id": booking_id,
-                "checkin_date": checkin_date
+        # 🎯 Più prenotazioni → engine batch
+        bookings = context.get("bookings")
+        if isinstance(bookings, list):
+            shared = {k: v for k, v in context.items() if k != "bookings"}
+            results = await handle_batch(user_id, bookings, shared)
+            log_info(user_id, "upsellDispatcher", "upsell_batch", shared, {"bookings": len(results)})
+            return {
+                "status": "completed",
+                "count": len(results),
+                "results": results,
+                "message": f"✅ Suggerimenti up-sell generati per {len(results)} prenotazioni."
             }
-        }
 
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set(action_data)
-        log_info(user_id, "upsellDispatcher", "upsell_suggestions", context, action_data["output"])
+        # 🎯 Singola prenotazione (contratto originale)
+        results = await handle_batch(user_id, [context], {})
+        action_id = results[0]["actionId"]
+        suggestions = results[0]["suggestions"]
+        log_info(user_id, "upsellDispatcher", "upsell_suggestions", context, {"suggestions": suggestions})
 
         return {
             "status": "completed",
@@ -74,7 +157,7 @@ async def handle(user_id: str, context: dict):
 
     except Exception as e:
         log_error(user_id, "upsellDispatcher", "upsell_suggestions", e, context)
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).set({
+        await hub(user_id).actions.set(action_id, {
             "status": "error",
             "startedAt": now,
             "completedAt": datetime.utcnow(),
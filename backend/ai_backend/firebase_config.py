@@ -1,10 +1,13 @@
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
 
 # ✅ Inizializza Firebase una sola volta, con credenziali corrette
 if not firebase_admin._apps:
     cred = credentials.Certificate("E:/ATBot/backend/serviceAccountKey.json")
     firebase_admin.initialize_app(cred)
 
-# ✅ Client Firestore da usare ovunque
+# ✅ Client Firestore sincrono (script e cron fuori dall'event loop)
 db = firestore.client()
+
+# ⚡ Client Firestore asincrono unico per route e dispatcher
+async_db = firestore_async.client()
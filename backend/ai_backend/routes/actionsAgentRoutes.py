@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Path
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from firebase_admin import firestore
 
 router = APIRouter()
@@ -8,14 +8,11 @@ router = APIRouter()
 @router.get("/agent/actions/{user_id}")
 async def get_agent_actions(user_id: str):
     try:
-        actions_ref = (
-            db.collection("ai_agent_hub")
-            .document(user_id)
-            .collection("actions")
-            .order_by("startedAt", direction=firestore.Query.DESCENDING)
+        return await hub(user_id).actions.list(
+            order_by="startedAt",
+            direction=firestore.Query.DESCENDING,
+            id_field="id"
         )
-        actions = [doc.to_dict() | {"id": doc.id} for doc in actions_ref.stream()]
-        return actions
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero azioni IA: {str(e)}")
 
@@ -25,8 +22,7 @@ async def update_action(user_id: str = Path(...), action_id: str = Path(...), pa
     try:
         if not payload:
             raise HTTPException(status_code=400, detail="❌ Payload mancante.")
-        doc_ref = db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id)
-        doc_ref.update(payload)
+        await hub(user_id).actions.update(action_id, payload)
         return {"message": "✅ Azione aggiornata con successo"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore aggiornamento azione: {str(e)}")
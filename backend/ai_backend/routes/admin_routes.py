@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException, Request
-from firebase_admin import firestore, auth
+from firebase_admin import auth
 from datetime import datetime
+from utils import usageLedger  # 📒 Rollup giornalieri usage token
 
 router = APIRouter()
-db = firestore.client()
 
 @router.get("/admin/ia/spending-today")
 async def get_today_gpt_spending(request: Request):
@@ -17,27 +17,11 @@ async def get_today_gpt_spending(request: Request):
         if decoded_token.get("role") != "admin":
             raise HTTPException(status_code=403, detail="Accesso negato")
 
+        # 📒 Rollup pre-aggregati: NUM_SHARDS letture, prezzi per modello
         today = datetime.utcnow().date()
-        start_ts = datetime.combine(today, datetime.min.time())
-        end_ts = datetime.combine(today, datetime.max.time())
-
-        logs_ref = db.collection("gpt_usage_logs")
-        query = logs_ref.where("timestamp", ">=", start_ts).where("timestamp", "<=", end_ts)
-        docs = query.stream()
-
-        total_tokens = 0
-        for doc in docs:
-            data = doc.to_dict()
-            total_tokens += data.get("total_tokens", 0)
-
-        token_rate = 0.06 / 1000
-        cost = round(total_tokens * token_rate, 4)
-
-        return {
-            "date": today.isoformat(),
-            "total_tokens": total_tokens,
-            "estimated_cost_usd": cost
-        }
+        return await usageLedger.get_daily_usage(today.isoformat())
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore nel calcolo spesa GPT: {str(e)}")
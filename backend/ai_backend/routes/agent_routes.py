@@ -3,16 +3,12 @@ from pydantic import BaseModel
 from uuid import uuid4
 from datetime import datetime
 from typing import Optional, List
-import firebase_admin
 from firebase_admin import firestore
+from utils.hubRepository import hub  # ⚡ Firestore async
+from utils import profileCache  # ⚡ Profilo struttura in cache (invalidata dal POST)
 
 router = APIRouter()
 
-# ✅ Inizializza Firebase se non attivo
-if not firebase_admin._apps:
-    firebase_admin.initialize_app()
-db = firestore.client()
-
 # ✅ Modelli
 class AgentActionRequest(BaseModel):
     user_id: str
@@ -40,10 +36,8 @@ async def track_agent_action(request: AgentActionRequest):
         now = datetime.utcnow()
         action_id = str(uuid4())
 
-        doc_ref = db.collection("ai_agent_hub").document(request.user_id)
-        actions_ref = doc_ref.collection("actions").document(action_id)
-
-        actions_ref.set({
+        repo = hub(request.user_id)
+        await repo.actions.set(action_id, {
             "actionId": action_id,
             "type": request.type,
             "status": "pending",
@@ -52,12 +46,12 @@ async def track_agent_action(request: AgentActionRequest):
             "output": {},
         })
 
-        doc_ref.set({
+        await repo.set_root({
             "userId": request.user_id,
             "lastActive": now,
             "lastCompletedAction": None,
             "pendingActions": firestore.ArrayUnion([action_id])
-        }, merge=True)
+        })
 
         return {"message": "✅ Azione IA tracciata", "actionId": action_id}
 
@@ -68,9 +62,7 @@ async def track_agent_action(request: AgentActionRequest):
 @router.get("/agent/actions/{user_id}")
 async def get_user_actions(user_id: str):
     try:
-        actions_ref = db.collection("ai_agent_hub").document(user_id).collection("actions")
-        docs = actions_ref.stream()
-        return [doc.to_dict() for doc in docs]
+        return await hub(user_id).actions.list()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero azioni: {str(e)}")
 
@@ -78,18 +70,18 @@ async def get_user_actions(user_id: str):
 @router.patch("/agent/actions/{user_id}/{action_id}")
 async def update_agent_action(user_id: str, action_id: str, update: AgentActionUpdate):
     try:
-        ref = db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id)
+        repo = hub(user_id)
         updates = {}
         if update.status:
             updates["status"] = update.status
             if update.status == "completed":
-                db.collection("ai_agent_hub").document(user_id).update({
+                await repo.update_root({
                     "lastCompletedAction": action_id,
                     "pendingActions": firestore.ArrayRemove([action_id])
                 })
         if update.output:
             updates["output"] = update.output
-        ref.update(updates)
+        await repo.actions.update(action_id, updates)
         return {"message": "✅ Azione aggiornata"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore aggiornamento azione: {str(e)}")
@@ -98,7 +90,7 @@ async def update_agent_action(user_id: str, action_id: str, update: AgentActionU
 @router.delete("/agent/actions/{user_id}/{action_id}")
 async def delete_agent_action(user_id: str, action_id: str):
     try:
-        db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id).delete()
+        await hub(user_id).actions.delete(action_id)
         return {"message": "✅ Azione eliminata"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore eliminazione azione: {str(e)}")
@@ -107,10 +99,10 @@ async def delete_agent_action(user_id: str, action_id: str):
 @router.get("/agent/hub-status/{user_id}")
 async def get_agent_hub_status(user_id: str):
     try:
-        doc = db.collection("ai_agent_hub").document(user_id).get()
-        if not doc.exists:
+        data = await hub(user_id).get_root()
+        if data is None:
             raise HTTPException(status_code=404, detail="Utente non trovato")
-        return doc.to_dict()
+        return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero stato HUB: {str(e)}")
 
@@ -118,9 +110,7 @@ async def get_agent_hub_status(user_id: str):
 @router.get("/agent/documents/{user_id}")
 async def get_generated_documents(user_id: str):
     try:
-        docs_ref = db.collection("ai_agent_hub").document(user_id).collection("documents")
-        docs = docs_ref.stream()
-        return [doc.to_dict() for doc in docs]
+        return await hub(user_id).documents.list()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero documenti: {str(e)}")
 
@@ -128,15 +118,13 @@ async def get_generated_documents(user_id: str):
 @router.get("/agent/config/{user_id}")
 async def get_agent_config(user_id: str):
     try:
-        doc_ref = db.collection("ai_agent_hub").document(user_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        data = await hub(user_id).get_root()
+        if data is None:
             return {
                 "autonomyLevel": "base",
                 "enabledAutomations": {},
                 "plan": "BASE"
             }
-        data = doc.to_dict()
         return {
             "autonomyLevel": data.get("autonomyLevel", "base"),
             "enabledAutomations": data.get("enabledAutomations", {}),
@@ -164,8 +152,7 @@ Ecco i dettagli della tua prenotazione:
         message += "\n📩 Riceverai un'email o un messaggio WhatsApp con tutte le istruzioni utili.\nGrazie per aver scelto la nostra struttura!"
 
         action_id = str(uuid4())
-        action_ref = db.collection("ai_agent_hub").document(request.user_id).collection("actions").document(action_id)
-        action_ref.set({
+        await hub(request.user_id).actions.set(action_id, {
             "actionId": action_id,
             "type": "checkin_welcome",
             "status": "completed",
@@ -199,8 +186,7 @@ async def generate_report_from_chat(context: dict):
         timestamp = datetime.utcnow()
         doc_id = str(uuid4())
 
-        doc_ref = db.collection("ai_agent_hub").document(user_id).collection("documents").document(doc_id)
-        doc_ref.set({
+        await hub(user_id).documents.set(doc_id, {
             "documentId": doc_id,
             "type": "report",
             "content": report_content,
@@ -255,8 +241,8 @@ class StructureProfile(BaseModel):
 @router.post("/agent/profile")
 async def save_structure_profile(profile: StructureProfile):
     try:
-        doc_ref = db.collection("ai_agent_hub").document(profile.user_id).collection("properties").document("main")
-        doc_ref.set(profile.dict(exclude={"user_id"}), merge=True)
+        # 🔁 La scrittura via repository invalida anche lo snapshot in profileCache
+        await hub(profile.user_id).properties.set("main", profile.dict(exclude={"user_id"}), merge=True)
         return {"message": "✅ Profilo struttura salvato correttamente"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore salvataggio profilo: {str(e)}")
@@ -265,11 +251,10 @@ async def save_structure_profile(profile: StructureProfile):
 @router.get("/agent/profile/{user_id}")
 async def get_structure_profile(user_id: str):
     try:
-        doc_ref = db.collection("ai_agent_hub").document(user_id).collection("properties").document("main")
-        doc = doc_ref.get()
-        if not doc.exists:
+        snapshot = await profileCache.get_snapshot(user_id)
+        if not snapshot.exists:
             raise HTTPException(status_code=404, detail="Profilo struttura non trovato")
-        return doc.to_dict()
+        return snapshot.profile()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero profilo: {str(e)}")
     
@@ -285,8 +270,7 @@ async def submit_feedback(payload: FeedbackPayload):
         now = datetime.utcnow()
         feedback_id = str(uuid4())
 
-        ref = db.collection("ai_agent_hub").document(payload.user_id).collection("feedback").document(feedback_id)
-        ref.set({
+        await hub(payload.user_id).feedback.set(feedback_id, {
             "feedbackId": feedback_id,
             "actionId": payload.action_id,
             "rating": payload.rating,
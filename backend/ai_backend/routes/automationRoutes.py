@@ -1,34 +1,26 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Dict
-import firebase_admin
-from firebase_admin import firestore
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
+from utils.hubRepository import hub, stream_dicts
 
 router = APIRouter()
 
-# ✅ Inizializza Firebase Admin se non già attivo
-if not firebase_admin._apps:
-    firebase_admin.initialize_app()
-db = firestore.client()
-
 # ✅ Inizializza automazioni per nuovo utente in base al piano
 @router.post("/agent/automations/init")
-def init_automations_for_user(user_id: str, plan: str):
+async def init_automations_for_user(user_id: str, plan: str):
     try:
-        catalog_ref = db.collection("ai_automations_catalog")
-        automations = catalog_ref.stream()
+        catalog_ref = async_db.collection("ai_automations_catalog")
 
         enabled = {}
-        for doc in automations:
+        async for doc in catalog_ref.stream():
             data = doc.to_dict()
             if plan in data.get("available_in", []):
                 enabled[doc.id] = data.get("default_enabled", False)
 
         # 🔁 Scrive in /ai_agent_hub/{userId}/enabledAutomations
-        user_ref = db.collection("ai_agent_hub").document(user_id)
-        user_ref.set({
+        await hub(user_id).set_root({
             "enabledAutomations": enabled
-        }, merge=True)
+        })
 
         return {"message": "✅ Automazioni inizializzate", "enabled": enabled}
 
@@ -37,17 +29,16 @@ def init_automations_for_user(user_id: str, plan: str):
 
 # ✅ Recupera automazioni visibili per utente
 @router.get("/agent/automations/{user_id}")
-def get_automations(user_id: str):
+async def get_automations(user_id: str):
     print("🧪 Richiesta automazioni per:", user_id)
 
     try:
-        user_doc = db.collection("ai_agent_hub").document(user_id).get()
+        user_data = await hub(user_id).get_root()
 
-        if not user_doc.exists:
+        if user_data is None:
             print("❌ Utente non trovato:", user_id)
             raise HTTPException(status_code=404, detail="Utente non trovato")
 
-        user_data = user_doc.to_dict()
         print("📄 Dati utente:", user_data)
 
         enabled = user_data.get("enabledAutomations", {})
@@ -55,17 +46,17 @@ def get_automations(user_id: str):
         print("📋 Piano utente:", plan)
 
         automations = []
-        for doc in db.collection("ai_automations_catalog").stream():
-            data = doc.to_dict()
-            print(f"🔎 Catalog entry: {doc.id} →", data)
+        catalog = await stream_dicts(async_db.collection("ai_automations_catalog"), id_field="id")
+        for data in catalog:
+            print(f"🔎 Catalog entry: {data['id']} →", data)
 
             available = plan in data.get("available_in", [])
             automations.append({
-                "id": doc.id,
+                "id": data["id"],
                 "title": data.get("title"),
                 "description": data.get("description"),
                 "available_in": data.get("available_in"),
-                "enabled": enabled.get(doc.id, False),
+                "enabled": enabled.get(data["id"], False),
                 "canToggle": available
             })
 
@@ -82,14 +73,13 @@ class AutomationToggleRequest(BaseModel):
     enabled: bool
 
 @router.patch("/agent/automations/{user_id}")
-def toggle_automation(user_id: str, body: AutomationToggleRequest):
+async def toggle_automation(user_id: str, body: AutomationToggleRequest):
     try:
-        user_ref = db.collection("ai_agent_hub").document(user_id)
-        user_ref.set({
+        await hub(user_id).set_root({
             "enabledAutomations": {
                 body.automation_id: body.enabled
             }
-        }, merge=True)
+        })
 
         return {"message": f"{body.automation_id} {'attivata' if body.enabled else 'disattivata'}"}
 
@@ -1,57 +1,83 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
-from firebase_config import db  # ✅ Usa inizializzazione centralizzata
-import openai
-import os
+import json
+from utils.llmGateway import chat_completion, chat_completion_stream  # ✅ Gateway OpenAI async
+from utils.chatRepository import ChatTurn
 
 router = APIRouter()
 
-# ✅ Configura OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("⚠️ OpenAI API key non trovata")
-client = openai.OpenAI(api_key=openai_api_key)
-
 # ✅ Modello richiesta chat
 class ChatRequest(BaseModel):
     user_message: str
     session_id: str
     user_id: str
 
+def _select_model(user_message: str) -> str:
+    return "gpt-4" if "analisi avanzata" in user_message.lower() else "gpt-3.5-turbo"
+
+# 💾 Salva domanda + risposta + sessione in un'unica scrittura (WriteBatch)
+async def _persist_turn(request: ChatRequest, ai_reply: str, user_ts: datetime, reply_ts: datetime) -> dict:
+    turn = ChatTurn(request.session_id, request.user_id)
+    turn.add_message(request.user_message, True, user_ts)
+    turn.add_message(ai_reply, False, reply_ts)
+    turn.touch_session(reply_ts)
+    return await turn.commit()
+
+def _sse(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 # ✅ Endpoint per inviare messaggio alla IA
 @router.post("/chat")
 async def chat_endpoint(request: ChatRequest):
     try:
-        model = "gpt-4" if "analisi avanzata" in request.user_message.lower() else "gpt-3.5-turbo"
-        response = client.chat.completions.create(
+        user_ts = datetime.utcnow()
+        model = _select_model(request.user_message)
+        response = await chat_completion(
             model=model,
             messages=[{"role": "user", "content": request.user_message}],
-            temperature=0.7
+            temperature=0.7,
+            source="chatAgentRoutes",
+            user_id=request.user_id
         )
         ai_reply = response.choices[0].message.content
-        now = datetime.utcnow()
-
-        session_ref = db.collection("chat_sessions").document(request.session_id)
-        messages_ref = session_ref.collection("messages")
-
-        messages_ref.add({
-            "isUser": True,
-            "text": request.user_message,
-            "timestamp": now
-        })
-        messages_ref.add({
-            "isUser": False,
-            "text": ai_reply,
-            "timestamp": now
-        })
-
-        session_ref.set({
-            "userId": request.user_id,
-            "lastUpdated": now
-        }, merge=True)
+        await _persist_turn(request, ai_reply, user_ts, datetime.utcnow())
 
         return {"response": ai_reply}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore IA: {str(e)}")
+
+# ⚡ Variante streaming: token inviati come Server-Sent Events appena generati
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    user_ts = datetime.utcnow()
+    model = _select_model(request.user_message)
+
+    async def event_stream():
+        chunks = []
+        try:
+            async for delta in chat_completion_stream(
+                model=model,
+                messages=[{"role": "user", "content": request.user_message}],
+                temperature=0.7,
+                source="chatAgentRoutes",
+                user_id=request.user_id
+            ):
+                chunks.append(delta)
+                yield _sse({"token": delta})
+
+            ai_reply = "".join(chunks)
+            await _persist_turn(request, ai_reply, user_ts, datetime.utcnow())
+            yield _sse({"response": ai_reply}, event="done")
+
+        except Exception as e:
+            yield _sse({"detail": f"Errore IA: {str(e)}"}, event="error")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -2,26 +2,18 @@ from fastapi import APIRouter, HTTPException, Path, Query
 from pydantic import BaseModel
 from datetime import datetime
 from uuid import uuid4
-import firebase_admin
-from firebase_admin import credentials, firestore
-import openai
-import os
-import httpx
+from firebase_admin import firestore
+from fastapi.responses import JSONResponse
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
+from utils.bulkDelete import delete_session
+from utils.hubRepository import hub, stream_dicts
+from utils.chatRepository import ChatTurn, load_page, message_payload, idempotent_message_id, recent_messages
+from google.api_core.exceptions import AlreadyExists
 from typing import Optional, List, Dict, Any
 from utils.intentClassifier import classify_intent_from_message
 
 router = APIRouter()
 
-if not firebase_admin._apps:
-    cred = credentials.Certificate("E:/ATBot/backend/serviceAccountKey.json")
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("⚠️ OpenAI API key non trovata")
-client = openai.OpenAI(api_key=openai_api_key)
-
 # MODELLI
 class ChatRequest(BaseModel):
     user_message: str
@@ -49,6 +41,7 @@ class SaveMessageRequest(BaseModel):
     action_id: Optional[str] = None
     feedback: Optional[str] = None
     attachment: Optional[Attachment] = None
+    idempotency_key: Optional[str] = None
 
 class UnderstandRequest(BaseModel):
     user_id: str
@@ -66,24 +59,25 @@ async def chat_endpoint(request: ChatRequest):
         from routes.dispatchRoutes import dispatch_master_agent, DispatchRequest
         intent = await classify_intent_from_message(request.user_message, request.user_id)
 
+        # 🧾 Unit of work: tutte le scritture del turno in un solo WriteBatch
+        now = datetime.utcnow()
+        turn = ChatTurn(request.session_id, request.user_id)
+
         # 🔍 Tracciamento intent
-        db.collection("intent_history").document(request.user_id).collection("logs").add({
+        turn.set(async_db.collection("intent_history").document(request.user_id).collection("logs").document(), {
             "message": request.user_message,
             "intent": intent,
-            "timestamp": datetime.utcnow()
+            "timestamp": now
         })
-
-        now = datetime.utcnow()
-        session_ref = db.collection("chat_sessions").document(request.session_id)
-        messages_ref = session_ref.collection("messages")
+        turn.add_message(request.user_message, True, now)
 
         # ❌ Intent non chiaro
         if intent == "unknown":
             response = "❌ Non ho capito bene cosa intendi. Puoi riformularlo?"
-            messages_ref.add({"isUser": True, "text": request.user_message, "timestamp": now})
-            messages_ref.add({"isUser": False, "text": response, "timestamp": now})
-            session_ref.set({"userId": request.user_id, "lastUpdated": now}, merge=True)
-            return {"response": response}
+            turn.add_message(response, False)
+            turn.touch_session(now)
+            written = await turn.commit()
+            return {"response": response, "message_ids": written["message_ids"]}
 
         # ✅ Se è un intent automatico → dispatch diretto
         if intent in NO_CONFIRM_REQUIRED:
@@ -99,15 +93,15 @@ async def chat_endpoint(request: ChatRequest):
             try:
                 result = await dispatch_master_agent(dispatch_payload)
                 ai_reply = f"✅ Azione '{intent}' eseguita automaticamente."
-                messages_ref.add({"isUser": True, "text": request.user_message, "timestamp": now})
-                messages_ref.add({"isUser": False, "text": ai_reply, "timestamp": now})
-                session_ref.set({"userId": request.user_id, "lastUpdated": now}, merge=True)
-                return {"response": ai_reply, "result": result}
+                turn.add_message(ai_reply, False)
+                turn.touch_session(now)
+                written = await turn.commit()
+                return {"response": ai_reply, "result": result, "message_ids": written["message_ids"]}
             except Exception as err:
                 error_text = f"⚠️ Errore durante l’esecuzione dell’agente '{intent}': {str(err)}"
-                messages_ref.add({"isUser": True, "text": request.user_message, "timestamp": now})
-                messages_ref.add({"isUser": False, "text": error_text, "timestamp": now})
-                return {"response": error_text}
+                turn.add_message(error_text, False)
+                written = await turn.commit()
+                return {"response": error_text, "message_ids": written["message_ids"]}
 
         # 🔄 Se serve conferma → salva proposta e pending
         pending_id = f"{intent}-{uuid4().hex[:8]}"
@@ -124,19 +118,21 @@ async def chat_endpoint(request: ChatRequest):
             "createdAt": now
         }
 
-        db.collection("ai_agent_hub").document(request.user_id).collection("pending_actions").document(pending_id).set(pending_data)
-        messages_ref.add({"isUser": True, "text": request.user_message, "timestamp": now})
-        messages_ref.add({
-            "text": suggestion_text,
-            "isUser": False,
-            "type": "proposal",
-            "status": "pending",
-            "timestamp": now,
-            "action_id": pending_id
-        })
-        session_ref.set({"userId": request.user_id, "lastUpdated": now}, merge=True)
+        turn.set(hub(request.user_id).collection("pending_actions").doc(pending_id), pending_data)
+        turn.add_message(
+            suggestion_text, False, None, "proposal",
+            status="pending",
+            action_id=pending_id
+        )
+        turn.touch_session(now)
+        written = await turn.commit()
 
-        return {"intent": intent, "pending_action_id": pending_id, "response": suggestion_text}
+        return {
+            "intent": intent,
+            "pending_action_id": pending_id,
+            "response": suggestion_text,
+            "message_ids": written["message_ids"]
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Errore IA: {str(e)}")
@@ -146,7 +142,7 @@ async def start_chat_session(request: StartSessionRequest):
     try:
         session_id = f"session-{request.user_id}-{int(datetime.utcnow().timestamp())}-{uuid4().hex[:6]}"
         now = datetime.utcnow()
-        db.collection("chat_sessions").document(session_id).set({
+        await async_db.collection("chat_sessions").document(session_id).set({
             "userId": request.user_id,
             "title": request.title,
             "summary": request.summary,
@@ -160,10 +156,10 @@ async def start_chat_session(request: StartSessionRequest):
 @router.post("/chat_sessions/{session_id}/archive")
 async def archive_chat_session(session_id: str = Path(...)):
     try:
-        session_ref = db.collection("chat_sessions").document(session_id)
-        if not session_ref.get().exists:
+        session_ref = async_db.collection("chat_sessions").document(session_id)
+        if not (await session_ref.get()).exists:
             raise HTTPException(status_code=404, detail="Sessione non trovata")
-        session_ref.update({"status": "archived"})
+        await session_ref.update({"status": "archived"})
         return {"message": "✅ Sessione archiviata con successo"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore archiviazione: {str(e)}")
@@ -171,30 +167,35 @@ async def archive_chat_session(session_id: str = Path(...)):
 @router.delete("/chat_sessions/{session_id}")
 async def delete_chat_session(session_id: str = Path(...)):
     try:
-        session_ref = db.collection("chat_sessions").document(session_id)
-        if not session_ref.get().exists:
+        session_ref = async_db.collection("chat_sessions").document(session_id)
+        if not (await session_ref.get()).exists:
             raise HTTPException(status_code=404, detail="Sessione non trovata")
-        for msg in session_ref.collection("messages").stream():
-            msg.reference.delete()
-        session_ref.delete()
-        return {"message": "🗑️ Sessione eliminata con successo"}
+        # 🧹 Batch da 500 in parallelo; sessioni grandi → job in background
+        result = await delete_session(session_id)
+        if result["accepted"]:
+            return JSONResponse(status_code=202, content={
+                "message": "⏳ Eliminazione avviata in background",
+                "jobId": result["jobId"],
+                "total": result["total"]
+            })
+        return {"message": "🗑️ Sessione eliminata con successo", "deleted": result["deleted"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore eliminazione: {str(e)}")
 @router.get("/chat_sessions/{session_id}/actions")
 async def get_chat_session_actions(session_id: str = Path(...)):
     try:
-        query = db.collection_group("actions").where("context.session_id", "==", session_id)
-        return [doc.to_dict() for doc in query.stream()]
+        query = async_db.collection_group("actions").where("context.session_id", "==", session_id)
+        return await stream_dicts(query)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero azioni: {str(e)}")
 
 @router.get("/chat_sessions/{user_id}")
 async def get_chat_sessions_by_user(user_id: str):
     try:
-        sessions_ref = db.collection("chat_sessions") \
+        sessions_ref = async_db.collection("chat_sessions") \
             .where("userId", "==", user_id) \
             .order_by("lastUpdated", direction=firestore.Query.DESCENDING)
-        return [doc.to_dict() | {"sessionId": doc.id} for doc in sessions_ref.stream()]
+        return await stream_dicts(sessions_ref, id_field="sessionId")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero chat: {str(e)}")
 
@@ -203,24 +204,22 @@ async def load_chat_messages(
     session_id: str,
     limit: Optional[int] = 50,
     start_after: Optional[str] = None,
-    include_system: Optional[bool] = False
+    include_system: Optional[bool] = False,
+    newest_first: Optional[bool] = False
 ):
     try:
-        messages_ref = db.collection("chat_sessions").document(session_id).collection("messages")
-        query = messages_ref.order_by("timestamp")
-
-        if start_after:
-            cursor_ts = datetime.fromisoformat(start_after.replace("Z", "+00:00"))
-            query = query.start_after({"timestamp": cursor_ts})
-
-        query = query.limit(limit)
-        exclude_types = ["loader", "debug"]
-        messages, last_ts = [], None
+        # 📄 Pagina keyset (timestamp, docId): tipi tecnici filtrati lato server, pagine sempre piene
+        docs, next_cursor, has_more = await load_page(
+            session_id,
+            limit=limit or 50,
+            cursor=start_after,
+            newest_first=bool(newest_first),
+            include_hidden=bool(include_system)
+        )
 
-        for doc in query.stream():
+        messages = []
+        for doc in docs:
             msg = doc.to_dict()
-            if not include_system and msg.get("type") in exclude_types + ["system"]:
-                continue
             messages.append({
                 "messageId": doc.id,
                 "text": msg.get("text"),
@@ -232,12 +231,12 @@ async def load_chat_messages(
                 "feedback": msg.get("feedback"),
                 "attachment": msg.get("attachment")
             })
-            last_ts = msg.get("timestamp")
 
         return {
             "session_id": session_id,
             "messages": messages,
-            "next_cursor": last_ts.isoformat() if last_ts else None
+            "next_cursor": next_cursor,
+            "has_more": has_more
         }
 
     except Exception as e:
@@ -249,31 +248,33 @@ async def save_message(request: SaveMessageRequest):
             raise HTTPException(status_code=400, detail="❌ Messaggio vuoto.")
 
         ts = datetime.fromisoformat(request.timestamp.replace("Z", "+00:00"))
-        messages_ref = db.collection("chat_sessions").document(request.session_id).collection("messages")
+        messages_ref = async_db.collection("chat_sessions").document(request.session_id).collection("messages")
 
-        last_query = messages_ref.where("isUser", "==", request.is_user) \
-                                 .order_by("timestamp", direction=firestore.Query.DESCENDING) \
-                                 .limit(1).stream()
-        last_msg = next(last_query, None)
-        if last_msg and last_msg.to_dict().get("text", "").strip() == request.text.strip():
+        # 🔁 Doppione consecutivo (stesso testo, stesso mittente): controllo in memoria, nessuna query
+        if recent_messages.is_repeat(request.session_id, request.is_user, request.text):
             raise HTTPException(status_code=409, detail="❌ Messaggio duplicato.")
 
-        msg_data = {
-            "text": request.text.strip(),
-            "isUser": request.is_user,
-            "timestamp": ts,
-            "type": request.type or "normal",
-            "status": request.status or "completed",
-            "feedback": request.feedback,
-        }
+        msg_data = message_payload(
+            request.text.strip(), request.is_user, ts, request.type or "normal",
+            status=request.status or "completed",
+            feedback=request.feedback
+        )
 
         if request.action_id:
             msg_data["action_id"] = request.action_id
         if request.attachment:
             msg_data["attachment"] = request.attachment.dict()
 
-        messages_ref.document().set(msg_data)
-        return {"message": "✅ Messaggio salvato correttamente."}
+        # 🔑 ID deterministico + create(): i replay li rifiuta Firestore stesso (anche tra worker)
+        message_id = idempotent_message_id(
+            request.session_id, request.is_user, request.text, request.timestamp, request.idempotency_key
+        )
+        try:
+            await messages_ref.document(message_id).create(msg_data)
+        except AlreadyExists:
+            raise HTTPException(status_code=409, detail="❌ Messaggio duplicato.")
+        recent_messages.remember(request.session_id, request.is_user, request.text)
+        return {"message": "✅ Messaggio salvato correttamente.", "messageId": message_id}
 
     except HTTPException:
         raise
@@ -290,17 +291,20 @@ async def understand_and_propose(request: UnderstandRequest):
         # 🎯 Classificazione intent
         intent = await classify_intent_from_message(request.message, request.user_id)
 
-        # 📥 Tracciamento intent
-        db.collection("intent_history").document(request.user_id).collection("logs").add({
+        # 📥 Tracciamento intent (scritto insieme all'eventuale proposta)
+        turn = ChatTurn(request.session_id, request.user_id)
+        turn.set(async_db.collection("intent_history").document(request.user_id).collection("logs").document(), {
             "message": request.message,
             "intent": intent,
             "timestamp": datetime.utcnow()
         })
 
         if intent == "unknown":
+            await turn.commit()
             return {"response": "❌ Non ho capito bene cosa intendi. Puoi riformularlo?"}
 
         if intent in NO_CONFIRM_REQUIRED:
+            await turn.commit()
             from routes.dispatchRoutes import dispatch_master_agent, DispatchRequest
             dispatch_payload = DispatchRequest(
                 user_id=request.user_id,
@@ -334,17 +338,20 @@ async def understand_and_propose(request: UnderstandRequest):
             "createdAt": now
         }
 
-        db.collection("ai_agent_hub").document(request.user_id).collection("pending_actions").document(pending_id).set(pending_data)
-        db.collection("chat_sessions").document(request.session_id).collection("messages").add({
-            "text": suggestion_text,
-            "isUser": False,
-            "type": "proposal",
-            "status": "pending",
-            "timestamp": now,
-            "action_id": pending_id
-        })
+        turn.set(hub(request.user_id).collection("pending_actions").doc(pending_id), pending_data)
+        turn.add_message(
+            suggestion_text, False, now, "proposal",
+            status="pending",
+            action_id=pending_id
+        )
+        written = await turn.commit()
 
-        return {"intent": intent, "pending_action_id": pending_id, "response": suggestion_text}
+        return {
+            "intent": intent,
+            "pending_action_id": pending_id,
+            "response": suggestion_text,
+            "message_ids": written["message_ids"]
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Errore comprendendo l’intento: {str(e)}")
@@ -352,23 +359,22 @@ async def understand_and_propose(request: UnderstandRequest):
 async def accept_action(user_id: str, pending_id: str):
     try:
         now = datetime.utcnow()
-        pending_ref = db.collection("ai_agent_hub").document(user_id).collection("pending_actions").document(pending_id)
-        pending_doc = pending_ref.get()
+        pending_actions = hub(user_id).collection("pending_actions")
+        pending_data = await pending_actions.get(pending_id)
 
-        if not pending_doc.exists:
+        if pending_data is None:
             raise HTTPException(status_code=404, detail="❌ Azione non trovata")
 
-        pending_data = pending_doc.to_dict()
         if pending_data.get("status") != "waiting":
             raise HTTPException(status_code=400, detail="⚠️ Azione già gestita")
 
-        pending_ref.update({"status": "accepted", "handledAt": now})
+        await pending_actions.update(pending_id, {"status": "accepted", "handledAt": now})
 
         session_id = pending_data["context"]["session_id"]
-        messages_ref = db.collection("chat_sessions").document(session_id).collection("messages")
-        query = messages_ref.where("action_id", "==", pending_id).limit(1).stream()
-        for msg in query:
-            msg.reference.update({"status": "accepted"})
+        messages_ref = async_db.collection("chat_sessions").document(session_id).collection("messages")
+        query = messages_ref.where("action_id", "==", pending_id).limit(1)
+        async for msg in query.stream():
+            await msg.reference.update({"status": "accepted"})
 
         from routes.dispatchRoutes import dispatch_master_agent, DispatchRequest
         dispatch_payload = DispatchRequest(
@@ -389,23 +395,22 @@ async def accept_action(user_id: str, pending_id: str):
 async def reject_action(user_id: str, pending_id: str):
     try:
         now = datetime.utcnow()
-        pending_ref = db.collection("ai_agent_hub").document(user_id).collection("pending_actions").document(pending_id)
-        pending_doc = pending_ref.get()
+        pending_actions = hub(user_id).collection("pending_actions")
+        pending_data = await pending_actions.get(pending_id)
 
-        if not pending_doc.exists:
+        if pending_data is None:
             raise HTTPException(status_code=404, detail="❌ Azione non trovata")
 
-        pending_data = pending_doc.to_dict()
         if pending_data.get("status") != "waiting":
             raise HTTPException(status_code=400, detail="⚠️ Azione già gestita")
 
-        pending_ref.update({"status": "rejected", "handledAt": now})
+        await pending_actions.update(pending_id, {"status": "rejected", "handledAt": now})
 
         session_id = pending_data["context"]["session_id"]
-        messages_ref = db.collection("chat_sessions").document(session_id).collection("messages")
-        query = messages_ref.where("action_id", "==", pending_id).limit(1).stream()
-        for msg in query:
-            msg.reference.update({"status": "rejected"})
+        messages_ref = async_db.collection("chat_sessions").document(session_id).collection("messages")
+        query = messages_ref.where("action_id", "==", pending_id).limit(1)
+        async for msg in query.stream():
+            await msg.reference.update({"status": "rejected"})
 
         return {"message": "❌ Azione rifiutata con successo."}
 
@@ -418,14 +423,16 @@ async def process_pending_events(user_id: str):
         processed = []
         now = datetime.utcnow()
 
-        events_ref = db.collection("ai_agent_hub").document(user_id).collection("events") \
-            .where("status", "==", "pending") \
-            .order_by("createdAt", direction=firestore.Query.ASCENDING)
-        pending_events = events_ref.stream()
+        events = hub(user_id).events
+        pending_events = await events.list(
+            filters=[("status", "==", "pending")],
+            order_by="createdAt",
+            direction=firestore.Query.ASCENDING,
+            id_field="event_id"
+        )
 
-        for event_doc in pending_events:
-            data = event_doc.to_dict()
-            event_id = event_doc.id
+        for data in pending_events:
+            event_id = data.pop("event_id")
             intent = data.get("next_agent")
             context = data.get("params", {})
             context["trigger"] = data.get("trigger")
@@ -437,7 +444,7 @@ async def process_pending_events(user_id: str):
                 dispatch_response = {"error": str(err)}
                 status = "error"
 
-            db.collection("ai_agent_hub").document(user_id).collection("events").document(event_id).update({
+            await events.update(event_id, {
                 "status": status,
                 "executedAt": now,
                 "result": dispatch_response
@@ -449,15 +456,11 @@ async def process_pending_events(user_id: str):
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Errore elaborazione eventi: {str(e)}")
-# ✅ Utility per chiamare il dispatcher centralizzato
+# ✅ Utility per chiamare il dispatcher centralizzato (bus in-process)
 async def dispatch_agent(user_id: str, intent: str, context: dict):
-    url = "http://127.0.0.1:8000/agent/dispatch"
-    payload = {
-        "user_id": user_id,
-        "intent": intent,
-        "context": context
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload)
-        response.raise_for_status()
-        return response.json()
+    from routes.dispatchRoutes import dispatch_master_agent, DispatchRequest
+    return await dispatch_master_agent(DispatchRequest(
+        user_id=user_id,
+        intent=intent,
+        context=context
+    ))
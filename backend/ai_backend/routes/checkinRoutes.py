@@ -2,24 +2,11 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from uuid import uuid4
 from datetime import datetime
-import firebase_admin
-from firebase_admin import firestore
-import openai
-import os
+from utils.hubRepository import hub  # ⚡ Firestore async
+from utils.llmGateway import chat_completion  # ✅ Gateway OpenAI async
 
 router = APIRouter()
 
-# ✅ Inizializza Firebase se non già attivo
-if not firebase_admin._apps:
-    firebase_admin.initialize_app()
-db = firestore.client()
-
-# ✅ Configura OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("❌ Chiave API OpenAI mancante")
-client = openai.OpenAI(api_key=openai_api_key)
-
 # ✅ Modello della richiesta
 class CheckinRequest(BaseModel):
     user_id: str
@@ -43,22 +30,22 @@ async def send_checkin_message(request: CheckinRequest):
         Includi tono cortese, ringraziamenti, orari check-in/out e possibilità di upgrade.
         """
 
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Sei un assistente cortese e professionale per hotel."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.6
+            temperature=0.6,
+            source="checkinRoutes",
+            user_id=request.user_id
         )
 
         ai_message = response.choices[0].message.content.strip()
 
         # 🔥 Salva nel Firestore
-        hub_ref = db.collection("ai_agent_hub").document(request.user_id)
-        actions_ref = hub_ref.collection("actions").document(action_id)
-
-        actions_ref.set({
+        repo = hub(request.user_id)
+        await repo.actions.set(action_id, {
             "actionId": action_id,
             "type": "checkin",
             "status": "completed",
@@ -70,10 +57,10 @@ async def send_checkin_message(request: CheckinRequest):
             }
         })
 
-        hub_ref.set({
+        await repo.set_root({
             "lastActive": now,
             "lastCompletedAction": action_id
-        }, merge=True)
+        })
 
         return {
             "status": "completed",
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from firebase_config import db  # ✅ Inizializzazione centralizzata
+from utils.hubRepository import hub  # ⚡ Firestore async
 
 router = APIRouter()
 
@@ -7,15 +7,13 @@ router = APIRouter()
 @router.get("/agent/config/{user_id}")
 async def get_agent_config(user_id: str):
     try:
-        doc_ref = db.collection("ai_agent_hub").document(user_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        data = await hub(user_id).get_root()
+        if data is None:
             return {
                 "autonomyLevel": "base",
                 "enabledAutomations": {},
                 "plan": "BASE"
             }
-        data = doc.to_dict()
         return {
             "autonomyLevel": data.get("autonomyLevel", "base"),
             "enabledAutomations": data.get("enabledAutomations", {}),
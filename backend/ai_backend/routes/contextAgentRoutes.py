@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
-from firebase_config import db  # ✅ Import centralizzato
+from utils.hubRepository import hub  # ⚡ Firestore async
 
 router = APIRouter()
 
@@ -25,8 +25,6 @@ class ContextPayload(BaseModel):
 @router.post("/agent/update-context")
 async def update_context(payload: ContextPayload):
     try:
-        context_ref = db.collection("ai_agent_hub").document(payload.user_id).collection("context").document("state")
-
         context_data = {
             "occupancy_rate": payload.occupancy_rate,
             "season": payload.season,
@@ -39,7 +37,7 @@ async def update_context(payload: ContextPayload):
         if payload.current_guest:
             context_data["current_guest"] = payload.current_guest.dict()
 
-        context_ref.set(context_data, merge=True)
+        await hub(payload.user_id).context.set("state", context_data, merge=True)
 
         return {"message": "✅ Context aggiornato correttamente."}
 
@@ -50,10 +48,10 @@ async def update_context(payload: ContextPayload):
 @router.get("/agent/get-context/{user_id}")
 async def get_context(user_id: str):
     try:
-        context_ref = db.collection("ai_agent_hub").document(user_id).collection("context").document("state")
-        doc = context_ref.get()
+        context = hub(user_id).context
+        state = await context.get("state")
 
-        if not doc.exists:
+        if state is None:
             default_context = {
                 "occupancy_rate": 0,
                 "season": "media",
@@ -68,10 +66,10 @@ async def get_context(user_id: str):
                 "createdAt": datetime.utcnow(),
                 "updatedAt": datetime.utcnow()
             }
-            context_ref.set(default_context)
+            await context.set("state", default_context)
             return default_context
 
-        return doc.to_dict()
+        return state
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Errore lettura context: {str(e)}")
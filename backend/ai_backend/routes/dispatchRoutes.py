@@ -1,4 +1,6 @@
 from fastapi import APIRouter, Request
+from pydantic import BaseModel
+from typing import Any, Dict
 from dispatchers import (
     autopilotDispatcher,
     pricingDispatcher,
@@ -29,13 +31,25 @@ DISPATCHER_MAP = {
 
 router = APIRouter()
 
+# ✅ Richiesta tipizzata per il bus di dispatch in-process
+class DispatchRequest(BaseModel):
+    user_id: str
+    intent: str
+    context: Dict[str, Any] = {}
+
+# 🔁 Bus in-process: chiama direttamente la coroutine del dispatcher (niente loopback HTTP)
+async def dispatch_master_agent(request: DispatchRequest) -> dict:
+    dispatcher = DISPATCHER_MAP.get(request.intent)
+    if not dispatcher:
+        return {"status": "error", "message": f"Intent non gestito: {request.intent}"}
+    return await dispatcher.handle(request.user_id, dict(request.context or {}))
+
+# 🌐 Adapter HTTP per chiamanti esterni
 @router.post("/agent/dispatch")
 async def dispatch_agent(request: Request):
     payload = await request.json()
-    intent = payload.get("intent")
-    dispatcher = DISPATCHER_MAP.get(intent)
-
-    if dispatcher:
-        return await dispatcher.handle(payload)
-    else:
-        return {"status": "error", "message": f"Intent non gestito: {intent}"}
+    return await dispatch_master_agent(DispatchRequest(
+        user_id=payload.get("user_id", "unknown"),
+        intent=payload.get("intent") or "",
+        context=payload.get("context") or {}
+    ))
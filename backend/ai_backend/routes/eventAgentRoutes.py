@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from datetime import datetime
-from firebase_config import db  # ✅ Inizializzazione centralizzata
+from utils.hubRepository import hub  # ⚡ Firestore async
 from firebase_admin import firestore
 
 router = APIRouter()
@@ -19,7 +19,6 @@ class EventPayload(BaseModel):
 @router.post("/agent/trigger-event")
 async def trigger_event(payload: EventPayload):
     try:
-        event_ref = db.collection("ai_agent_hub").document(payload.user_id).collection("events").document()
         event_data = {
             "trigger": payload.trigger,
             "next_agent": payload.next_agent,
@@ -27,7 +26,7 @@ async def trigger_event(payload: EventPayload):
             "status": payload.status or "pending",
             "createdAt": datetime.utcnow()
         }
-        event_ref.set(event_data)
+        await hub(payload.user_id).events.add(event_data)
         return {"message": "✅ Evento IA creato con successo."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Errore creazione evento: {str(e)}")
@@ -36,9 +35,11 @@ async def trigger_event(payload: EventPayload):
 @router.get("/agent/pending-events/{user_id}")
 async def get_pending_events(user_id: str):
     try:
-        events_ref = db.collection("ai_agent_hub").document(user_id).collection("events")\
-            .where("status", "==", "pending").order_by("createdAt", direction=firestore.Query.ASCENDING)
-        events = [doc.to_dict() | {"event_id": doc.id} for doc in events_ref.stream()]
-        return events
+        return await hub(user_id).events.list(
+            filters=[("status", "==", "pending")],
+            order_by="createdAt",
+            direction=firestore.Query.ASCENDING,
+            id_field="event_id"
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Errore recupero eventi IA: {str(e)}")
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
-from firebase_config import db  # ✅ Centralizzato
+from utils.hubRepository import hub  # ⚡ Firestore async
 
 router = APIRouter()
 
@@ -17,8 +17,7 @@ class FeedbackPayload(BaseModel):
 @router.post("/agent/feedback")
 async def submit_feedback(payload: FeedbackPayload):
     try:
-        feedback_ref = db.collection("ai_agent_hub").document(payload.user_id).collection("feedback").document(payload.action_id)
-        feedback_ref.set({
+        await hub(payload.user_id).feedback.set(payload.action_id, {
             "actionId": payload.action_id,
             "rating": payload.rating,
             "comment": payload.comment,
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from firebase_config import db
+from utils.hubRepository import hub  # ⚡ Firestore async
 from datetime import datetime
 import uuid
 
@@ -18,9 +18,7 @@ class Guest(BaseModel):
 @router.get("/guests/{user_id}")
 async def get_guests(user_id: str):
     try:
-        guests_ref = db.collection("ai_agent_hub").document(user_id).collection("guests")
-        guests = [doc.to_dict() | {"id": doc.id} for doc in guests_ref.stream()]
-        return guests
+        return await hub(user_id).collection("guests").list(id_field="id")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero ospiti: {str(e)}")
 
@@ -35,7 +33,7 @@ async def add_guest(user_id: str, guest: Guest):
         guest_data["createdAt"] = now
         guest_data["updatedAt"] = now
 
-        db.collection("ai_agent_hub").document(user_id).collection("guests").document(guest_id).set(guest_data)
+        await hub(user_id).collection("guests").set(guest_id, guest_data)
 
         return {
             "message": "✅ Ospite aggiunto correttamente",
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
-from firebase_config import db  # ✅ Centralizzazione Firebase
+from utils.hubRepository import hub  # ⚡ Firestore async
 from firebase_admin import firestore
 
 router = APIRouter()
@@ -19,7 +19,6 @@ class InsightPayload(BaseModel):
 @router.post("/agent/submit-insight")
 async def submit_insight(payload: InsightPayload):
     try:
-        insight_ref = db.collection("ai_agent_hub").document(payload.user_id).collection("insights_from_agents").document()
         insight_data = {
             "source_agent": payload.source_agent,
             "target": payload.target,
@@ -27,7 +26,7 @@ async def submit_insight(payload: InsightPayload):
             "severity": payload.severity,
             "timestamp": datetime.utcnow()
         }
-        insight_ref.set(insight_data)
+        await hub(payload.user_id).collection("insights_from_agents").add(insight_data)
         return {"message": "✅ Insight registrato con successo."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Errore registrazione insight: {str(e)}")
@@ -36,9 +35,10 @@ async def submit_insight(payload: InsightPayload):
 @router.get("/agent/insights-log/{user_id}")
 async def get_insights(user_id: str):
     try:
-        insights_ref = db.collection("ai_agent_hub").document(user_id).collection("insights_from_agents")\
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-        insights = [doc.to_dict() | {"id": doc.id} for doc in insights_ref.stream()]
-        return insights
+        return await hub(user_id).collection("insights_from_agents").list(
+            order_by="timestamp",
+            direction=firestore.Query.DESCENDING,
+            id_field="id"
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Errore recupero insights: {str(e)}")
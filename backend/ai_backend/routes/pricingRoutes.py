@@ -2,24 +2,14 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from uuid import uuid4
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
-import openai
-import os
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
+from utils.hubRepository import hub
+from utils.llmGateway import chat_completion  # ✅ Gateway OpenAI async
+from utils.pricingEngine import local_price  # ⚡ Fallback locale
+from utils.pricingCompletion import PRICE_TOOLS, PRICE_TOOL_CHOICE, resolve_price  # 🧾 Output strutturato
 
 router = APIRouter()
 
-# ✅ Inizializza Firebase se non già attivo
-if not firebase_admin._apps:
-    firebase_admin.initialize_app()
-db = firestore.client()
-
-# ✅ Configura OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("❌ OpenAI API key non trovata")
-client = openai.OpenAI(api_key=openai_api_key)
-
 # ✅ Modello dati per richiesta
 class PricingRequest(BaseModel):
     user_id: str
@@ -45,55 +35,69 @@ async def optimize_pricing(request: PricingRequest):
         Tasso occupazione: {request.occupancy_rate*100:.1f}%.
         Prezzo medio competitor: {avg_competitor_price:.2f}€.
         Fattore stagionalità: {request.seasonality_factor}.
+        Prezzo base calcolato: {optimal_price:.2f}€.
         Suggerisci il miglior prezzo di vendita per massimizzare occupazione e profitto.
-        Rispondi solo con il prezzo consigliato in euro.
+        Rispondi chiamando la funzione suggest_price con il prezzo in euro.
         """
 
-        chat_response = client.chat.completions.create(
+        chat_response = await chat_completion(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Sei un esperto di pricing hotel."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.5
+            temperature=0.5,
+            tools=PRICE_TOOLS,
+            tool_choice=PRICE_TOOL_CHOICE,
+            source="pricingRoutes",
+            user_id=request.user_id
         )
 
-        ai_price_raw = chat_response.choices[0].message.content.strip()
-        ai_suggested_price = float(ai_price_raw.replace("€", "").replace(",", "."))
+        # 🧾 Parser tollerante + limiti rispetto al prezzo base; se illeggibile → prezzo locale
+        ai_suggested_price, price_source = resolve_price(
+            chat_response.choices[0].message,
+            optimal_price,
+            fallback_price=local_price(
+                request.current_price, request.occupancy_rate, request.competitor_prices, request.seasonality_factor
+            ),
+        )
 
         # 🔥 Salva il prezzo nel DB
-        db.collection("DynamicPricing").document(request.property_id).set({
+        await async_db.collection("DynamicPricing").document(request.property_id).set({
             "userId": request.user_id,
             "current_price": request.current_price,
             "optimized_price": ai_suggested_price,
             "occupancy_rate": request.occupancy_rate,
             "competitor_prices": request.competitor_prices,
             "seasonality_factor": request.seasonality_factor,
+            "price_source": price_source,
             "generatedAt": now
         })
 
         # ✅ Traccia azione in HUB
         action_id = str(uuid4())
-        hub_ref = db.collection("ai_agent_hub").document(request.user_id)
-        hub_ref.collection("actions").document(action_id).set({
+        repo = hub(request.user_id)
+        await repo.actions.set(action_id, {
             "actionId": action_id,
             "type": "pricing",
             "status": "completed",
             "startedAt": now,
             "context": request.dict(),
             "output": {
-                "optimized_price": ai_suggested_price
+                "optimized_price": ai_suggested_price,
+                "price_source": price_source
             }
         })
 
-        hub_ref.set({
+        await repo.set_root({
             "lastActive": now,
             "lastCompletedAction": action_id
-        }, merge=True)
+        })
 
         return {
             "message": "✅ Prezzo ottimizzato con successo",
-            "optimized_price": ai_suggested_price
+            "optimized_price": ai_suggested_price,
+            "price_source": price_source
         }
 
     except Exception as e:
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from uuid import uuid4
 from datetime import datetime
 from typing import Dict
-from firebase_config import db  # ✅ Centralizzato
+from utils.hubRepository import hub  # ⚡ Firestore async
 
 router = APIRouter()
 
@@ -17,8 +17,7 @@ async def generate_report_from_chat(context: Dict):
         timestamp = datetime.utcnow()
         doc_id = str(uuid4())
 
-        doc_ref = db.collection("ai_agent_hub").document(user_id).collection("documents").document(doc_id)
-        doc_ref.set({
+        await hub(user_id).documents.set(doc_id, {
             "documentId": doc_id,
             "type": "report",
             "content": report_content,
@@ -2,8 +2,11 @@ from fastapi import APIRouter, HTTPException, Path
 from pydantic import BaseModel
 from datetime import datetime
 from uuid import uuid4
-from firebase_config import db  # ✅ Inizializzazione centralizzata
+from fastapi.responses import JSONResponse
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
 from firebase_admin import firestore
+from utils.bulkDelete import delete_session, get_job, resume_session_delete_job
+from utils.hubRepository import stream_dicts
 
 router = APIRouter()
 
@@ -21,7 +24,7 @@ async def start_chat_session(request: StartSessionRequest):
         session_id = f"session-{request.user_id}-{int(datetime.utcnow().timestamp())}-{uuid4().hex[:6]}"
         now = datetime.utcnow()
 
-        db.collection("chat_sessions").document(session_id).set({
+        await async_db.collection("chat_sessions").document(session_id).set({
             "userId": request.user_id,
             "title": request.title,
             "summary": request.summary,
@@ -45,10 +48,10 @@ async def start_chat_session(request: StartSessionRequest):
 @router.post("/chat_sessions/{session_id}/archive")
 async def archive_chat_session(session_id: str = Path(...)):
     try:
-        session_ref = db.collection("chat_sessions").document(session_id)
-        if not session_ref.get().exists:
+        session_ref = async_db.collection("chat_sessions").document(session_id)
+        if not (await session_ref.get()).exists:
             raise HTTPException(status_code=404, detail="Sessione non trovata")
-        session_ref.update({"status": "archived"})
+        await session_ref.update({"status": "archived"})
         return {"message": "✅ Sessione archiviata con successo"}
     except Exception as e:
         print(f"🔥 Errore archiviazione sessione: {e}")
@@ -58,27 +61,45 @@ async def archive_chat_session(session_id: str = Path(...)):
 @router.delete("/chat_sessions/{session_id}")
 async def delete_chat_session(session_id: str = Path(...)):
     try:
-        session_ref = db.collection("chat_sessions").document(session_id)
-        if not session_ref.get().exists:
+        session_ref = async_db.collection("chat_sessions").document(session_id)
+        if not (await session_ref.get()).exists:
             raise HTTPException(status_code=404, detail="Sessione non trovata")
 
-        messages = session_ref.collection("messages").stream()
-        for msg in messages:
-            msg.reference.delete()
-
-        session_ref.delete()
-        return {"message": "🗑️ Sessione eliminata con successo"}
+        # 🧹 Batch da 500 in parallelo; sessioni grandi → job in background
+        result = await delete_session(session_id)
+        if result["accepted"]:
+            return JSONResponse(status_code=202, content={
+                "message": "⏳ Eliminazione avviata in background",
+                "jobId": result["jobId"],
+                "total": result["total"]
+            })
+        return {"message": "🗑️ Sessione eliminata con successo", "deleted": result["deleted"]}
     except Exception as e:
         print(f"🔥 Errore eliminazione sessione: {e}")
         raise HTTPException(status_code=500, detail=f"Errore eliminazione: {str(e)}")
 
+# ✅ Stato di un job di eliminazione in background
+@router.get("/chat/delete-jobs/{job_id}")
+async def get_delete_job(job_id: str):
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    return job
+
+# ✅ Riprende un job interrotto dal cursore salvato
+@router.post("/chat/delete-jobs/{job_id}/resume")
+async def resume_delete_job(job_id: str):
+    job = await resume_session_delete_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    return job
+
 # ✅ Recupera tutte le azioni associate a una sessione
 @router.get("/chat_sessions/{session_id}/actions")
 async def get_chat_session_actions(session_id: str = Path(...)):
     try:
-        query = db.collection_group("actions").where("context.session_id", "==", session_id)
-        actions = [doc.to_dict() for doc in query.stream()]
-        return actions
+        query = async_db.collection_group("actions").where("context.session_id", "==", session_id)
+        return await stream_dicts(query)
     except Exception as e:
         print(f"🔥 Errore recupero azioni sessione: {e}")
         raise HTTPException(status_code=500, detail=f"Errore recupero azioni per sessione: {str(e)}")
@@ -88,13 +109,13 @@ async def get_chat_session_actions(session_id: str = Path(...)):
 async def get_chat_sessions_by_user(user_id: str):
     try:
         sessions_query = (
-            db.collection("chat_sessions")
+            async_db.collection("chat_sessions")
             .where("userId", "==", user_id)
             .order_by("lastUpdated", direction=firestore.Query.DESCENDING)
         )
 
         results = []
-        for doc in sessions_query.stream():
+        async for doc in sessions_query.stream():
             data = doc.to_dict()
             if data.get("lastUpdated", datetime.min) > datetime(2000, 1, 1):
                 results.append(data | {"sessionId": doc.id})
@@ -1,44 +1,35 @@
 from fastapi import APIRouter, HTTPException
-from datetime import datetime, timezone
-from firebase_config import db  # ✅ Centralizzato
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
 from firebase_admin import firestore
+from utils.hubRepository import hub, first_snapshot
 
 router = APIRouter()
 
 @router.get("/agent/summary/{user_id}")
 async def get_agent_summary(user_id: str):
     try:
-        today = datetime.now(timezone.utc).date()
+        repo = hub(user_id)
 
-        # ✅ Azioni completate oggi
-        actions_ref = db.collection("ai_agent_hub").document(user_id).collection("actions")
-        actions_today = [
-            doc.to_dict() for doc in actions_ref.where("status", "==", "completed").stream()
-            if doc.to_dict().get("startedAt") and doc.to_dict()["startedAt"].date() == today
-        ]
+        # ✅ Azioni completate e documenti generati oggi: un solo documento di rollup
+        stats = await repo.get_daily_stats()
 
-        # ✅ Documenti generati oggi
-        documents_ref = db.collection("ai_agent_hub").document(user_id).collection("documents")
-        documents_today = [
-            doc.to_dict() for doc in documents_ref.stream()
-            if doc.to_dict().get("generatedAt") and doc.to_dict()["generatedAt"].date() == today
-        ]
+        # ✅ Notifiche IA non lette: aggregazione count() lato server (le letture le segna il frontend)
+        notifications_ref = async_db.collection("notifications").where("userId", "==", user_id).where("read", "==", False)
+        unread_result = await notifications_ref.count().get()
+        unread_notifications = int(unread_result[0][0].value) if unread_result else 0
 
-        # ✅ Notifiche IA non lette
-        notifications_ref = db.collection("notifications").where("userId", "==", user_id).where("read", "==", False)
-        unread_notifications = [doc for doc in notifications_ref.stream()]
-
-        # ✅ Ultimo modello IA usato
-        last_model = None
-        last_action_doc = next(actions_ref.order_by("startedAt", direction=firestore.Query.DESCENDING).limit(1).stream(), None)
-        if last_action_doc:
-            last_action = last_action_doc.to_dict()
-            last_model = last_action.get("context", {}).get("model")
+        # ✅ Ultimo modello IA usato (fallback su ultima azione se oggi non ne è stato registrato uno)
+        last_model = stats.get("last_model")
+        if not last_model:
+            last_action_doc = await first_snapshot(repo.actions.query(order_by="startedAt", direction=firestore.Query.DESCENDING))
+            if last_action_doc:
+                last_action = last_action_doc.to_dict()
+                last_model = (last_action.get("context") or {}).get("model")
 
         return {
-            "actions_completed_today": len(actions_today),
-            "documents_generated_today": len(documents_today),
-            "unread_notifications": len(unread_notifications),
+            "actions_completed_today": stats.get("actions_completed", 0),
+            "documents_generated_today": stats.get("documents_generated", 0),
+            "unread_notifications": unread_notifications,
             "last_model_used": last_model or "unknown"
         }
 
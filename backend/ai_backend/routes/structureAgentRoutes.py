@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
-from firebase_config import db  # ✅ Centralizzato
+from utils.hubRepository import hub  # ⚡ Firestore async
+from utils import profileCache  # ⚡ Profilo struttura in cache (invalidata dal POST)
 
 router = APIRouter()
 
@@ -42,8 +43,8 @@ class StructureProfile(BaseModel):
 @router.post("/agent/profile")
 async def save_structure_profile(profile: StructureProfile):
     try:
-        doc_ref = db.collection("ai_agent_hub").document(profile.user_id).collection("properties").document("main")
-        doc_ref.set(profile.dict(exclude={"user_id"}), merge=True)
+        # 🔁 La scrittura via repository invalida anche lo snapshot in profileCache
+        await hub(profile.user_id).properties.set("main", profile.dict(exclude={"user_id"}), merge=True)
         return {"message": "✅ Profilo struttura salvato correttamente"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore salvataggio profilo: {str(e)}")
@@ -52,10 +53,9 @@ async def save_structure_profile(profile: StructureProfile):
 @router.get("/agent/profile/{user_id}")
 async def get_structure_profile(user_id: str):
     try:
-        doc_ref = db.collection("ai_agent_hub").document(user_id).collection("properties").document("main")
-        doc = doc_ref.get()
-        if not doc.exists:
+        snapshot = await profileCache.get_snapshot(user_id)
+        if not snapshot.exists:
             raise HTTPException(status_code=404, detail="Profilo struttura non trovato")
-        return doc.to_dict()
+        return snapshot.profile()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore recupero profilo: {str(e)}")
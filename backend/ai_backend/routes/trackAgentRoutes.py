@@ -3,7 +3,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from uuid import uuid4
 from datetime import datetime
-from firebase_config import db  # Inizializzazione centralizzata
+from utils.hubRepository import hub  # ⚡ Firestore async
 
 router = APIRouter()
 
@@ -21,10 +21,8 @@ async def track_action(request: TrackActionRequest):
         action_id = str(uuid4())
 
         # 🔥 Salva nel Firestore
-        hub_ref = db.collection("ai_agent_hub").document(request.user_id)
-        action_ref = hub_ref.collection("actions").document(action_id)
-
-        action_ref.set({
+        repo = hub(request.user_id)
+        await repo.actions.set(action_id, {
             "actionId": action_id,
             "type": request.type,
             "status": "in_progress",
@@ -32,10 +30,10 @@ async def track_action(request: TrackActionRequest):
             "context": request.context
         })
 
-        hub_ref.set({
+        await repo.set_root({
             "lastActive": now,
             "lastTrackedAction": action_id
-        }, merge=True)
+        })
 
         return {
             "message": "✅ Azione IA tracciata correttamente",
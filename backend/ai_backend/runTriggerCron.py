@@ -2,11 +2,20 @@
 
 import asyncio
 from schedulers.triggerWatcher import trigger_pending_events
+from dispatchers import logUtils
+from utils import usageLedger
+
+async def main():
+    try:
+        await trigger_pending_events()
+    finally:
+        await usageLedger.shutdown()
+        await logUtils.shutdown()  # 🧾 flush dei log in buffer prima di chiudere il loop
 
 if __name__ == "__main__":
     print("\n🚀 Avvio Trigger IA Pendenti...")
     try:
-        asyncio.run(trigger_pending_events())
+        asyncio.run(main())
         print("✅ Completato. Tutti i trigger eseguiti.")
     except Exception as e:
         print(f"❌ Errore esecuzione trigger: {str(e)}")
@@ -1,4 +1,7 @@
 import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -15,73 +18,101 @@ db = firestore.client()
 DISPATCH_URL = "http://localhost:8000/agent/dispatch"
 GPT_MODELS = {"BASE": "gpt-3.5-turbo", "GOLD": "gpt-4"}
 TODAY = datetime.datetime.now(timezone.utc).date()
+HORIZON_DAYS = int(os.getenv("PRICING_HORIZON_DAYS", "365"))  # giorni di calendario ripreziati
+MAX_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))  # dispatch HTTP concorrenti
+MAX_OCCUPANCY = 0.9  # struttura quasi piena: niente ripricing automatico
+# ℹ️ Lo skip "delta <5%" non serve più qui: l'engine lascia invariate le celle sotto PRICING_MIN_CHANGE_PCT
 
-def price_delta(old, new):
-    if old == 0:
-        return 100
-    return abs((new - old) / old) * 100
+_local = threading.local()
+
+def build_calendar(property_id):
+    # 🧠 Condizioni simulate (da sostituire con dati reali): griglia camere × date per l'engine NumPy
+    return {
+        "property_id": property_id,
+        "start_date": TODAY.isoformat(),
+        "days": HORIZON_DAYS,
+        "rooms": [{"room_id": "standard", "current_price": 120}],
+        "occupancy": 0.72,
+        "competitor_prices": [110, 125, 120],
+        "seasonality": 1.05,
+    }
+
+def skip_reason(calendar, has_bookings=True):
+    """Stessa regola del vecchio scheduler: nessuna prenotazione o occupazione media > 90% → skip."""
+    occupancy = calendar.get("occupancy", 0)
+    values = occupancy if isinstance(occupancy, (list, tuple)) else [occupancy]
+    if not has_bookings or (values and sum(values) / len(values) > MAX_OCCUPANCY):
+        return "occupancy/bookings"
+    return None
+
+def due_pricing_tasks():
+    """Task pricing in scadenza oggi, raggruppati per utente (una sola query)."""
+    by_user = {}
+    tasks = db.collection("AutomationTasks").where("taskType", "==", "pricing").stream()
+    for task in tasks:
+        task_data = task.to_dict()
+        due_date = task_data.get("dueDate")
+        if not due_date:
+            continue
+        due_date_obj = due_date.to_datetime() if hasattr(due_date, 'to_datetime') else due_date
+        if due_date_obj.date() != TODAY:
+            continue
+        by_user.setdefault(task_data.get("assignedTo"), set()).add(task_data.get("propertyId") or "main")
+    return by_user
+
+def _session():
+    """Una requests.Session per thread del pool (Session non è thread-safe), riusata tra i dispatch."""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+def dispatch(user_id, payload):
+    try:
+        res = _session().post(DISPATCH_URL, json=payload)
+        if res.status_code == 200:
+            return f"✅ Dispatch OK for {user_id} ({len(payload['context']['calendars'])} strutture)"
+        return f"❌ Dispatch FAIL for {user_id}: {res.status_code}"
+    except Exception as e:
+        return f"🔥 ERROR for {user_id}: {str(e)}"
 
 def run_scheduler():
     logs = []
-    users = db.collection("ai_agent_hub").stream()
+    tasks_by_user = due_pricing_tasks()
+    payloads = []
 
-    for user_doc in users:
+    for user_doc in db.collection("ai_agent_hub").stream():
         user_id = user_doc.id
         user_data = user_doc.to_dict()
         plan = user_data.get("plan", "BASE").upper()
         enabled = user_data.get("enabledAutomations", {})
-        if not enabled.get("pricing"):
+        if not enabled.get("pricing") or user_id not in tasks_by_user:
             continue
 
-        tasks = db.collection("AutomationTasks") \
-                  .where("taskType", "==", "pricing") \
-                  .where("assignedTo", "==", user_id).stream()
-
-        for task in tasks:
-            task_data = task.to_dict()
-            due_date = task_data.get("dueDate")
-            if not due_date:
-                continue
-
-            due_date_obj = due_date.to_datetime() if hasattr(due_date, 'to_datetime') else due_date
-            if due_date_obj.date() != TODAY:
-                continue
-
-            # 🧠 Condizioni simulate (da sostituire con dati reali)
-            occupancy = 0.72
-            has_bookings = True
-            last_price = 120
-            new_suggested = 124.2
-
-            if not has_bookings or occupancy > 0.9:
-                logs.append(f"⏭️  Skip {user_id} (occupancy/bookings)")
-                continue
-            if price_delta(last_price, new_suggested) < 5:
-                logs.append(f"🌀 Skip {user_id} (delta <5%)")
+        calendars = []
+        for pid in sorted(tasks_by_user[user_id]):
+            calendar = build_calendar(pid)
+            reason = skip_reason(calendar)  # 🧠 has_bookings simulato (da sostituire con dati reali)
+            if reason:
+                logs.append(f"⏭️  Skip {user_id}/{pid} ({reason})")
                 continue
+            calendars.append(calendar)
+        if not calendars:
+            continue
 
-            payload = {
-                "user_id": user_id,
-                "intent": "pricing",
-                "context": {
-                    "session_id": f"auto-{TODAY}",
-                    "property_id": "main",
-                    "current_price": last_price,
-                    "occupancy_rate": occupancy,
-                    "competitor_prices": [110, 125, 120],
-                    "seasonality_factor": 1.05,
-                    "model": GPT_MODELS.get(plan, "gpt-3.5-turbo")
-                }
+        # 📅 Una sola richiesta per utente con tutte le strutture (calendario completo, nessun LLM per cella)
+        payloads.append((user_id, {
+            "user_id": user_id,
+            "intent": "pricing",
+            "context": {
+                "session_id": f"auto-{TODAY}",
+                "calendars": calendars,
+                "model": GPT_MODELS.get(plan, "gpt-3.5-turbo")
             }
+        }))
 
-            try:
-                res = requests.post(DISPATCH_URL, json=payload)
-                if res.status_code == 200:
-                    logs.append(f"✅ Dispatch OK for {user_id}")
-                else:
-                    logs.append(f"❌ Dispatch FAIL for {user_id}: {res.status_code}")
-            except Exception as e:
-                logs.append(f"🔥 ERROR for {user_id}: {str(e)}")
+    # ⚡ Dispatch concorrenti, una Session per thread (connessioni HTTP riutilizzate)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        logs.extend(pool.map(lambda item: dispatch(*item), payloads))
 
     return logs
 
@@ -1,6 +1,7 @@
 # ✅ FILE: schedulers/generateDailyTasks.py
 
-from firebase_config import db
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
+from utils.hubRepository import hub
 from datetime import datetime
 from uuid import uuid4
 
@@ -11,12 +12,11 @@ PLAN_AUTOMATIONS = {
 }
 
 # ✅ Crea un task nel Firestore
-def create_task(user_id, task_type, context):
+async def create_task(user_id, task_type, context):
     action_id = str(uuid4())
     now = datetime.utcnow()
-    task_ref = db.collection("ai_agent_hub").document(user_id).collection("actions").document(action_id)
 
-    task_ref.set({
+    await hub(user_id).actions.set(action_id, {
         "actionId": action_id,
         "type": task_type,
         "status": "pending",
@@ -30,17 +30,14 @@ def create_task(user_id, task_type, context):
 # ✅ Funzione principale
 async def generate_daily_tasks():
     print("🚀 Inizio generazione task giornalieri...")
-    users_ref = db.collection("users")
-    users = users_ref.stream()
+    users_ref = async_db.collection("users")
 
-    for user in users:
+    async for user in users_ref.stream():
         data = user.to_dict()
         user_id = data.get("uid")
         plan = data.get("plan", "BASE")
 
-        config_ref = db.collection("ai_agent_hub").document(user_id).collection("config").document("settings")
-        config_doc = config_ref.get()
-        config = config_doc.to_dict() if config_doc.exists else {}
+        config = await hub(user_id).collection("config").get("settings") or {}
 
         enabled = config.get("enabled_automations", PLAN_AUTOMATIONS.get(plan, []))
 
@@ -53,6 +50,6 @@ async def generate_daily_tasks():
                 if task_type == "insight":
                     context.update({"note": "Analisi giornaliera performance struttura"})
 
-                create_task(user_id, task_type, context)
+                await create_task(user_id, task_type, context)
 
     print("✅ Task giornalieri generati per tutti gli utenti.")
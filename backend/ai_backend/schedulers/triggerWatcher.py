@@ -1,21 +1,19 @@
 # ✅ FILE: schedulers/triggerWatcher.py
 
-from firebase_config import db
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
 from datetime import datetime
-import requests
-
-DISPATCH_URL = "http://localhost:8000/agent/dispatch"  # Cambia se in produzione
 
 def log(msg):
     print(f"[TriggerWatcher] {msg}")
 
 async def trigger_pending_events():
+    from routes.dispatchRoutes import dispatch_master_agent, DispatchRequest
     log("🚀 Inizio scansione eventi pending...")
-    events_ref = db.collection_group("events")\
+    events_ref = async_db.collection_group("events")\
         .where("status", "==", "pending")\
         .order_by("createdAt")
 
-    for doc in events_ref.stream():
+    async for doc in events_ref.stream():
         event = doc.to_dict()
         user_id = doc.reference.parent.parent.id
         event_id = doc.id
@@ -27,22 +25,22 @@ async def trigger_pending_events():
             log(f"❌ Evento {event_id} senza next_agent, ignorato.")
             continue
 
-        payload = {
-            "user_id": user_id,
-            "taskType": task_type,
-            "parameters": context
-        }
+        request = DispatchRequest(
+            user_id=user_id,
+            intent=task_type,
+            context=context
+        )
 
         try:
-            res = requests.post(DISPATCH_URL, json=payload)
-            if res.status_code == 200:
+            result = await dispatch_master_agent(request)
+            if result.get("status") != "error":
                 log(f"✅ Triggerato {task_type} per {user_id}")
-                doc.reference.update({
+                await doc.reference.update({
                     "status": "dispatched",
                     "dispatchedAt": datetime.utcnow()
                 })
             else:
-                log(f"⚠️ Errore trigger {task_type} → {res.status_code}: {res.text}")
+                log(f"⚠️ Errore trigger {task_type} → {result.get('message') or result.get('error')}")
         except Exception as e:
             log(f"❌ Errore invio dispatch: {str(e)}")
 
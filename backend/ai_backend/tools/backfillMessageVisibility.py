@@ -0,0 +1,46 @@
+# ✅ FILE: tools/backfillMessageVisibility.py
+# Imposta il flag `visible` sui messaggi chat salvati prima della paginazione keyset.
+# Uso: python tools/backfillMessageVisibility.py [cursore_docpath]
+
+import asyncio
+import sys
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
+from utils.chatRepository import is_visible
+
+PAGE_SIZE = 500  # = limite operazioni per WriteBatch
+
+async def backfill_message_visibility(resume_after: str = None):
+    query = async_db.collection_group("messages").order_by("__name__").limit(PAGE_SIZE)
+    if resume_after:
+        query = query.start_after({"__name__": async_db.document(resume_after)})
+
+    scanned = updated = 0
+    while True:
+        docs = [doc async for doc in query.stream()]
+        if not docs:
+            break
+
+        batch = async_db.batch()
+        pending = 0
+        for doc in docs:
+            data = doc.to_dict()
+            visible = is_visible(data.get("type"))
+            if data.get("visible") != visible:
+                batch.update(doc.reference, {"visible": visible})
+                pending += 1
+        if pending:
+            await batch.commit()
+
+        scanned += len(docs)
+        updated += pending
+        last_path = docs[-1].reference.path
+        print(f"📄 {scanned} messaggi analizzati, {updated} aggiornati (cursore: {last_path})")
+        query = async_db.collection_group("messages").order_by("__name__").start_after(
+            {"__name__": docs[-1].reference}
+        ).limit(PAGE_SIZE)
+
+    print(f"✅ Backfill completato: {updated}/{scanned} messaggi aggiornati.")
+
+# ✅ Esegui manualmente (riprende dal cursore stampato se interrotto)
+if __name__ == "__main__":
+    asyncio.run(backfill_message_visibility(sys.argv[1] if len(sys.argv) > 1 else None))
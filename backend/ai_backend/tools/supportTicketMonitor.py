@@ -1,17 +1,12 @@
 # ✅ FILE: supportTicketMonitor.py
 
-from firebase_admin import firestore
+import asyncio
 from datetime import datetime
-import firebase_admin
-
-# ⚙️ Inizializza Firebase se non è già inizializzato
-if not firebase_admin._apps:
-    firebase_admin.initialize_app()
-db = firestore.client()
+from firebase_config import async_db  # ⚡ Firestore async centralizzato
 
 # 📥 Salva notifica in Firestore (visibile in Admin Dashboard)
-def notify_admin_firestore(ticket):
-    db.collection("admin_alerts").add({
+async def notify_admin_firestore(ticket):
+    await async_db.collection("admin_alerts").add({
         "type": "ticket_overdue",
         "timestamp": datetime.utcnow(),
         "ticket_id": ticket["ticket_id"],
@@ -22,19 +17,18 @@ def notify_admin_firestore(ticket):
     })
 
 # 🔍 Verifica ticket urgenti non gestiti entro 30 minuti
-def check_overdue_tickets():
+async def check_overdue_tickets():
     now = datetime.utcnow()
-    tickets_ref = db.collection("support_tickets")
+    tickets_ref = async_db.collection("support_tickets")
     query = tickets_ref.where("priority", "==", "alta").where("handled", "==", False)
-    results = query.stream()
 
     overdue_found = False
 
-    for doc in results:
+    async for doc in query.stream():
         data = doc.to_dict()
         deadline = data.get("deadlineAt")
         if deadline and deadline < now:
-            notify_admin_firestore(data)
+            await notify_admin_firestore(data)
             overdue_found = True
             print(f"📌 Ticket {data['ticket_id']} scaduto salvato in admin_alerts")
 
@@ -43,4 +37,4 @@ def check_overdue_tickets():
 
 # ✅ Esegui manualmente o schedula via cron
 if __name__ == "__main__":
-    check_overdue_tickets()
+    asyncio.run(check_overdue_tickets())
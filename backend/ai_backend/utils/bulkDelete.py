@@ -0,0 +1,135 @@
+"""
+bulkDelete.py
+Cancellazione massiva su Firestore: le sottocollezioni vengono lette a pagine di soli ID
+e cancellate in WriteBatch da 500 inviati in parallelo.
+Le sessioni chat grandi vengono eliminate da un job in background con progresso e
+cursore salvati in delete_jobs/{job_id}, riprendibile dopo un riavvio.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from uuid import uuid4
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from firebase_config import async_db
+
+BATCH_SIZE = 500  # limite operazioni per WriteBatch
+PARALLEL_BATCHES = int(os.getenv("DELETE_PARALLEL_BATCHES", "4"))
+SYNC_DELETE_LIMIT = int(os.getenv("SYNC_DELETE_LIMIT", "1000"))  # oltre → job in background (202)
+JOBS_COLLECTION = "delete_jobs"
+
+ProgressFn = Callable[[int, str], Awaitable[None]]
+
+_running: Dict[str, asyncio.Task] = {}
+
+
+async def _commit_deletes(refs) -> None:
+    batch = async_db.batch()
+    for ref in refs:
+        batch.delete(ref)
+    await batch.commit()
+
+
+async def delete_collection(coll_ref, start_after: Optional[str] = None, on_progress: Optional[ProgressFn] = None) -> int:
+    """Cancella tutti i documenti della collezione; restituisce quanti ne ha eliminati."""
+    deleted = 0
+    page_size = BATCH_SIZE * PARALLEL_BATCHES
+    while True:
+        query = coll_ref.order_by("__name__").select([FieldPath.document_id()]).limit(page_size)
+        if start_after:
+            query = query.start_after({"__name__": start_after})
+        refs = [doc.reference async for doc in query.stream()]
+        if not refs:
+            return deleted
+
+        # ⚡ Chunk da 500 committati in parallelo
+        await asyncio.gather(*(
+            _commit_deletes(refs[i:i + BATCH_SIZE]) for i in range(0, len(refs), BATCH_SIZE)
+        ))
+        deleted += len(refs)
+        start_after = refs[-1].id
+        if on_progress:
+            await on_progress(deleted, start_after)
+
+
+async def delete_document_tree(doc_ref, on_progress: Optional[ProgressFn] = None) -> int:
+    """Cancella le sottocollezioni del documento e poi il documento stesso."""
+    deleted = 0
+    async for coll_ref in doc_ref.collections():
+        deleted += await delete_collection(coll_ref, on_progress=on_progress)
+    await doc_ref.delete()
+    return deleted + 1
+
+
+# ░░░ SESSIONI CHAT ░░░
+async def count_messages(session_ref) -> int:
+    result = await session_ref.collection("messages").count().get()
+    return int(result[0][0].value) if result else 0
+
+
+async def _run_session_job(job_id: str, session_id: str, cursor: Optional[str] = None, already_deleted: int = 0):
+    job_ref = async_db.collection(JOBS_COLLECTION).document(job_id)
+    session_ref = async_db.collection("chat_sessions").document(session_id)
+
+    async def report(deleted: int, last_id: str):
+        await job_ref.update({"deleted": already_deleted + deleted, "cursor": last_id, "updatedAt": datetime.utcnow()})
+
+    try:
+        deleted = await delete_collection(session_ref.collection("messages"), start_after=cursor, on_progress=report)
+        await session_ref.delete()
+        await job_ref.update({"status": "completed", "deleted": already_deleted + deleted, "completedAt": datetime.utcnow()})
+    except Exception as e:
+        await job_ref.update({"status": "error", "error": str(e), "updatedAt": datetime.utcnow()})
+    finally:
+        _running.pop(job_id, None)
+
+
+def _start(job_id: str, session_id: str, cursor: Optional[str] = None, already_deleted: int = 0):
+    _running[job_id] = asyncio.create_task(_run_session_job(job_id, session_id, cursor, already_deleted))
+
+
+async def start_session_delete_job(session_id: str, total: int) -> str:
+    job_id = str(uuid4())
+    await async_db.collection(JOBS_COLLECTION).document(job_id).set({
+        "jobId": job_id,
+        "type": "chat_session",
+        "sessionId": session_id,
+        "status": "running",
+        "total": total,
+        "deleted": 0,
+        "cursor": None,
+        "startedAt": datetime.utcnow(),
+    })
+    _start(job_id, session_id)
+    return job_id
+
+
+async def resume_session_delete_job(job_id: str) -> Optional[dict]:
+    """Riparte dal cursore salvato (es. dopo un riavvio del worker)."""
+    job = (await async_db.collection(JOBS_COLLECTION).document(job_id).get()).to_dict()
+    if not job:
+        return None
+    if job.get("status") != "completed" and job_id not in _running:
+        await async_db.collection(JOBS_COLLECTION).document(job_id).update({"status": "running"})
+        _start(job_id, job["sessionId"], job.get("cursor"), job.get("deleted", 0))
+        job["status"] = "running"
+    return job
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    snap = await async_db.collection(JOBS_COLLECTION).document(job_id).get()
+    return snap.to_dict() if snap.exists else None
+
+
+async def delete_session(session_id: str) -> dict:
+    """Sessioni piccole: cancellazione immediata. Grandi: job in background (accepted=True)."""
+    session_ref = async_db.collection("chat_sessions").document(session_id)
+    total = await count_messages(session_ref)
+    if total > SYNC_DELETE_LIMIT:
+        job_id = await start_session_delete_job(session_id, total)
+        return {"accepted": True, "jobId": job_id, "total": total}
+    deleted = await delete_document_tree(session_ref)
+    return {"accepted": False, "deleted": deleted}
@@ -0,0 +1,167 @@
+"""
+chatRepository.py
+Accesso async ai messaggi di chat_sessions/{session}/messages.
+Ogni messaggio salva un flag `visible` (tipi tecnici esclusi) così il filtro avviene
+lato server; la paginazione è keyset su (timestamp, docId) con cursori opachi.
+"""
+
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud.firestore import Query
+
+from firebase_config import async_db
+
+HIDDEN_TYPES = {"loader", "debug", "system"}  # mai mostrati nella chat utente
+MAX_PAGE_SIZE = 200
+RECENT_CACHE_SIZE = 10000  # coppie (sessione, isUser) ricordate per il controllo duplicati
+
+
+def session_ref(session_id: str):
+    return async_db.collection("chat_sessions").document(session_id)
+
+
+def messages_ref(session_id: str):
+    return session_ref(session_id).collection("messages")
+
+
+def is_visible(msg_type: Optional[str]) -> bool:
+    return (msg_type or "normal") not in HIDDEN_TYPES
+
+
+def message_payload(text: str, is_user: bool, timestamp: datetime, msg_type: Optional[str] = None, **fields) -> Dict[str, Any]:
+    """Documento messaggio con flag `visible` coerente col tipo."""
+    data: Dict[str, Any] = {"isUser": is_user, "text": text, "timestamp": timestamp}
+    if msg_type:
+        data["type"] = msg_type
+    data.update(fields)
+    data["visible"] = is_visible(msg_type)
+    return data
+
+
+# ░░░ IDEMPOTENZA ░░░
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def idempotent_message_id(session_id: str, is_user: bool, text: str, timestamp: str, client_key: Optional[str] = None) -> str:
+    """ID documento deterministico: chiave client se presente, altrimenti hash del contenuto."""
+    if client_key:
+        return f"msg-{_digest(session_id, client_key)[:32]}"
+    return f"msg-{_digest(session_id, is_user, text.strip(), timestamp)[:32]}"
+
+
+class RecentMessages:
+    """Ultimo testo salvato per (sessione, isUser): blocca i doppioni consecutivi senza query."""
+
+    def __init__(self, max_entries: int = RECENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._last: "OrderedDict[tuple, str]" = OrderedDict()
+
+    def is_repeat(self, session_id: str, is_user: bool, text: str) -> bool:
+        return self._last.get((session_id, is_user)) == _digest(text.strip())
+
+    def remember(self, session_id: str, is_user: bool, text: str):
+        key = (session_id, is_user)
+        self._last[key] = _digest(text.strip())
+        self._last.move_to_end(key)
+        while len(self._last) > self.max_entries:
+            self._last.popitem(last=False)
+
+
+recent_messages = RecentMessages()
+
+
+# ░░░ UNIT OF WORK ░░░
+class ChatTurn:
+    """Raccoglie tutte le mutazioni di un turno chat e le scrive in un unico WriteBatch atomico."""
+
+    def __init__(self, session_id: str, user_id: str):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.batch = async_db.batch()
+        self.message_ids: List[str] = []
+        self._texts: List[Tuple[bool, str]] = []
+        self.written: Dict[str, str] = {}  # path documento → ID
+        self.committed = False
+
+    def add_message(self, text: str, is_user: bool, timestamp: Optional[datetime] = None, msg_type: Optional[str] = None, **fields) -> str:
+        ref = messages_ref(self.session_id).document()
+        self.batch.set(ref, message_payload(text, is_user, timestamp or datetime.utcnow(), msg_type, **fields))
+        self.message_ids.append(ref.id)
+        self._texts.append((is_user, text))
+        return ref.id
+
+    def set(self, ref, data: Dict[str, Any], merge: bool = False) -> str:
+        self.batch.set(ref, data, merge=merge)
+        self.written[ref.path] = ref.id
+        return ref.id
+
+    def touch_session(self, timestamp: Optional[datetime] = None):
+        self.batch.set(session_ref(self.session_id), {
+            "userId": self.user_id,
+            "lastUpdated": timestamp or datetime.utcnow()
+        }, merge=True)
+
+    async def commit(self) -> Dict[str, Any]:
+        """Un solo round trip; restituisce gli ID scritti."""
+        await self.batch.commit()
+        self.committed = True
+        for is_user, text in self._texts:
+            recent_messages.remember(self.session_id, is_user, text)
+        return {"message_ids": self.message_ids, "documents": list(self.written.values())}
+
+
+# ░░░ CURSORI ░░░
+def encode_cursor(timestamp: datetime, doc_id: str) -> str:
+    raw = json.dumps({"ts": timestamp.isoformat(), "id": doc_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Optional[str]]:
+    """Cursore opaco (timestamp, docId); accetta anche il vecchio timestamp ISO nudo."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["ts"]), data.get("id")
+    except (ValueError, KeyError, TypeError):
+        return datetime.fromisoformat(cursor.replace("Z", "+00:00")), None
+
+
+# ░░░ PAGINAZIONE KEYSET ░░░
+async def load_page(
+    session_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    newest_first: bool = False,
+    include_hidden: bool = False,
+) -> Tuple[List[Any], Optional[str], bool]:
+    """Una pagina piena di messaggi in (limit + 1) letture.
+    Richiede l'indice composito messages(visible, timestamp, __name__) in entrambe le direzioni.
+    Restituisce (snapshot, next_cursor, has_more)."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    direction = Query.DESCENDING if newest_first else Query.ASCENDING
+
+    query = messages_ref(session_id)
+    if not include_hidden:
+        query = query.where("visible", "==", True)
+    query = query.order_by("timestamp", direction=direction).order_by("__name__", direction=direction)
+
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        position = {"timestamp": cursor_ts}
+        if cursor_id:
+            position["__name__"] = cursor_id
+        query = query.start_after(position)
+
+    docs = [doc async for doc in query.limit(limit + 1).stream()]
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    # ↪️ Cursore anche a fine sessione: in ordine crescente serve a leggere i messaggi nuovi
+    next_cursor = encode_cursor(docs[-1].get("timestamp"), docs[-1].id) if docs else cursor
+    return docs, next_cursor, has_more
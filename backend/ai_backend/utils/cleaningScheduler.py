@@ -0,0 +1,203 @@
+"""
+cleaningScheduler.py
+Assegnazione deterministica camere → staff pulizie, senza chiamate LLM.
+Euristica di list-scheduling: prima le camere con check-in in giornata (ordinate per orario),
+poi le altre raggruppate per piano; ogni camera va alla persona che la finirebbe prima
+considerando durata per tipologia, spostamento tra piani e capacità del turno.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+DEFAULT_DURATION = 30  # minuti
+ROOM_DURATIONS = {
+    "single": 25, "singola": 25,
+    "standard": 30, "double": 30, "doppia": 30, "twin": 30,
+    "triple": 35, "tripla": 35, "superior": 35,
+    "family": 45, "deluxe": 40,
+    "junior suite": 50, "suite": 60,
+    "apartment": 75, "appartamento": 75,
+}
+TRAVEL_SAME_FLOOR = 2  # minuti tra camere dello stesso piano
+TRAVEL_PER_FLOOR = 5  # minuti per ogni piano di differenza
+DEFAULT_SHIFT_MINUTES = 240
+DEFAULT_SHIFT_START = "10:00"  # inizio pulizie dopo i check-out standard
+
+
+# ░░░ NORMALIZZAZIONE INPUT ░░░
+def _minutes(hhmm: Optional[str]) -> Optional[int]:
+    match = re.match(r"^\s*(\d{1,2})[:.](\d{2})", str(hhmm or ""))
+    return int(match.group(1)) * 60 + int(match.group(2)) if match else None
+
+
+def _clock(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _floor(room: str, floor: Any = None) -> int:
+    """Piano esplicito o dedotto dal numero camera (es. 203 → 2, 12 → 0)."""
+    if floor is not None:
+        try:
+            return int(floor)
+        except (TypeError, ValueError):
+            pass
+    digits = re.search(r"\d+", room)
+    return int(digits.group()) // 100 if digits else 0
+
+
+def _as_dict(item: Any, key: str) -> Optional[Dict[str, Any]]:
+    """Dict così com'è, valore semplice → {key: valore}; None/vuoti → None (da saltare)."""
+    if isinstance(item, dict):
+        return dict(item)
+    if item is None or not str(item).strip():
+        return None
+    return {key: str(item)}
+
+
+def _room_id(item: Dict[str, Any]) -> str:
+    return str(item.get("room") or item.get("room_number") or item.get("name") or "").strip()
+
+
+def normalize_rooms(checkouts: List[Any], checkins: List[Any]) -> List[Dict[str, Any]]:
+    """Camere da pulire: check-out del giorno, marcate prioritarie se rientrano in check-in oggi."""
+    arrivals: Dict[str, Optional[int]] = {}
+    for item in checkins or []:
+        data = _as_dict(item, "room")
+        room = _room_id(data) if data else ""
+        if room:
+            arrivals[room] = _minutes(data.get("checkin_time") or data.get("time"))
+
+    rooms, seen = [], set()
+    for item in checkouts or []:
+        data = _as_dict(item, "room")
+        room = _room_id(data) if data else ""
+        if not room or room in seen:
+            continue
+        seen.add(room)
+        room_type = str(data.get("room_type") or data.get("type") or "standard").strip().lower()
+        rooms.append({
+            "room": room,
+            "floor": _floor(room, data.get("floor")),
+            "room_type": room_type,
+            "minutes": int(data.get("minutes") or ROOM_DURATIONS.get(room_type, DEFAULT_DURATION)),
+            "priority": room in arrivals,
+            "checkin_at": arrivals.get(room),
+        })
+    return rooms
+
+
+def normalize_staff(staff: List[Any]) -> List[Dict[str, Any]]:
+    members = []
+    for item in staff or []:
+        data = _as_dict(item, "name")
+        name = str(data.get("name") or "").strip() if data else ""
+        if not name:
+            continue
+        start = _minutes(data.get("start"))
+        if start is None:  # "00:00" è un inizio valido (0 minuti)
+            start = _minutes(DEFAULT_SHIFT_START)
+        members.append({
+            "name": name,
+            "start": start,
+            "capacity": int(data.get("shift_minutes") or data.get("capacity") or DEFAULT_SHIFT_MINUTES),
+            "floor": _floor("", data.get("floor")) if data.get("floor") is not None else None,
+        })
+    return members
+
+
+# ░░░ ASSEGNAZIONE ░░░
+def _travel(from_floor: Optional[int], to_floor: int) -> int:
+    if from_floor is None:
+        return 0
+    return TRAVEL_SAME_FLOOR if from_floor == to_floor else TRAVEL_PER_FLOOR * abs(from_floor - to_floor)
+
+
+def build_schedule(checkouts: List[Any], checkins: List[Any], staff: List[Any]) -> Dict[str, Any]:
+    """Piano strutturato: assegnazioni per persona, camere non assegnate e riepilogo."""
+    rooms = normalize_rooms(checkouts, checkins)
+    members = normalize_staff(staff)
+    state = {m["name"]: {"used": 0, "floor": m["floor"], "rooms": []} for m in members}
+
+    # 🔥 Prioritarie per orario di check-in, poi il resto raggruppato per piano
+    ordered = sorted(rooms, key=lambda r: (
+        not r["priority"],
+        r["checkin_at"] if r["checkin_at"] is not None else 24 * 60,
+        r["floor"],
+        r["room"],
+    ))
+
+    unassigned = []
+    for room in ordered:
+        best = None
+        for member in members:
+            slot = state[member["name"]]
+            travel = _travel(slot["floor"], room["floor"])
+            needed = travel + room["minutes"]
+            if slot["used"] + needed > member["capacity"]:
+                continue
+            finish = member["start"] + slot["used"] + needed
+            # ⚖️ Chi finisce prima; a parità, chi resta sullo stesso piano
+            cost = (finish, travel)
+            if best is None or cost < best[0]:
+                best = (cost, member, travel)
+        if best is None:
+            unassigned.append({**room, "reason": "capacità turni esaurita" if members else "nessuno staff disponibile"})
+            continue
+
+        _, member, travel = best
+        slot = state[member["name"]]
+        start = member["start"] + slot["used"] + travel
+        end = start + room["minutes"]
+        slot["used"] = end - member["start"]
+        slot["floor"] = room["floor"]
+        slot["rooms"].append({
+            "room": room["room"],
+            "floor": room["floor"],
+            "room_type": room["room_type"],
+            "priority": room["priority"],
+            "start": _clock(start),
+            "end": _clock(end),
+            "minutes": room["minutes"],
+            "late": room["checkin_at"] is not None and end > room["checkin_at"],
+        })
+
+    assignments = [{
+        "staff": m["name"],
+        "rooms": state[m["name"]]["rooms"],
+        "minutes_used": state[m["name"]]["used"],
+        "capacity": m["capacity"],
+    } for m in members]
+    scheduled = [r for a in assignments for r in a["rooms"]]
+    return {
+        "assignments": assignments,
+        "unassigned": unassigned,
+        "summary": {
+            "rooms": len(rooms),
+            "assigned": len(scheduled),
+            "unassigned": len(unassigned),
+            "priority_rooms": sum(1 for r in rooms if r["priority"]),
+            "late_priority_rooms": sum(1 for r in scheduled if r["late"]),
+            "finish_at": max((r["end"] for r in scheduled), default=None),
+        },
+    }
+
+
+def render_plan(schedule: Dict[str, Any]) -> str:
+    """Testo leggibile del piano (usato quando la formulazione GPT è disattivata)."""
+    summary = schedule["summary"]
+    if not summary["rooms"]:
+        return "Nessun check-out registrato oggi: nessuna pulizia da pianificare."
+    lines = [f"Piano pulizie: {summary['assigned']}/{summary['rooms']} camere assegnate, "
+             f"{summary['priority_rooms']} prioritarie (check-in oggi)."]
+    for assignment in schedule["assignments"]:
+        if not assignment["rooms"]:
+            continue
+        rooms = ", ".join(
+            f"{r['room']}{' 🔥' if r['priority'] else ''} ({r['start']}-{r['end']})" for r in assignment["rooms"]
+        )
+        lines.append(f"- {assignment['staff']}: {rooms}")
+    if schedule["unassigned"]:
+        lines.append("⚠️ Non assegnate: " + ", ".join(r["room"] for r in schedule["unassigned"]))
+    if summary["late_priority_rooms"]:
+        lines.append(f"⚠️ {summary['late_priority_rooms']} camere prioritarie pronte dopo l'orario di check-in.")
+    return "\n".join(lines)
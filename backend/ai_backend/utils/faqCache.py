@@ -0,0 +1,160 @@
+"""
+faqCache.py
+Cache semantica delle risposte FAQ per struttura (ai_agent_hub/{user}).
+Le domande vengono normalizzate e confrontate per similarità di n-grammi di caratteri
+(embedding locale di vectorMemory) con una guardia sulle parole chiave, così
+"check-in" e "check-out" non si confondono. Invalidata quando cambia il profilo struttura.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional
+
+import numpy as np
+
+from utils.hubRepository import on_write
+from utils.textUtils import normalize
+from utils.vectorMemory import embed_text
+
+FAQ_CACHE_THRESHOLD = float(os.getenv("FAQ_CACHE_THRESHOLD", "0.8"))  # coseno minimo tra domande
+FAQ_TOKEN_OVERLAP = float(os.getenv("FAQ_TOKEN_OVERLAP", "0.75"))  # Jaccard minimo sulle parole chiave
+FAQ_CACHE_PER_PROPERTY = int(os.getenv("FAQ_CACHE_PER_PROPERTY", "256"))
+FAQ_CACHE_PROPERTIES = int(os.getenv("FAQ_CACHE_PROPERTIES", "1000"))
+FAQ_CACHE_TTL = float(os.getenv("FAQ_CACHE_TTL", "86400"))  # secondi, per modifiche fatte da altri worker
+
+# 🔤 Termini composti unificati prima della tokenizzazione ("check in" ≡ "check-in" ≡ "checkin")
+COMPOUNDS = {"check in": "checkin", "check out": "checkout", "wi fi": "wifi", "e mail": "email"}
+COMPOUND_TOKENS = frozenset(COMPOUNDS.values())
+STOPWORDS = frozenset("""
+il lo la i gli le un una uno l di a da in con su per tra fra e ed o c ce che cosa come quando dove
+qual quale quali quanto quanta ci si mi ti vi ne del della dello dei delle degli al alla allo ai alle
+dal dalla dai nel nella nei sul sulla avete avere ha hanno abbiamo potete puo possibile ora
+favore grazie gentilmente buongiorno salve ciao
+the a an is are do does you your we i can could what when where how to of for in on at there please thanks hi
+""".split())
+
+
+def question_key(question: str) -> str:
+    text = f" {normalize(question)} "
+    for phrase, compound in COMPOUNDS.items():
+        text = text.replace(f" {phrase} ", f" {compound} ")
+    return " ".join(text.split())
+
+
+def _stem(token: str) -> str:
+    """Stem grezzo: primi 5 caratteri senza vocale finale (cane/cani → can, possono/posso → poss)."""
+    if token in COMPOUND_TOKENS:
+        return token  # checkin ≠ checkout
+    token = token[:5]
+    return token[:-1] if len(token) > 3 and token[-1] in "aeiou" else token
+
+
+def keywords(key: str) -> FrozenSet[str]:
+    return frozenset(_stem(t) for t in key.split() if t not in STOPWORDS)
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class PropertyFaqCache:
+    """Domande/risposte di una struttura: matrice embedding (N×D) + indice esatto sulle parole chiave."""
+
+    def __init__(self):
+        self.expires_at = time.monotonic() + FAQ_CACHE_TTL
+        self.questions: List[str] = []
+        self.keywords: List[FrozenSet[str]] = []
+        self.answers: List[str] = []
+        self.last_used: List[float] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.exact: Dict[FrozenSet[str], int] = {}
+
+    def lookup(self, question: str) -> Optional[dict]:
+        if not self.answers:
+            return None
+        key = question_key(question)
+        words = keywords(key)
+        index, similarity = self.exact.get(words) if words else None, 1.0
+        if index is None:
+            scores = self.matrix @ embed_text(key)
+            index = int(np.argmax(scores))
+            similarity = float(scores[index])
+            if similarity < FAQ_CACHE_THRESHOLD or _jaccard(words, self.keywords[index]) < FAQ_TOKEN_OVERLAP:
+                return None
+        self.last_used[index] = time.monotonic()
+        return {"answer": self.answers[index], "question": self.questions[index], "similarity": round(similarity, 3)}
+
+    def add(self, question: str, answer: str) -> None:
+        key = question_key(question)
+        words = keywords(key)
+        if words and words in self.exact:
+            self.answers[self.exact[words]] = answer
+            return
+        if len(self.answers) >= FAQ_CACHE_PER_PROPERTY:
+            self._evict(int(np.argmin(self.last_used)))
+        vector = embed_text(key)[None, :]
+        self.matrix = vector if not len(self.answers) else np.vstack([self.matrix, vector])
+        self.questions.append(question)
+        self.keywords.append(words)
+        self.answers.append(answer)
+        self.last_used.append(time.monotonic())
+        if words:
+            self.exact[words] = len(self.answers) - 1
+
+    def _evict(self, index: int) -> None:
+        for column in (self.questions, self.keywords, self.answers, self.last_used):
+            del column[index]
+        self.matrix = np.delete(self.matrix, index, axis=0)
+        self.exact = {words: i for i, words in enumerate(self.keywords) if words}
+
+
+_properties: "OrderedDict[str, PropertyFaqCache]" = OrderedDict()
+_generation: Dict[str, int] = {}
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+@on_write
+def invalidate(user_id: str, collection: str = "properties") -> None:
+    """Profilo struttura modificato (POST /agent/profile) → risposte della struttura scartate."""
+    if collection != "properties":
+        return
+    _generation[user_id] = _generation.get(user_id, 0) + 1
+    if _properties.pop(user_id, None):
+        _stats["invalidations"] += 1
+
+
+def generation(user_id: str) -> int:
+    """Da leggere prima della chiamata LLM e ripassare a store()."""
+    return _generation.get(user_id, 0)
+
+
+def lookup(user_id: str, question: str) -> Optional[dict]:
+    cache = _properties.get(user_id)
+    if cache and cache.expires_at <= time.monotonic():
+        del _properties[user_id]
+        cache = None
+    hit = cache.lookup(question) if cache else None
+    if hit:
+        _properties.move_to_end(user_id)
+        _stats["hits"] += 1
+    else:
+        _stats["misses"] += 1
+    return hit
+
+
+def store(user_id: str, question: str, answer: str, generation_seen: int) -> None:
+    # 🔁 Risposta generata su un profilo nel frattempo modificato → non va in cache
+    if generation(user_id) != generation_seen:
+        return
+    cache = _properties.get(user_id)
+    if cache is None:
+        cache = _properties[user_id] = PropertyFaqCache()
+        while len(_properties) > FAQ_CACHE_PROPERTIES:
+            _properties.popitem(last=False)
+    _properties.move_to_end(user_id)
+    cache.add(question, answer)
+
+
+def get_stats() -> dict:
+    return {**_stats, "properties": len(_properties)}
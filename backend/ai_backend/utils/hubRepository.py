@@ -0,0 +1,415 @@
+"""
+hubRepository.py
+Data-access layer asincrono per ai_agent_hub/{user} su Firestore AsyncClient.
+Route e dispatcher passano da qui: ogni .get() / .set() / .stream() è awaitable
+e la latenza Firestore si sovrappone tra richieste concorrenti invece di serializzarle.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypedDict
+
+from google.cloud.firestore import Increment, Query, async_transactional
+
+from firebase_config import async_db
+
+Filter = Tuple[str, str, Any]
+BATCH_LIMIT = 500  # operazioni massime per WriteBatch
+
+# 🔔 Listener invocati dopo ogni scrittura su una sottocollezione hub: (user_id, nome_collezione)
+WriteListener = Callable[[str, str], None]
+_write_listeners: List[WriteListener] = []
+
+
+def on_write(listener: WriteListener) -> WriteListener:
+    """Registra un listener (es. invalidazione cache) per le scritture tramite repository."""
+    _write_listeners.append(listener)
+    return listener
+
+
+# 📝 Listener sui dati scritti (set/add): (user_id, nome_collezione, doc_id, dati)
+RecordListener = Callable[[str, str, str, Dict[str, Any]], None]
+_record_listeners: List[RecordListener] = []
+
+
+def on_record(listener: RecordListener) -> RecordListener:
+    """Registra un listener che riceve i documenti scritti (es. indicizzazione memoria a lungo termine)."""
+    _record_listeners.append(listener)
+    return listener
+
+
+# ░░░ RECORD TIPIZZATI ░░░
+class ActionRecord(TypedDict, total=False):
+    actionId: str
+    type: str
+    status: str  # pending | in_progress | completed | error
+    startedAt: datetime
+    completedAt: datetime
+    context: Dict[str, Any]
+    output: Any
+    error: str
+
+
+class DocumentRecord(TypedDict, total=False):
+    documentId: str
+    type: str
+    content: str
+    generatedAt: datetime
+    linkedSession: str
+    source_agent: str
+    tags: List[str]
+
+
+class EventRecord(TypedDict, total=False):
+    eventId: str
+    trigger: str
+    next_agent: str
+    params: Dict[str, Any]
+    status: str  # pending | dispatched | done | error
+    createdAt: datetime
+
+
+class FeedbackRecord(TypedDict, total=False):
+    actionId: str
+    rating: str  # up | down
+    comment: Optional[str]
+    timestamp: datetime
+
+
+class PropertyProfile(TypedDict, total=False):
+    name: str
+    structureType: str
+    services: List[str]
+    extraServices: List[str]
+    checkin: str
+    checkout: str
+
+
+class ContextState(TypedDict, total=False):
+    occupancy_rate: int
+    season: str
+    current_guest: Dict[str, Any]
+    pending_tasks: List[str]
+    last_action: Optional[str]
+    ai_mode: str
+    updatedAt: datetime
+
+
+class DailyStats(TypedDict, total=False):
+    date: str  # YYYY-MM-DD (UTC)
+    actions_completed: int
+    documents_generated: int
+    notifications_created: int
+    last_model: str
+    updatedAt: datetime
+
+
+# ░░░ SOTTOCOLLEZIONE ░░░
+class Subcollection:
+    """Helper async per una sottocollezione di ai_agent_hub/{user}."""
+
+    batch_limit = BATCH_LIMIT
+
+    def __init__(self, hub_ref, name: str):
+        self.name = name
+        self.user_id = hub_ref.id
+        self.ref = hub_ref.collection(name)
+
+    def _notify(self) -> None:
+        for listener in _write_listeners:
+            listener(self.user_id, self.name)
+
+    def _publish(self, doc_id: str, data: Dict[str, Any]) -> None:
+        for listener in _record_listeners:
+            listener(self.user_id, self.name, doc_id, data)
+
+    def doc(self, doc_id: Optional[str] = None):
+        """Riferimento documento (ID generato lato client se omesso)."""
+        return self.ref.document(doc_id) if doc_id else self.ref.document()
+
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        snap = await self.ref.document(doc_id).get()
+        return snap.to_dict() if snap.exists else None
+
+    async def set(self, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+        await self.ref.document(doc_id).set(data, merge=merge)
+        self._notify()
+        self._publish(doc_id, data)
+
+    async def update(self, doc_id: str, data: Dict[str, Any]) -> None:
+        await self.ref.document(doc_id).update(data)
+        self._notify()
+
+    async def add(self, data: Dict[str, Any]) -> str:
+        _, doc_ref = await self.ref.add(data)
+        self._notify()
+        self._publish(doc_ref.id, data)
+        return doc_ref.id
+
+    async def delete(self, doc_id: str) -> None:
+        await self.ref.document(doc_id).delete()
+        self._notify()
+
+    async def set_many(self, items: Iterable[Tuple[str, Dict[str, Any]]], merge: bool = False) -> int:
+        """Scrive molti documenti in WriteBatch da 500 committati in parallelo."""
+        items = list(items)
+        await asyncio.gather(*(
+            self._commit_chunk(items[i:i + self.batch_limit], merge)
+            for i in range(0, len(items), self.batch_limit)
+        ))
+        if items:
+            self._notify()
+        for doc_id, data in items:
+            self._publish(doc_id, data)
+        return len(items)
+
+    async def _commit_chunk(self, chunk: List[Tuple[str, Dict[str, Any]]], merge: bool) -> None:
+        batch = async_db.batch()
+        for doc_id, data in chunk:
+            batch.set(self.ref.document(doc_id), data, merge=merge)
+        await batch.commit()
+
+    def query(
+        self,
+        filters: Iterable[Filter] = (),
+        order_by: Optional[str] = None,
+        direction: str = Query.DESCENDING,
+        limit: Optional[int] = None,
+    ):
+        q = self.ref
+        for field, op, value in filters:
+            q = q.where(field, op, value)
+        if order_by:
+            q = q.order_by(order_by, direction=direction)
+        if limit:
+            q = q.limit(limit)
+        return q
+
+    async def list(
+        self,
+        filters: Iterable[Filter] = (),
+        order_by: Optional[str] = None,
+        direction: str = Query.DESCENDING,
+        limit: Optional[int] = None,
+        id_field: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Esegue la query e restituisce i dict (con l'ID in <id_field> se richiesto)."""
+        q = self.query(filters, order_by, direction, limit)
+        return await stream_dicts(q, id_field)
+
+
+class CountedSubcollection(Subcollection):
+    """Sottocollezione che aggiorna daily_stats/{oggi} nello stesso WriteBatch della scrittura."""
+
+    batch_limit = BATCH_LIMIT - 1  # un'operazione per batch resta al contatore daily_stats
+
+    def __init__(
+        self,
+        hub_ref,
+        name: str,
+        stats_fn: Callable[[Dict[str, Any], bool, Optional[Dict[str, Any]]], Dict[str, Any]],
+        needs_prior: Callable[[Dict[str, Any], bool, bool], bool] = lambda data, is_update, merge: False,
+        retract_fn: Optional[Callable[[Optional[Dict[str, Any]], Dict[str, Any]], Optional[Tuple[Optional[str], Dict[str, Any]]]]] = None,
+    ):
+        super().__init__(hub_ref, name)
+        self.hub_ref = hub_ref
+        self.stats_fn = stats_fn  # (data, is_update, documento precedente) → campi daily_stats da aggiornare
+        self.needs_prior = needs_prior  # (data, is_update, merge) → True se serve lo stato precedente (transizioni)
+        self.retract_fn = retract_fn  # (data | None se delete, precedente) → (giorno, contatori da stornare)
+
+    async def _write(self, doc_id: str, data: Dict[str, Any], is_update: bool, merge: bool = False) -> None:
+        doc_ref = self.ref.document(doc_id)
+        if self.needs_prior(data, is_update, merge):
+            await self._write_transition(doc_ref, data, is_update, merge)
+            self._notify()
+            self._publish(doc_id, data)
+            return
+
+        stats = self.stats_fn(data, is_update, None)
+        if not stats:
+            if is_update:
+                await doc_ref.update(data)
+            else:
+                await doc_ref.set(data, merge=merge)
+        else:
+            batch = async_db.batch()
+            if is_update:
+                batch.update(doc_ref, data)
+            else:
+                batch.set(doc_ref, data, merge=merge)
+            batch.set(daily_stats_ref(self.hub_ref), daily_stats_payload(stats), merge=True)
+            await batch.commit()
+        self._notify()
+        self._publish(doc_id, data)
+
+    async def _write_transition(self, doc_ref, data: Dict[str, Any], is_update: bool, merge: bool) -> None:
+        """Legge lo stato precedente nella stessa transazione: si contano solo le transizioni."""
+
+        @async_transactional
+        async def run(transaction):
+            snap = await doc_ref.get(transaction=transaction)
+            prior = snap.to_dict() if snap.exists else None
+            stats = self.stats_fn(data, is_update, prior)
+            if is_update:
+                transaction.update(doc_ref, data)
+            else:
+                transaction.set(doc_ref, data, merge=merge)
+            if stats:
+                transaction.set(daily_stats_ref(self.hub_ref), daily_stats_payload(stats), merge=True)
+            self._retract(transaction, data, prior)
+
+        await run(async_db.transaction())
+
+    def _retract(self, transaction, data: Optional[Dict[str, Any]], prior: Optional[Dict[str, Any]]) -> None:
+        retraction = self.retract_fn(data, prior) if self.retract_fn and prior else None
+        if retraction:
+            day, stats = retraction
+            transaction.set(daily_stats_ref(self.hub_ref, day), daily_stats_payload(stats, day), merge=True)
+
+    async def delete(self, doc_id: str) -> None:
+        if not self.retract_fn:
+            await super().delete(doc_id)
+            return
+        doc_ref = self.ref.document(doc_id)
+
+        @async_transactional
+        async def run(transaction):
+            snap = await doc_ref.get(transaction=transaction)
+            transaction.delete(doc_ref)
+            self._retract(transaction, None, snap.to_dict() if snap.exists else None)
+
+        await run(async_db.transaction())
+        self._notify()
+
+    async def set(self, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+        await self._write(doc_id, data, is_update=False, merge=merge)
+
+    async def update(self, doc_id: str, data: Dict[str, Any]) -> None:
+        await self._write(doc_id, data, is_update=True)
+
+    async def _commit_chunk(self, chunk: List[Tuple[str, Dict[str, Any]]], merge: bool) -> None:
+        # set_many è pensato per documenti nuovi (ID generati): nessuno stato precedente da leggere
+        batch = async_db.batch()
+        stats: Dict[str, Any] = {}
+        for doc_id, data in chunk:
+            batch.set(self.ref.document(doc_id), data, merge=merge)
+            for field, value in self.stats_fn(data, False, None).items():
+                counter = isinstance(value, int) and not isinstance(value, bool)
+                stats[field] = stats.get(field, 0) + value if counter else value
+        if stats:
+            batch.set(daily_stats_ref(self.hub_ref), daily_stats_payload(stats), merge=True)
+        await batch.commit()
+
+
+def _action_needs_prior(data: Dict[str, Any], is_update: bool, merge: bool) -> bool:
+    """Solo update/merge di documenti esistenti leggono lo stato precedente;
+    un set() completo (ID nuovo, uuid4) resta un singolo WriteBatch."""
+    return "status" in data and (is_update or merge)
+
+
+def _action_retraction(data: Optional[Dict[str, Any]], prior: Dict[str, Any]) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+    """Azione che esce da completed (cambio stato o delete) → -1 sul giorno in cui era stata contata."""
+    if prior.get("status") != "completed":
+        return None
+    if data is not None and data.get("status", "completed") == "completed":
+        return None
+    completed_at = prior.get("completedAt")
+    day = completed_at.strftime("%Y-%m-%d") if hasattr(completed_at, "strftime") else None
+    return day, {"actions_completed": -1}
+
+
+def _action_stats(data: Dict[str, Any], is_update: bool, prior: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {}
+    # ✅ Solo la transizione → completed (un secondo PATCH su un'azione già completata non conta)
+    if data.get("status") == "completed" and (prior or {}).get("status") != "completed":
+        stats["actions_completed"] = 1
+    context = data.get("context")
+    if isinstance(context, dict) and context.get("model"):
+        stats["last_model"] = context["model"]
+    return stats
+
+
+def _document_stats(data: Dict[str, Any], is_update: bool, prior: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {} if is_update else {"documents_generated": 1}
+
+
+# ░░░ CONTATORI GIORNALIERI ░░░
+def today_key() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def daily_stats_ref(hub_ref, day: Optional[str] = None):
+    return hub_ref.collection("daily_stats").document(day or today_key())
+
+
+def daily_stats_payload(stats: Dict[str, Any], day: Optional[str] = None) -> Dict[str, Any]:
+    """Interi → Increment atomici, altri valori scritti così come sono (merge)."""
+    payload: Dict[str, Any] = {"date": day or today_key(), "updatedAt": datetime.utcnow()}
+    for field, value in stats.items():
+        payload[field] = Increment(value) if isinstance(value, int) and not isinstance(value, bool) else value
+    return payload
+
+
+# ░░░ HUB UTENTE ░░░
+class HubRepository:
+    """Accesso tipizzato a ai_agent_hub/{user} e alle sue sottocollezioni."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.ref = async_db.collection("ai_agent_hub").document(user_id)
+        self.actions = CountedSubcollection(self.ref, "actions", _action_stats, _action_needs_prior, _action_retraction)
+        self.documents = CountedSubcollection(self.ref, "documents", _document_stats)
+        self.events = Subcollection(self.ref, "events")
+        self.feedback = Subcollection(self.ref, "feedback")
+        self.properties = Subcollection(self.ref, "properties")
+        self.context = Subcollection(self.ref, "context")
+        self.daily_stats = Subcollection(self.ref, "daily_stats")
+
+    def collection(self, name: str) -> Subcollection:
+        """Altre sottocollezioni (alerts, insights, pending_actions, ...)."""
+        return Subcollection(self.ref, name)
+
+    async def get_root(self) -> Optional[Dict[str, Any]]:
+        snap = await self.ref.get()
+        return snap.to_dict() if snap.exists else None
+
+    async def set_root(self, data: Dict[str, Any], merge: bool = True) -> None:
+        await self.ref.set(data, merge=merge)
+
+    async def update_root(self, data: Dict[str, Any]) -> None:
+        await self.ref.update(data)
+
+    async def get_profile(self) -> PropertyProfile:
+        return await self.properties.get("main") or {}
+
+    async def get_context_state(self) -> ContextState:
+        return await self.context.get("state") or {}
+
+    def daily_stats_ref(self, day: Optional[str] = None):
+        return daily_stats_ref(self.ref, day)
+
+    async def get_daily_stats(self, day: Optional[str] = None) -> DailyStats:
+        return await self.daily_stats.get(day or today_key()) or {}
+
+
+def hub(user_id: str) -> HubRepository:
+    return HubRepository(user_id)
+
+
+# ░░░ UTILITY ░░░
+async def stream_dicts(query, id_field: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Consuma uno stream async e restituisce la lista dei documenti come dict."""
+    results = []
+    async for doc in query.stream():
+        data = doc.to_dict()
+        if id_field:
+            data[id_field] = doc.id
+        results.append(data)
+    return results
+
+
+async def first_snapshot(query):
+    """Primo snapshot di una query (o None)."""
+    async for doc in query.limit(1).stream():
+        return doc
+    return None
@@ -0,0 +1,94 @@
+"""
+intentCache.py
+Cache dei risultati di classificazione intent sul messaggio normalizzato.
+Livello locale LRU + TTL per processo, livello Redis opzionale condiviso tra worker uvicorn.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from utils.textUtils import normalize
+
+try:
+    import redis.asyncio as redis  # type: ignore[import]
+except ImportError:
+    redis = None  # Solo cache locale se la libreria non è installata
+
+CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "2048"))
+CACHE_TTL = int(os.getenv("INTENT_CACHE_TTL", "3600"))  # secondi
+PER_USER = os.getenv("INTENT_CACHE_PER_USER", "false").lower() == "true"
+REDIS_URL = os.getenv("INTENT_CACHE_REDIS_URL") or os.getenv("REDIS_URL")
+REDIS_PREFIX = "intent:"
+
+_entries: "OrderedDict[str, tuple]" = OrderedDict()  # key → (intent, expires_at)
+_stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0}
+_redis = redis.from_url(REDIS_URL, decode_responses=True) if redis and REDIS_URL else None
+
+
+def make_key(message: str, user_id: Optional[str] = None) -> str:
+    key = normalize(message)
+    if PER_USER and user_id:
+        return f"{user_id}:{key}"
+    return key
+
+
+def _remember(key: str, intent: str):
+    _entries[key] = (intent, time.monotonic() + CACHE_TTL)
+    _entries.move_to_end(key)
+    while len(_entries) > CACHE_SIZE:
+        _entries.popitem(last=False)
+        _stats["evictions"] += 1
+
+
+async def get(message: str, user_id: Optional[str] = None) -> Optional[str]:
+    key = make_key(message, user_id)
+    if not key:
+        return None
+
+    entry = _entries.get(key)
+    if entry:
+        intent, expires_at = entry
+        if expires_at > time.monotonic():
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return intent
+        del _entries[key]
+
+    # 🌐 Livello condiviso (altri worker)
+    if _redis:
+        try:
+            intent = await _redis.get(REDIS_PREFIX + key)
+        except Exception as e:
+            print(f"[INTENT CACHE] ⚠️ Redis non disponibile: {e}")
+            intent = None
+        if intent:
+            _remember(key, intent)
+            _stats["shared_hits"] += 1
+            return intent
+
+    _stats["misses"] += 1
+    return None
+
+
+async def put(message: str, intent: str, user_id: Optional[str] = None):
+    key = make_key(message, user_id)
+    if not key:
+        return
+    _remember(key, intent)
+    if _redis:
+        try:
+            await _redis.set(REDIS_PREFIX + key, intent, ex=CACHE_TTL)
+        except Exception as e:
+            print(f"[INTENT CACHE] ⚠️ Redis non disponibile: {e}")
+
+
+def clear():
+    _entries.clear()
+
+
+def get_stats() -> dict:
+    lookups = _stats["hits"] + _stats["shared_hits"] + _stats["misses"]
+    hit_rate = (_stats["hits"] + _stats["shared_hits"]) / lookups if lookups else 0.0
+    return {**_stats, "size": len(_entries), "hit_rate": round(hit_rate, 4), "shared": bool(_redis)}
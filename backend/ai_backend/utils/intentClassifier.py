@@ -1,10 +1,11 @@
 # ✅ FILE: utils/intentClassifier.py
 
-import openai
-import os
 from datetime import datetime
-import firebase_admin
-from firebase_admin import firestore
+from dispatchers.logUtils import log_record  # 🧾 Sink log a batch
+from utils.hubRepository import hub
+from utils.llmGateway import chat_completion  # ✅ Gateway OpenAI async
+from utils import localIntentModel  # ⚡ Fast path locale
+from utils import intentCache  # 🗃️ Cache intent su messaggio normalizzato
 
 # ✅ Intent supportati
 VALID_INTENTS = {
@@ -14,19 +15,13 @@ VALID_INTENTS = {
     "context", "feedback", "event", "followup"
 }
 
-# ✅ OpenAI
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("⚠️ OPENAI_API_KEY mancante")
-client = openai.OpenAI(api_key=openai_api_key)
-
-# ✅ Firestore
-if not firebase_admin._apps:
-    firebase_admin.initialize_app()
-db = firestore.client()
-
 # 🔍 Classificatore Intent con fallback e logging
 async def classify_intent_from_message(message: str, user_id: str = None) -> str:
+    # 🗃️ Frase già vista: nessuna chiamata OpenAI né scrittura log
+    cached = await intentCache.get(message, user_id)
+    if cached:
+        return cached
+
     system_prompt = """
 Sei un classificatore IA per un assistente per hotel.
 Dato un messaggio dell’utente, individua l’intent dell’agente più adatto tra i seguenti:
@@ -40,21 +35,40 @@ Rispondi solo con il nome dell’intent, esattamente come scritto sopra.
     error_logs = []
     now = datetime.utcnow()
 
+    # ⚡ Fast path: classificatore locale, LLM solo sotto soglia di confidenza
+    local_intent, confidence = localIntentModel.predict(message)
+    if local_intent in VALID_INTENTS and confidence >= localIntentModel.LOCAL_INTENT_THRESHOLD:
+        log_record({
+            "user_id": user_id or "anonymous",
+            "message": message,
+            "detected_intent": local_intent,
+            "timestamp": now,
+            "model_used": "local",
+            "confidence": confidence,
+            "errors": None,
+            "level": "intent_classification"
+        })
+        await intentCache.put(message, local_intent, user_id)
+        return local_intent
+
     for model in model_order:
         try:
-            response = client.chat.completions.create(
+            response = await chat_completion(
                 model=model,
                 messages=[
                     {"role": "system", "content": system_prompt.strip()},
                     {"role": "user", "content": message.strip()}
                 ],
-                temperature=0
+                temperature=0,
+                source="intentClassifier",
+                user_id=user_id
             )
             raw = response.choices[0].message.content.strip().lower()
             intent = raw.replace("intent:", "").replace('"', "").replace("'", "").strip()
 
             if intent in VALID_INTENTS:
                 intent_final = intent
+                localIntentModel.learn(message, intent)  # 🧠 Etichetta LLM → modello locale
                 break
             else:
                 error_logs.append(f"Modello {model} ha risposto: {raw}")
@@ -69,14 +83,15 @@ Rispondi solo con il nome dell’intent, esattamente come scritto sopra.
             "detected_intent": intent_final,
             "timestamp": now,
             "model_used": model if intent_final != "unknown" else None,
+            "confidence": confidence,
             "errors": error_logs if intent_final == "unknown" else None,
             "level": "intent_classification"
         }
-        db.collection("ai_agent_logs").add(log_data)
+        log_record(log_data)
 
         # 🧠 Salva intent_history utente
         if user_id and intent_final != "unknown":
-            db.collection("ai_agent_hub").document(user_id).collection("intent_history").add({
+            await hub(user_id).collection("intent_history").add({
                 "message": message,
                 "intent": intent_final,
                 "detectedAt": now,
@@ -86,4 +101,7 @@ Rispondi solo con il nome dell’intent, esattamente come scritto sopra.
     except Exception as firestore_err:
         print(f"[LOGGER] ❌ Errore salvataggio Firestore: {firestore_err}")
 
+    if intent_final != "unknown":
+        await intentCache.put(message, intent_final, user_id)
+
     return intent_final
@@ -0,0 +1,75 @@
+"""
+keywordMatcher.py
+Automa Aho-Corasick per cercare molte parole chiave in un solo passaggio lineare sul testo.
+Pattern e testo passano dalla stessa normalizzazione (minuscolo, senza accenti né punteggiatura),
+quindi "Check-in", "check in" e "CHECK-IN" coincidono. Costruito una volta, riusato per ogni richiesta.
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from utils.textUtils import normalize
+
+
+class Match(NamedTuple):
+    start: int
+    end: int
+    keyword: str
+    value: Any
+
+
+class KeywordMatcher:
+    """Automa costruito da coppie (parola chiave, valore); più valori per la stessa parola sono ammessi."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, Any]]] = [[]]
+        for keyword, value in patterns:
+            self._add(normalize(keyword), value)
+        self._link()
+
+    def _add(self, keyword: str, value: Any) -> None:
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((keyword, value))
+
+    def _link(self) -> None:
+        """Link di fallimento in BFS; ogni stato eredita le uscite del suo suffisso più lungo."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str, normalized: bool = False) -> List[Match]:
+        """Tutte le occorrenze (anche sovrapposte) sul testo normalizzato, in O(len(testo) + match)."""
+        text = text if normalized else normalize(text)
+        matches, state = [], 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword, value in self._out[state]:
+                matches.append(Match(i + 1 - len(keyword), i + 1, keyword, value))
+        return matches
+
+
+def longest_match(matches: Iterable[Match]) -> Optional[Match]:
+    """Longest-match-wins; a parità di lunghezza vince l'occorrenza più a sinistra."""
+    return min(matches, key=lambda m: (-(m.end - m.start), m.start), default=None)
@@ -0,0 +1,153 @@
+"""
+llmGateway.py
+Gateway asincrono unico verso OpenAI per dispatcher e route.
+Un solo AsyncOpenAI con pool HTTP condiviso, limiti di concorrenza per modello,
+timeout e retry con jitter: le completion non bloccano più l'event loop.
+"""
+
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+import openai
+
+from utils import usageLedger  # 📒 Contabilità token per giorno/modello/utente
+
+# ✅ Configura OpenAI
+openai_api_key = os.getenv("OPENAI_API_KEY")
+if not openai_api_key:
+    raise RuntimeError("❌ OPENAI_API_KEY mancante")
+
+# ⚙️ Parametri gateway (override via env)
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_DEFAULT_CONCURRENCY", "32"))
+MODEL_CONCURRENCY = {
+    "gpt-4": int(os.getenv("LLM_GPT4_CONCURRENCY", "16")),
+    "gpt-3.5-turbo": int(os.getenv("LLM_GPT35_CONCURRENCY", "64")),
+}
+
+# 🔁 Errori transitori per cui ha senso ritentare
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# 🌐 Pool HTTP condiviso da tutte le completion
+_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+    timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=10.0),
+)
+client = openai.AsyncOpenAI(
+    api_key=openai_api_key,
+    http_client=_http_client,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=0,  # i retry li gestisce il gateway
+)
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _semaphore(model: str) -> asyncio.Semaphore:
+    """Semaforo di concorrenza per modello (creato alla prima richiesta)."""
+    if model not in _semaphores:
+        _semaphores[model] = asyncio.Semaphore(MODEL_CONCURRENCY.get(model, DEFAULT_CONCURRENCY))
+    return _semaphores[model]
+
+
+async def chat_completion(
+    model: str,
+    messages: List[Dict],
+    temperature: float = 0.7,
+    timeout: Optional[float] = None,
+    source: Optional[str] = None,
+    user_id: Optional[str] = None,
+    **kwargs,
+):
+    """Chat completion non bloccante con retry esponenziale + jitter sugli errori transitori.
+    source/user_id attribuiscono l'usage nel ledger dei token."""
+    delay = 1.0
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            async with _semaphore(model):
+                started = time.perf_counter()
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout or DEFAULT_TIMEOUT,
+                    **kwargs,
+                )
+            latency_ms = (time.perf_counter() - started) * 1000
+            usageLedger.record(model, getattr(response, "usage", None), source, user_id, latency_ms)
+            return response
+        except RETRYABLE_ERRORS:
+            if attempt == MAX_RETRIES:
+                raise
+            # 💤 Il semaforo è già rilasciato: l'attesa non occupa slot del modello
+            await asyncio.sleep(delay + random.uniform(0, delay))
+            delay *= 2
+
+
+async def chat_completion_stream(
+    model: str,
+    messages: List[Dict],
+    temperature: float = 0.7,
+    timeout: Optional[float] = None,
+    source: Optional[str] = None,
+    user_id: Optional[str] = None,
+    **kwargs,
+) -> AsyncIterator[str]:
+    """Completion in streaming: restituisce i delta di testo man mano che arrivano.
+    Il retry copre solo l'apertura dello stream (a token già emessi non si può ripetere)."""
+    delay = 1.0
+    started = time.perf_counter()
+    opened = False
+    chunks: List[str] = []
+    try:
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                async with _semaphore(model):
+                    stream = await client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        timeout=timeout or DEFAULT_TIMEOUT,
+                        stream=True,
+                        **kwargs,
+                    )
+                    opened = True
+                    async for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            chunks.append(delta)
+                            yield delta
+                return
+            except RETRYABLE_ERRORS:
+                if attempt == MAX_RETRIES or chunks:
+                    raise
+                # 💤 Il semaforo è già rilasciato: l'attesa non occupa slot del modello
+                await asyncio.sleep(delay + random.uniform(0, delay))
+                delay *= 2
+    finally:
+        # 📒 Anche su disconnessione client o errore a metà stream: i token ricevuti sono già fatturati.
+        # Lo stream non riporta usage: stima ~4 caratteri per token
+        if opened:
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+            completion_tokens = len("".join(chunks)) // 4
+            usageLedger.record(model, SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ), source, user_id, (time.perf_counter() - started) * 1000)
+
+
+async def close():
+    """Chiude il pool HTTP (da chiamare allo shutdown del server)."""
+    await _http_client.aclose()
@@ -0,0 +1,163 @@
+"""
+localIntentModel.py
+Classificatore intent locale (fast path) prima della cascata GPT.
+Due livelli: regole keyword/regex scritte a mano + Naive Bayes su n-grammi di caratteri
+addestrato dagli intent_history già salvati dal classificatore LLM.
+predict() restituisce (intent, confidenza) in frazioni di millisecondo.
+"""
+
+import math
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from utils.textUtils import normalize
+
+LOCAL_INTENT_THRESHOLD = float(os.getenv("LOCAL_INTENT_THRESHOLD", "0.8"))
+KEYWORD_SATURATION = 2.0  # punteggio keyword per confidenza piena: una sola keyword non basta al bypass LLM
+MIN_TRAINING_SAMPLES = 50  # sotto questa soglia il modello n-gram non vota
+NGRAM_SIZES = (3, 4)
+ALPHA = 0.5  # smoothing di Laplace
+
+# 🔑 Regole keyword (radici italiane/inglesi) → peso
+KEYWORD_RULES: Dict[str, Tuple[Tuple[str, float], ...]] = {
+    "pricing": ((r"\bprezz", 1.0), (r"\btariff", 1.0), (r"\bpric(e|es|ing)\b", 1.0), (r"\bcosto camer", 0.8)),
+    "checkin": ((r"\bcheck ?in\b", 1.0), (r"\barriv", 0.6), (r"\bdocumenti ospit", 0.8)),
+    "cleaning": ((r"\bpuliz", 1.0), (r"\bclean", 1.0), (r"\bhousekeeping", 1.0)),
+    "upsell": ((r"\bupsell", 1.0), (r"\bupgrade", 1.0), (r"\bservizi extra", 0.8)),
+    "marketing": ((r"\bmarketing", 1.0), (r"\bcampagn", 1.0), (r"\bnewsletter", 1.0), (r"\bsocial\b", 0.7)),
+    "crm": ((r"\bcrm\b", 1.0), (r"\banagrafic", 0.7), (r"\bcontatti client", 0.8)),
+    "conversion": ((r"\bconversion", 1.0), (r"\btasso di conversione", 1.0)),
+    "revenue": ((r"\brevenue", 1.0), (r"\bricav[oi]\b", 1.0), (r"\bfatturat[oi]\b", 1.0)),
+    "bookingfix": ((r"\bbookingfix", 1.0), (r"\bcorregg\w* (la |le )?prenotazion", 1.5), (r"\berror\w* (nella |nelle )?prenotazion", 1.5)),
+    "support": ((r"\bsupport", 1.0), (r"\bassistenza", 1.0), (r"\bticket", 1.0)),
+    "booking": ((r"\bprenot", 1.0), (r"\bbooking", 1.0), (r"\breservation", 1.0)),
+    "report": ((r"\breport", 1.0), (r"\bresocont", 1.0), (r"\briepilog", 1.0)),
+    "insight": ((r"\binsight", 1.0), (r"\banalisi", 0.8), (r"\btrend", 0.8)),
+    "faq": ((r"\bfaq\b", 1.0), (r"\bdomande frequenti", 1.0), (r"\bwi ?fi\b", 0.7), (r"\bcolazion", 0.7)),
+    "security": ((r"\bsicurezz", 1.0), (r"\bsecurity", 1.0), (r"\bpassword", 1.0), (r"\baccess[oi] sospett", 1.0)),
+    "alert": ((r"\balert", 1.0), (r"\bavvis", 0.8), (r"\bnotific", 0.8)),
+    "autopilot": ((r"\bautopilot", 1.0), (r"\bpilota automatico", 1.0)),
+    "context": ((r"\bcontest", 1.0), (r"\bcontext", 1.0), (r"\bstato attuale", 0.8)),
+    "feedback": ((r"\bfeedback", 1.0), (r"\brecension", 1.0), (r"\breview", 1.0)),
+    "event": ((r"\bevent[ois]?\b", 1.0),),
+    "followup": ((r"\bfollow ?up", 1.0), (r"\bricontatt", 1.0), (r"\bricord\w* (al|agli) ospit", 0.8)),
+}
+
+_COMPILED_RULES = {
+    intent: [(re.compile(pattern), weight) for pattern, weight in rules]
+    for intent, rules in KEYWORD_RULES.items()
+}
+
+
+# ░░░ LIVELLO 1: KEYWORD ░░░
+def keyword_scores(text: str) -> Tuple[Optional[str], float]:
+    scores = {}
+    for intent, rules in _COMPILED_RULES.items():
+        score = sum(weight for pattern, weight in rules if pattern.search(text))
+        if score:
+            scores[intent] = score
+    if not scores:
+        return None, 0.0
+    best = max(scores, key=scores.get)
+    share = scores[best] / sum(scores.values())
+    # 📏 Confidenza = quota del punteggio × saturazione: una keyword da sola resta sotto soglia
+    return best, round(share * min(1.0, scores[best] / KEYWORD_SATURATION), 4)
+
+
+# ░░░ LIVELLO 2: NAIVE BAYES SU N-GRAMMI ░░░
+class NgramNaiveBayes:
+    def __init__(self):
+        self.feature_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.total_features: Dict[str, int] = defaultdict(int)
+        self.class_counts: Dict[str, int] = defaultdict(int)
+        self.vocabulary = set()
+        self.samples = 0
+
+    @staticmethod
+    def features(text: str):
+        padded = f" {text} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+
+    def learn(self, text: str, intent: str):
+        """Aggiornamento online: costa quanto una predict."""
+        self.class_counts[intent] += 1
+        self.samples += 1
+        counts = self.feature_counts[intent]
+        for feature in self.features(text):
+            counts[feature] += 1
+            self.total_features[intent] += 1
+            self.vocabulary.add(feature)
+
+    @property
+    def ready(self) -> bool:
+        return self.samples >= MIN_TRAINING_SAMPLES
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        feats = list(self.features(text))
+        if not feats or not self.class_counts:
+            return None, 0.0
+        vocab = len(self.vocabulary) + 1
+        log_scores = {}
+        for intent, class_count in self.class_counts.items():
+            counts = self.feature_counts[intent]
+            denom = math.log(self.total_features[intent] + ALPHA * vocab)
+            score = sum(math.log(counts.get(f, 0) + ALPHA) - denom for f in feats)
+            # ⚖️ Media per n-gramma: evita probabilità saturate a 1.0 su testi lunghi
+            log_scores[intent] = math.log(class_count / self.samples) + score / len(feats)
+        top = max(log_scores.values())
+        exp_scores = {i: math.exp(s - top) for i, s in log_scores.items()}
+        best = max(exp_scores, key=exp_scores.get)
+        return best, round(exp_scores[best] / sum(exp_scores.values()), 4)
+
+
+_model = NgramNaiveBayes()
+
+
+def predict(message: str) -> Tuple[Optional[str], float]:
+    """Intent locale + confidenza (0..1). (None, 0.0) se nessun segnale."""
+    text = normalize(message)
+    if not text:
+        return None, 0.0
+    kw_intent, kw_conf = keyword_scores(text)
+    if not _model.ready:
+        return kw_intent, kw_conf
+
+    nb_intent, nb_conf = _model.predict(text)
+    if kw_intent is None:
+        return nb_intent, nb_conf
+    if nb_intent == kw_intent:
+        # 🤝 Livelli concordi: le evidenze si sommano (noisy-OR)
+        return kw_intent, round(1 - (1 - kw_conf) * (1 - nb_conf), 4)
+    # ⚠️ Livelli in disaccordo: confidenza dimezzata → quasi sempre fallback LLM
+    if kw_conf >= nb_conf:
+        return kw_intent, round(kw_conf / 2, 4)
+    return nb_intent, round(nb_conf / 2, 4)
+
+
+def learn(message: str, intent: str):
+    """Aggiunge un esempio etichettato (es. risposta LLM) al modello n-gram."""
+    text = normalize(message)
+    if text:
+        _model.learn(text, intent)
+
+
+async def train_from_history(limit: int = 5000) -> int:
+    """Addestra il modello dagli intent_history di tutti gli utenti."""
+    global _model
+    from firebase_config import async_db  # import locale: il modello resta usabile senza credenziali Firestore
+
+    model = NgramNaiveBayes()
+    query = async_db.collection_group("intent_history").limit(limit)
+    async for doc in query.stream():
+        data = doc.to_dict()
+        text = normalize(data.get("message") or "")
+        intent = data.get("intent")
+        if text and intent:
+            model.learn(text, intent)
+    _model = model
+    print(f"[INTENT] 🧠 Modello locale addestrato su {model.samples} esempi")
+    return model.samples
@@ -0,0 +1,131 @@
+"""
+pricingCompletion.py
+Output strutturato per le completion di pricing: il modello risponde tramite function calling
+(schema suggest_price), il parser locale tollera risposte testuali ("Consiglio 129,90 €...")
+e il prezzo viene validato rispetto al base_price calcolato.
+Risposte illeggibili o fuori scala vengono riparate localmente, senza richiamare il modello.
+"""
+
+import json
+import os
+import re
+from typing import Any, Optional, Tuple
+
+MIN_BASE_RATIO = float(os.getenv("PRICING_LLM_MIN_RATIO", "0.5"))  # prezzo LLM accettato in [0.5, 1.5] × base_price
+MAX_BASE_RATIO = float(os.getenv("PRICING_LLM_MAX_RATIO", "1.5"))
+
+PRICE_FUNCTION = "suggest_price"
+PRICE_TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": PRICE_FUNCTION,
+        "description": "Prezzo di vendita consigliato per la camera/struttura.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "price": {"type": "number", "description": "Prezzo consigliato in euro, senza simbolo di valuta"},
+                "reason": {"type": "string", "description": "Motivazione sintetica"},
+            },
+            "required": ["price"],
+        },
+    },
+}]
+PRICE_TOOL_CHOICE = {"type": "function", "function": {"name": PRICE_FUNCTION}}
+
+_NUMBER = re.compile(r"\d{1,3}(?:[.,\s']\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d+)?")
+_CURRENCY = re.compile(r"€|\beur(?:o|os)?\b", re.IGNORECASE)
+
+
+# ░░░ PARSER ░░░
+def _to_float(token: str) -> Optional[float]:
+    """Numero in formato IT/EN: 1.234,50 · 1,234.50 · 129,9 · 129.90 · 1 234."""
+    token = re.sub(r"[\s']", "", token)
+    if "," in token and "." in token:
+        decimal = "," if token.rfind(",") > token.rfind(".") else "."
+        token = token.replace("." if decimal == "," else ",", "").replace(decimal, ".")
+    elif "," in token:
+        whole, _, frac = token.rpartition(",")
+        token = f"{whole.replace(',', '')}.{frac}" if len(frac) != 3 else token.replace(",", "")
+    elif token.count(".") > 1 or re.fullmatch(r"\d{1,3}\.\d{3}", token):
+        token = token.replace(".", "")  # separatore delle migliaia
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def _from_json(text: str) -> Optional[float]:
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group())
+    except ValueError:
+        return None
+    for key in ("price", "optimized_price", "prezzo", "suggested_price"):
+        value = data.get(key) if isinstance(data, dict) else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str):
+            return parse_price_text(value)
+    return None
+
+
+def parse_price_text(text: str, base_price: Optional[float] = None) -> Optional[float]:
+    """Estrae il prezzo da JSON o testo libero: preferisce il numero vicino al simbolo €,
+    poi quello più vicino al base_price, altrimenti il primo trovato."""
+    if not text:
+        return None
+    value = _from_json(text)
+    if value is not None:
+        return value
+
+    candidates = []
+    for match in _NUMBER.finditer(text):
+        number = _to_float(match.group())
+        if number is None or number <= 0:
+            continue
+        around = text[max(0, match.start() - 4):match.end() + 6]
+        candidates.append((number, bool(_CURRENCY.search(around)), text[match.end():match.end() + 1] == "%"))
+
+    candidates = [c for c in candidates if not c[2]]  # niente percentuali (occupazione, delta...)
+    if not candidates:
+        return None
+    priced = [c[0] for c in candidates if c[1]]
+    if priced:
+        return priced[0]
+    if base_price:
+        return min((c[0] for c in candidates), key=lambda n: abs(n - base_price))
+    return candidates[0][0]
+
+
+def extract_price(message: Any, base_price: Optional[float] = None) -> Optional[float]:
+    """Prezzo dalla risposta del modello: argomenti della function call, poi il contenuto testuale."""
+    for call in getattr(message, "tool_calls", None) or []:
+        function = getattr(call, "function", None)
+        if getattr(function, "name", None) == PRICE_FUNCTION:
+            value = parse_price_text(function.arguments or "", base_price)
+            if value is not None:
+                return value
+    return parse_price_text(getattr(message, "content", None) or "", base_price)
+
+
+# ░░░ VALIDAZIONE E RIPARAZIONE ░░░
+def price_bounds(base_price: float) -> Tuple[float, float]:
+    return base_price * MIN_BASE_RATIO, base_price * MAX_BASE_RATIO
+
+
+def resolve_price(message: Any, base_price: float, fallback_price: float) -> Tuple[float, str]:
+    """
+    (prezzo, fonte):
+    - "llm"            prezzo del modello entro i limiti
+    - "llm_clamped"    prezzo del modello riportato entro [min, max] × base_price
+    - "local_fallback" risposta illeggibile → prezzo calcolato localmente (nessuna nuova chiamata)
+    """
+    price = extract_price(message, base_price)
+    if price is None:
+        return round(fallback_price, 2), "local_fallback"
+    lower, upper = price_bounds(base_price)
+    if price < lower or price > upper:
+        return round(min(max(price, lower), upper), 2), "llm_clamped"
+    return round(price, 2), "llm"
@@ -0,0 +1,212 @@
+"""
+pricingEngine.py
+Pricing dinamico vettoriale (NumPy) sull'intera griglia camere × date di una struttura.
+Stessa formula del dispatcher (70% prezzo attuale + 30% media competitor, × stagionalità),
+più correzione per occupazione e guard-rail, calcolata in un solo passaggio per tutto il calendario.
+I risultati vengono salvati in DynamicPricing/{property_id}/calendar/{room_id} con WriteBatch paralleli.
+"""
+
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+CURRENT_WEIGHT = 0.7
+COMPETITOR_WEIGHT = 0.3
+OCCUPANCY_TARGET = float(os.getenv("PRICING_OCCUPANCY_TARGET", "0.7"))
+OCCUPANCY_ELASTICITY = float(os.getenv("PRICING_OCCUPANCY_ELASTICITY", "0.5"))  # +5% prezzo ogni +10% occupazione
+MAX_INCREASE = float(os.getenv("PRICING_MAX_INCREASE", "0.25"))  # guard-rail rispetto al prezzo attuale
+MAX_DECREASE = float(os.getenv("PRICING_MAX_DECREASE", "0.20"))
+MIN_CHANGE_PCT = float(os.getenv("PRICING_MIN_CHANGE_PCT", "5"))  # sotto soglia il prezzo resta invariato
+BATCH_SIZE = 500
+PARALLEL_BATCHES = int(os.getenv("PRICING_PARALLEL_BATCHES", "4"))
+
+
+# ░░░ CALCOLO VETTORIALE ░░░
+def _grid(values: Any, rooms: int, days: int, name: str) -> np.ndarray:
+    """Scalare, curva per data (D), colonna per camera (R×1) o matrice R×D → matrice R×D float64."""
+    array = np.asarray(values, dtype=np.float64)
+    try:
+        return np.broadcast_to(array, (rooms, days))
+    except ValueError:
+        raise ValueError(f"❌ Dimensioni non valide per {name}: {array.shape} (attese {rooms}×{days})")
+
+
+def _competitor_mean(competitors: Any, rooms: int, days: int) -> np.ndarray:
+    """Media competitor per cella; accetta C, D×C o R×D×C (NaN = prezzo mancante)."""
+    array = np.asarray(competitors, dtype=np.float64)
+    if array.ndim == 0 or array.size == 0:
+        raise ValueError("❌ Prezzi competitor mancanti")
+    with np.errstate(invalid="ignore"):
+        counts = np.sum(~np.isnan(array), axis=-1)
+        mean = np.where(counts > 0, np.nansum(array, axis=-1) / np.maximum(counts, 1), np.nan)
+    return _grid(mean, rooms, days, "competitor_prices")
+
+
+def compute_prices(
+    current_price: Any,
+    occupancy: Any,
+    competitor_prices: Any,
+    seasonality: Any = 1.0,
+    min_price: Any = 0.0,
+    max_price: Any = np.inf,
+    rooms: int = 1,
+    days: int = 1,
+) -> Dict[str, np.ndarray]:
+    """Prezzi base, ottimizzati, delta e guard-rail per ogni cella (R×D)."""
+    current = _grid(current_price, rooms, days, "current_price")
+    occupancy = np.clip(_grid(occupancy, rooms, days, "occupancy"), 0.0, 1.0)
+    season = _grid(seasonality, rooms, days, "seasonality")
+    competitor = _competitor_mean(competitor_prices, rooms, days)
+    competitor = np.where(np.isnan(competitor), current, competitor)  # senza competitor: prezzo attuale
+
+    base = (current * CURRENT_WEIGHT + competitor * COMPETITOR_WEIGHT) * season
+    target = base * (1 + OCCUPANCY_ELASTICITY * (occupancy - OCCUPANCY_TARGET))
+
+    # 🛡️ Guard-rail: variazione massima rispetto al prezzo attuale + limiti assoluti per camera
+    lower = np.maximum(current * (1 - MAX_DECREASE), _grid(min_price, rooms, days, "min_price"))
+    upper = np.minimum(current * (1 + MAX_INCREASE), _grid(max_price, rooms, days, "max_price"))
+    optimized = np.clip(target, lower, np.maximum(lower, upper))
+    clamped = ~np.isclose(optimized, target)
+
+    delta = np.where(current > 0, (optimized - current) / np.where(current > 0, current, 1) * 100, 100.0)
+    changed = np.abs(delta) >= MIN_CHANGE_PCT
+    optimized = np.where(changed, optimized, current)
+    delta = np.where(changed, delta, 0.0)
+
+    return {
+        "base_price": np.round(base, 2),
+        "optimized_price": np.round(optimized, 2),
+        "delta_percentage": np.round(delta, 2),
+        "clamped": clamped,
+        "changed": changed,
+    }
+
+
+def local_price(current_price: float, occupancy: float, competitor_prices: List[float], seasonality: float = 1.0) -> float:
+    """Prezzo ottimizzato per una singola cella (fallback locale delle completion di pricing)."""
+    return float(compute_prices(current_price, occupancy, competitor_prices, seasonality)["optimized_price"][0, 0])
+
+
+# ░░░ CALENDARIO STRUTTURA ░░░
+def _valid_price(value: Any) -> bool:
+    try:
+        return np.isfinite(float(value)) and float(value) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def _dates(start: Optional[str], days: int) -> List[str]:
+    first = date.fromisoformat(start) if start else datetime.utcnow().date()
+    return [(first + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def price_calendar(calendar: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    calendar = {
+        "property_id": "main", "start_date": "YYYY-MM-DD", "days": 365,
+        "rooms": [{"room_id": "std", "current_price": 120, "min_price": 80, "max_price": 250}, ...],
+        "occupancy": D | R×D, "competitor_prices": C | D×C | R×D×C, "seasonality": D | scalare
+    }
+    """
+    rooms = calendar.get("rooms") or []
+    if not calendar.get("property_id") or not rooms:
+        raise ValueError("❌ property_id e rooms sono obbligatori")
+    # 🛡️ Senza prezzo attuale valido la riga sarebbe tutta NaN: meglio un errore esplicito
+    invalid = [str(r.get("room_id") or i) for i, r in enumerate(rooms) if not _valid_price(r.get("current_price"))]
+    if invalid:
+        raise ValueError(f"❌ current_price mancante o non positivo per le camere: {', '.join(invalid)}")
+    seasonality = calendar.get("seasonality", 1.0)
+    days = int(calendar.get("days") or (np.size(seasonality) if np.ndim(seasonality) else 1))
+
+    def per_room(field: str, default: float) -> np.ndarray:
+        return np.array([[r.get(field) or default] for r in rooms], dtype=np.float64)  # colonna R×1
+
+    result = compute_prices(
+        current_price=per_room("current_price", np.nan),
+        occupancy=calendar.get("occupancy", OCCUPANCY_TARGET),
+        competitor_prices=calendar["competitor_prices"],
+        seasonality=seasonality,
+        min_price=per_room("min_price", 0.0),
+        max_price=per_room("max_price", np.inf),
+        rooms=len(rooms),
+        days=days,
+    )
+    return {
+        "property_id": calendar["property_id"],
+        "room_ids": [str(r.get("room_id") or i) for i, r in enumerate(rooms)],
+        "dates": _dates(calendar.get("start_date"), days),
+        **result,
+    }
+
+
+def _mean(values: np.ndarray) -> Optional[float]:
+    """Media delle sole celle finite (None se non ce ne sono): mai NaN/inf nei riepiloghi."""
+    values = np.where(np.isfinite(values), values, np.nan)
+    if np.isnan(values).all():
+        return None
+    return round(float(np.nanmean(values)), 2)
+
+
+def _series(values: np.ndarray) -> List[Optional[float]]:
+    """Serie giornaliera persistibile: celle non finite → None."""
+    return [float(v) if np.isfinite(v) else None for v in values]
+
+
+def summarize(priced: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "property_id": priced["property_id"],
+        "rooms": len(priced["room_ids"]),
+        "days": len(priced["dates"]),
+        "cells_changed": int(priced["changed"].sum()),
+        "cells_clamped": int(priced["clamped"].sum()),
+        "avg_optimized_price": _mean(priced["optimized_price"]),
+        "avg_delta_percentage": _mean(priced["delta_percentage"]),
+    }
+
+
+# ░░░ PERSISTENZA ░░░
+async def _commit(ops) -> None:
+    from firebase_config import async_db  # import locale: il calcolo resta usabile senza credenziali Firestore
+
+    batch = async_db.batch()
+    for ref, data in ops:
+        batch.set(ref, data)
+    await batch.commit()
+
+
+async def save_calendars(user_id: str, priced_calendars: List[Dict[str, Any]]) -> int:
+    """Un documento per camera (serie giornaliere come array) + riepilogo per struttura."""
+    from firebase_config import async_db
+
+    now = datetime.utcnow()
+    ops = []
+    for priced in priced_calendars:
+        property_ref = async_db.collection("DynamicPricing").document(priced["property_id"])
+        ops.append((property_ref, {  # riepilogo del primo giorno (compatibile con il documento storico)
+            "userId": user_id,
+            "propertyId": priced["property_id"],
+            "optimized_price": _mean(priced["optimized_price"][:, 0]),
+            "base_price": _mean(priced["base_price"][:, 0]),
+            "delta_percentage": _mean(priced["delta_percentage"][:, 0]),
+            "calendar": summarize(priced),
+            "generatedAt": now,
+        }))
+        for i, room_id in enumerate(priced["room_ids"]):
+            ops.append((property_ref.collection("calendar").document(room_id), {
+                "userId": user_id,
+                "roomId": room_id,
+                "dates": priced["dates"],
+                "base_price": _series(priced["base_price"][i]),
+                "optimized_price": _series(priced["optimized_price"][i]),
+                "delta_percentage": _series(priced["delta_percentage"][i]),
+                "generatedAt": now,
+            }))
+
+    # ⚡ Chunk da 500 committati in parallelo (al massimo PARALLEL_BATCHES alla volta)
+    chunks = [ops[i:i + BATCH_SIZE] for i in range(0, len(ops), BATCH_SIZE)]
+    for i in range(0, len(chunks), PARALLEL_BATCHES):
+        await asyncio.gather(*(_commit(chunk) for chunk in chunks[i:i + PARALLEL_BATCHES]))
+    return len(ops)
@@ -0,0 +1,100 @@
+"""
+profileCache.py
+Cache per processo del profilo struttura (ai_agent_hub/{user}/properties/main).
+LRU limitata tra tenant, invalidata dalle scritture sulla sottocollezione "properties"
+(POST /agent/profile) e con TTL di sicurezza per scritture fatte da altri worker.
+Ogni snapshot porta con sé le viste derivate usate dai dispatcher (es. servizi in minuscolo).
+"""
+
+import asyncio
+import copy
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional
+
+from utils.hubRepository import PropertyProfile, hub, on_write
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "2000"))  # tenant in cache
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))  # secondi
+
+
+class ProfileSnapshot:
+    """Profilo struttura + viste derivate calcolate una sola volta per versione."""
+
+    __slots__ = ("user_id", "data", "exists", "services", "services_lower")
+
+    def __init__(self, user_id: str, data: Optional[Dict[str, Any]]):
+        self.user_id = user_id
+        self.exists = data is not None
+        self.data: PropertyProfile = data or {}
+        self.services = tuple((self.data.get("services") or []) + (self.data.get("extraServices") or []))
+        self.services_lower: FrozenSet[str] = frozenset(s.strip().lower() for s in self.services if s)
+
+    def has_service(self, name: str) -> bool:
+        return name.strip().lower() in self.services_lower
+
+    def profile(self) -> PropertyProfile:
+        """Copia profonda del profilo (anche liste e mappe annidate modificabili senza sporcare la cache)."""
+        return copy.deepcopy(self.data)
+
+
+_entries: "OrderedDict[str, tuple]" = OrderedDict()  # user_id → (expires_at, snapshot)
+_inflight: Dict[str, asyncio.Task] = {}
+_generation: Dict[str, int] = {}
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+@on_write
+def invalidate_profile(user_id: str, collection: str = "properties") -> None:
+    """Scrittura sul profilo → lo snapshot del tenant viene scartato."""
+    if collection != "properties":
+        return
+    _generation[user_id] = _generation.get(user_id, 0) + 1
+    if _entries.pop(user_id, None):
+        _stats["invalidations"] += 1
+
+
+async def _load(user_id: str) -> ProfileSnapshot:
+    generation = _generation.get(user_id, 0)
+    try:
+        snapshot = ProfileSnapshot(user_id, await hub(user_id).properties.get("main"))
+    finally:
+        _inflight.pop(user_id, None)
+    # 🔁 Non mettere in cache un profilo invalidato mentre la lettura era in corso
+    if _generation.get(user_id, 0) == generation:
+        _entries[user_id] = (time.monotonic() + PROFILE_CACHE_TTL, snapshot)
+        _entries.move_to_end(user_id)
+        while len(_entries) > PROFILE_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return snapshot
+
+
+async def get_snapshot(user_id: str) -> ProfileSnapshot:
+    entry = _entries.get(user_id)
+    if entry and entry[0] > time.monotonic():
+        _entries.move_to_end(user_id)
+        _stats["hits"] += 1
+        return entry[1]
+
+    # ⚡ Miss concorrenti sullo stesso tenant condividono una sola lettura Firestore
+    _stats["misses"] += 1
+    task = _inflight.get(user_id)
+    if task is None:
+        task = asyncio.create_task(_load(user_id))
+        _inflight[user_id] = task
+    return await asyncio.shield(task)
+
+
+async def get_profile(user_id: str) -> PropertyProfile:
+    """Come HubRepository.get_profile(), ma servito dalla cache ({} se assente)."""
+    return (await get_snapshot(user_id)).profile()
+
+
+def get_stats() -> dict:
+    return {**_stats, "size": len(_entries), "max_size": PROFILE_CACHE_SIZE, "ttl": PROFILE_CACHE_TTL}
+
+
+def clear():
+    _entries.clear()
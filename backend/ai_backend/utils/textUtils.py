@@ -0,0 +1,16 @@
+"""
+textUtils.py
+Normalizzazione testo condivisa (intent locale, cache FAQ/intent, keyword matcher, upsell).
+Solo libreria standard: importabile ovunque senza tirarsi dietro Firestore o OpenAI.
+"""
+
+import re
+import unicodedata
+
+
+def normalize(text: str) -> str:
+    """Minuscolo, senza accenti né punteggiatura, spazi compattati."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
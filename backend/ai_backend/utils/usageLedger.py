@@ -0,0 +1,182 @@
+"""
+usageLedger.py
+Contabilità token OpenAI: il gateway registra response.usage di ogni completion,
+i totali si accumulano in memoria e vengono scaricati periodicamente come Increment
+su rollup giornalieri shardati (per modello/dispatcher) e per utente.
+Lo spending admin si calcola leggendo NUM_SHARDS documenti, non il log grezzo.
+"""
+
+import asyncio
+import os
+import random
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional
+
+from google.cloud.firestore import Increment
+
+from firebase_config import async_db
+
+COLLECTION = "usage_rollups"
+NUM_SHARDS = int(os.getenv("USAGE_SHARDS", "10"))  # evita il limite ~1 write/s per documento
+FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "10"))  # secondi
+BATCH_SIZE = 500
+
+# 💶 Prezzi USD per 1K token (prompt, completion)
+MODEL_PRICING = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+DEFAULT_PRICING = MODEL_PRICING["gpt-4"]  # modelli sconosciuti: stima prudente
+
+_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "total_tokens", "latency_ms")
+
+# (giorno, sezione, chiave) → contatori; sezione = models | dispatchers | users
+_pending: Dict[tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(_FIELDS, 0))
+_worker = None
+
+
+def _field_key(name: str) -> str:
+    """Nomi modello come chiave mappa Firestore (niente punti nei field path)."""
+    return name.replace(".", "_")
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_rate, completion_rate = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    return prompt_tokens / 1000 * prompt_rate + completion_tokens / 1000 * completion_rate
+
+
+def record(model: str, usage, source: Optional[str] = None, user_id: Optional[str] = None, latency_ms: int = 0):
+    """Registra l'usage di una completion (sincrono, solo memoria)."""
+    if usage is None:
+        return
+    day = datetime.utcnow().strftime("%Y-%m-%d")
+    values = {
+        "calls": 1,
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+        "latency_ms": int(latency_ms),
+    }
+    keys = [(day, "models", _field_key(model)), (day, "dispatchers", source or "unknown")]
+    if user_id:
+        keys.append((day, "users", user_id))
+    for key in keys:
+        counters = _pending[key]
+        for field, value in values.items():
+            counters[field] += value
+    if user_id:
+        # 💶 Costo per utente calcolato all'ingresso (il rollup utente non è suddiviso per modello)
+        cost = estimate_cost(model, values["prompt_tokens"], values["completion_tokens"])
+        _pending[(day, "users", user_id)].setdefault("cost_micro_usd", 0)
+        _pending[(day, "users", user_id)]["cost_micro_usd"] += int(cost * 1_000_000)
+    _ensure_worker()
+
+
+def _ensure_worker():
+    global _worker
+    if _worker and not _worker.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _worker = loop.create_task(_run())
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        await flush()
+
+
+async def flush():
+    """Scarica i contatori in memoria come Increment (shard casuale per i totali giornalieri)."""
+    if not _pending:
+        return
+    # 📸 Snapshot: i record() concorrenti finiscono in un _pending nuovo, i chunk falliti vi vengono sommati
+    drained = dict(_pending)
+    _pending.clear()
+
+    shard_docs: Dict[str, dict] = {}
+    user_docs: Dict[tuple, dict] = {}
+    sources: Dict[tuple, list] = defaultdict(list)  # documento → chiavi _pending che contiene
+    for (day, section, key), counters in drained.items():
+        increments = {field: Increment(value) for field, value in counters.items() if value}
+        if section == "users":
+            user_docs[(day, key)] = {"date": day, "userId": key, **increments}
+            sources[("users", day, key)].append((day, section, key))
+        else:
+            shard_docs.setdefault(day, {"date": day}).setdefault(section, {})[key] = increments
+            sources[("shards", day)].append((day, section, key))
+
+    writes = []
+    for day, data in shard_docs.items():
+        shard = str(random.randrange(NUM_SHARDS))
+        ref = async_db.collection(COLLECTION).document(day).collection("shards").document(shard)
+        writes.append((ref, data, sources[("shards", day)]))
+    for (day, user_id), data in user_docs.items():
+        ref = async_db.collection(COLLECTION).document(day).collection("users").document(user_id)
+        writes.append((ref, data, sources[("users", day, user_id)]))
+
+    for start in range(0, len(writes), BATCH_SIZE):
+        chunk = writes[start:start + BATCH_SIZE]
+        batch = async_db.batch()
+        for ref, data, _ in chunk:
+            batch.set(ref, data, merge=True)
+        try:
+            await batch.commit()
+        except Exception as e:
+            print(f"[USAGE] ❌ Flush rollup fallito: {e}")
+            _requeue(drained, [key for _, _, keys in chunk for key in keys])
+
+
+def _requeue(drained: Dict[tuple, Dict[str, int]], keys) -> None:
+    """🔁 Rimette in _pending i contatori non scritti (sommati a quelli arrivati nel frattempo)."""
+    for key in keys:
+        counters = _pending[key]
+        for field, value in drained[key].items():
+            counters[field] = counters.get(field, 0) + value
+
+
+async def shutdown():
+    global _worker
+    if _worker and not _worker.done():
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+    _worker = None
+    await flush()
+
+
+async def get_daily_usage(day: str) -> dict:
+    """Somma gli shard del giorno: NUM_SHARDS letture, indipendenti dal numero di chiamate."""
+    by_model: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(_FIELDS, 0))
+    by_dispatcher: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(_FIELDS, 0))
+    shards = async_db.collection(COLLECTION).document(day).collection("shards")
+    async for doc in shards.stream():
+        data = doc.to_dict()
+        for section, target in (("models", by_model), ("dispatchers", by_dispatcher)):
+            for key, counters in (data.get(section) or {}).items():
+                for field in _FIELDS:
+                    target[key][field] += counters.get(field, 0)
+
+    pricing_by_key = {_field_key(model): model for model in MODEL_PRICING}
+    total_cost = 0.0
+    for key, counters in by_model.items():
+        model = pricing_by_key.get(key, key)
+        counters["estimated_cost_usd"] = round(
+            estimate_cost(model, counters["prompt_tokens"], counters["completion_tokens"]), 4
+        )
+        total_cost += counters["estimated_cost_usd"]
+
+    return {
+        "date": day,
+        "total_tokens": sum(c["total_tokens"] for c in by_model.values()),
+        "calls": sum(c["calls"] for c in by_model.values()),
+        "estimated_cost_usd": round(total_cost, 4),
+        "by_model": dict(by_model),
+        "by_dispatcher": dict(by_dispatcher),
+    }
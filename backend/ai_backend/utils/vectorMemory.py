@@ -0,0 +1,222 @@
+"""
+vectorMemory.py
+Memoria a lungo termine vettoriale con backend intercambiabili.
+- LocalVectorStore: matrice embedding float32 memory-mapped per tenant + sidecar metadati
+  (JSONL), ricerca top-k esatta o IVF quando la matrice cresce. Funziona offline.
+- WeaviateBackend: adapter opzionale con un unico client long-lived.
+Embedding di default locale (hashing di n-grammi di caratteri), nessuna chiamata di rete.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import weaviate  # type: ignore[import]
+except ImportError:
+    weaviate = None  # adapter Weaviate disattivato se la libreria manca
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")  # auto | local | weaviate | none
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "vector_store"))
+EMBEDDING_DIM = int(os.getenv("VECTOR_EMBEDDING_DIM", "512"))
+IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "5000"))  # sotto: ricerca esatta
+IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+
+
+# ░░░ EMBEDDING LOCALE ░░░
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Hashing trick su n-grammi di caratteri (3-4) → vettore L2-normalizzato."""
+    vector = np.zeros(dim, dtype=np.float32)
+    padded = f" {' '.join(text.lower().split())} "
+    for n in (3, 4):
+        for i in range(len(padded) - n + 1):
+            digest = hashlib.blake2b(padded[i:i + n].encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _tenant_dir(user_id: str) -> str:
+    return os.path.join(VECTOR_STORE_DIR, re.sub(r"[^A-Za-z0-9_-]", "_", user_id))
+
+
+# ░░░ STORE LOCALE PER TENANT ░░░
+class TenantStore:
+    """embeddings.f32 (N×D float32, append-only) + meta.jsonl (una riga per vettore) + ivf.npz."""
+
+    def __init__(self, path: str, dim: int = EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        self.vectors_path = os.path.join(path, "embeddings.f32")
+        self.meta_path = os.path.join(path, "meta.jsonl")
+        self.ivf_path = os.path.join(path, "ivf.npz")
+        self._matrix = None
+        self._meta: List[Dict] = []
+        self._ivf = None
+        self._lock = threading.RLock()  # add/build/search girano in thread diversi (asyncio.to_thread)
+        self._load()
+
+    @property
+    def rows(self) -> int:
+        return len(self._meta)
+
+    def _load(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding="utf-8") as f:
+                self._meta = [json.loads(line) for line in f if line.strip()]
+        self._matrix = None
+        if os.path.exists(self.ivf_path):
+            data = np.load(self.ivf_path)
+            self._ivf = (data["centroids"], data["assignments"])
+
+    def matrix(self) -> np.ndarray:
+        """Memmap di sola lettura (riaperto dopo ogni append)."""
+        if self._matrix is None or self._matrix.shape[0] != self.rows:
+            if not self.rows:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+        return self._matrix
+
+    def add(self, vector: np.ndarray, metadata: Dict):
+        with self._lock:
+            self._append(vector, metadata)
+
+    def _append(self, vector: np.ndarray, metadata: Dict):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.asarray(vector, dtype=np.float32).tobytes())
+        with open(self.meta_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(metadata, ensure_ascii=False, default=str) + "\n")
+        self._meta.append(metadata)
+        self._matrix = None
+        # 🧭 (Ri)costruisce l'indice IVF quando la matrice è raddoppiata dall'ultimo build
+        built_rows = len(self._ivf[1]) if self._ivf else 0
+        if self.rows >= IVF_MIN_ROWS and self.rows >= 2 * max(built_rows, IVF_MIN_ROWS // 2):
+            self._build_ivf()
+
+    def build_ivf(self, iterations: int = 10):
+        """k-means sferico: nlist ≈ √N centroidi, assegnazione di ogni riga al più vicino."""
+        with self._lock:
+            self._build_ivf(iterations)
+
+    def _build_ivf(self, iterations: int = 10):
+        matrix = np.asarray(self.matrix())
+        nlist = max(1, int(np.sqrt(len(matrix))))
+        rng = np.random.default_rng(0)
+        centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = matrix[assignments == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm else centroid
+        assignments = np.argmax(matrix @ centroids.T, axis=1)
+        np.savez(self.ivf_path, centroids=centroids, assignments=assignments)
+        self._ivf = (centroids, assignments)
+
+    def search(self, query: np.ndarray, k: int) -> List[Dict]:
+        with self._lock:
+            return self._search(query, k)
+
+    def _search(self, query: np.ndarray, k: int) -> List[Dict]:
+        matrix = self.matrix()
+        if not len(matrix):
+            return []
+
+        if self._ivf is not None:
+            centroids, assignments = self._ivf
+            probe = np.argsort(-(centroids @ query))[:IVF_NPROBE]
+            candidates = np.flatnonzero(np.isin(assignments, probe))
+            tail = np.arange(len(assignments), len(matrix))  # righe aggiunte dopo il build
+            candidates = np.concatenate([candidates, tail])
+        else:
+            candidates = np.arange(len(matrix))
+
+        scores = matrix[candidates] @ query
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**self._meta[candidates[i]], "score": float(scores[i])} for i in top]
+
+    def recent(self, k: int) -> List[Dict]:
+        with self._lock:
+            return list(reversed(self._meta[-k:]))
+
+
+class LocalVectorStore:
+    name = "local"
+
+    def __init__(self, root: str = VECTOR_STORE_DIR):
+        self.root = root
+        self._tenants: Dict[str, TenantStore] = {}
+
+    def _tenant(self, user_id: str) -> TenantStore:
+        if user_id not in self._tenants:
+            self._tenants[user_id] = TenantStore(_tenant_dir(user_id))
+        return self._tenants[user_id]
+
+    async def add(self, user_id: str, text: str, metadata: Optional[Dict] = None):
+        record = {"text": text, "createdAt": datetime.utcnow().isoformat(), **(metadata or {})}
+        await asyncio.to_thread(self._tenant(user_id).add, embed_text(text), record)
+
+    async def search(self, user_id: str, query: Optional[str], k: int) -> List[Dict]:
+        tenant = self._tenant(user_id)
+        if not query:
+            return tenant.recent(k)
+        return await asyncio.to_thread(tenant.search, embed_text(query), k)
+
+
+# ░░░ ADAPTER WEAVIATE ░░░
+class WeaviateBackend:
+    name = "weaviate"
+
+    def __init__(self, url: str, api_key: str):
+        # 🔌 Un solo client per processo (pool HTTP riutilizzato tra le richieste)
+        self.client = weaviate.Client(url=url, additional_headers={"X-OpenAI-Api-Key": api_key})
+
+    def _query(self, user_id: str, query: Optional[str], k: int) -> List[Dict]:
+        q = (
+            self.client.query.get("MemoryChunk", ["text", "createdAt"])
+            .with_where({"path": ["userId"], "operator": "Equal", "valueString": user_id})
+            .with_limit(k)
+        )
+        if query:
+            q = q.with_near_text({"concepts": [query]})
+        result = q.do()
+        return result.get("data", {}).get("Get", {}).get("MemoryChunk", []) or []
+
+    async def search(self, user_id: str, query: Optional[str], k: int) -> List[Dict]:
+        return await asyncio.to_thread(self._query, user_id, query, k)
+
+    async def add(self, user_id: str, text: str, metadata: Optional[Dict] = None):
+        record = {"text": text, "createdAt": datetime.utcnow().isoformat(), "userId": user_id, **(metadata or {})}
+        await asyncio.to_thread(self.client.data_object.create, record, "MemoryChunk")
+
+
+# ░░░ SELEZIONE BACKEND ░░░
+_backend = None
+_resolved = False
+
+
+def get_backend():
+    """Backend configurato (creato una volta sola), None se la memoria vettoriale è disattivata."""
+    global _backend, _resolved
+    if _resolved:
+        return _backend
+    url, api_key = os.getenv("VECTOR_DB_URL"), os.getenv("VECTOR_DB_API_KEY")
+    weaviate_ready = weaviate is not None and url and api_key
+    if VECTOR_BACKEND == "weaviate" or (VECTOR_BACKEND == "auto" and weaviate_ready):
+        _backend = WeaviateBackend(url, api_key) if weaviate_ready else None
+    elif VECTOR_BACKEND in ("auto", "local"):
+        _backend = LocalVectorStore()
+    _resolved = True
+    return _backend
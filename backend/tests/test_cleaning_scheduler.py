@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ai_backend"))
+
+from utils.cleaningScheduler import DEFAULT_SHIFT_START, build_schedule, normalize_rooms, normalize_staff
+
+
+def test_none_and_empty_items_are_skipped():
+    rooms = normalize_rooms([None, "", "  ", "101", {"room": "102"}], [None, ""])
+    assert [r["room"] for r in rooms] == ["101", "102"]
+    assert [m["name"] for m in normalize_staff([None, "", "Anna"])] == ["Anna"]
+
+
+def test_midnight_shift_start_is_kept():
+    staff = normalize_staff([{"name": "Night", "start": "00:00"}, {"name": "Day"}])
+    assert staff[0]["start"] == 0
+    assert staff[1]["start"] == int(DEFAULT_SHIFT_START[:2]) * 60 + int(DEFAULT_SHIFT_START[3:])
+
+
+def test_priority_rooms_are_scheduled_first():
+    schedule = build_schedule(
+        checkouts=["301", "101", {"room": "205", "room_type": "suite"}],
+        checkins=[{"room": "205", "checkin_time": "14:00"}],
+        staff=[{"name": "Anna", "start": "10:00"}],
+    )
+    rooms = schedule["assignments"][0]["rooms"]
+    assert rooms[0]["room"] == "205" and rooms[0]["priority"]
+    assert schedule["summary"]["assigned"] == 3
+    assert schedule["summary"]["late_priority_rooms"] == 0
+
+
+def test_rooms_beyond_capacity_are_unassigned():
+    schedule = build_schedule(["101", "102"], [], [{"name": "Anna", "shift_minutes": 40}])
+    assert schedule["summary"]["assigned"] == 1
+    assert [r["room"] for r in schedule["unassigned"]] == ["102"]
+
+
+def test_no_staff_leaves_everything_unassigned():
+    schedule = build_schedule(["101"], [], [])
+    assert schedule["unassigned"][0]["reason"] == "nessuno staff disponibile"
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ai_backend"))
+
+from utils.keywordMatcher import KeywordMatcher, Match, longest_match
+
+
+def test_normalized_variants_match():
+    matcher = KeywordMatcher([("check-in", "checkin")])
+    for text in ("Check-in alle 15?", "orario CHECK IN", "check in"):
+        assert [m.value for m in matcher.find_all(text)] == ["checkin"]
+
+
+def test_overlapping_and_multiple_values():
+    matcher = KeywordMatcher([("he", 1), ("she", 2), ("hers", 3), ("he", 4)])
+    values = sorted(m.value for m in matcher.find_all("ushers"))
+    assert values == [1, 2, 3, 4]
+
+
+def test_offsets_point_into_normalized_text():
+    matcher = KeywordMatcher([("colazione", "faq")])
+    text = "a che ora e la colazione"
+    (match,) = matcher.find_all(text, normalized=True)
+    assert text[match.start:match.end] == "colazione"
+
+
+def test_no_match_and_empty_keywords():
+    matcher = KeywordMatcher([("", "x"), ("wifi", "faq")])
+    assert matcher.find_all("parcheggio") == []
+
+
+def test_longest_match_wins_then_leftmost():
+    matches = [Match(0, 4, "late", 1), Match(5, 18, "late checkout", 2), Match(20, 28, "checkout", 3)]
+    assert longest_match(matches).value == 2
+    assert longest_match([Match(6, 10, "bbbb", 1), Match(0, 4, "aaaa", 2)]).value == 2
+    assert longest_match([]) is None
@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ai_backend"))
+
+import pytest
+
+from utils import localIntentModel
+from utils.localIntentModel import LOCAL_INTENT_THRESHOLD, NgramNaiveBayes, keyword_scores, normalize, predict
+
+
+@pytest.fixture(autouse=True)
+def untrained_model(monkeypatch):
+    monkeypatch.setattr(localIntentModel, "_model", NgramNaiveBayes())
+
+
+@pytest.mark.parametrize("message", ["eventuale rimborso", "Eventualmente posso pagare dopo?", "come ricavare il codice", "fatturazione elettronica"])
+def test_prefix_false_positives_do_not_match(message):
+    intent, _ = keyword_scores(normalize(message))
+    assert intent not in ("event", "revenue")
+
+
+def test_eventuale_rimborso_is_not_auto_dispatched():
+    intent, confidence = predict("eventuale rimborso")
+    assert intent != "event" or confidence < LOCAL_INTENT_THRESHOLD
+
+
+@pytest.mark.parametrize("message,intent", [("crea un evento", "event"), ("ricavi del mese", "revenue"), ("fatturato di luglio", "revenue")])
+def test_anchored_keywords_still_match(message, intent):
+    assert keyword_scores(normalize(message))[0] == intent
+
+
+def test_single_keyword_stays_below_threshold():
+    intent, confidence = predict("crea un evento")
+    assert intent == "event"
+    assert confidence < LOCAL_INTENT_THRESHOLD
+
+
+def test_keyword_backed_by_naive_bayes_passes_threshold(monkeypatch):
+    model = NgramNaiveBayes()
+    for i in range(30):
+        model.learn(normalize(f"crea un evento per sabato {i}"), "event")
+        model.learn(normalize(f"genera il report mensile {i}"), "report")
+    monkeypatch.setattr(localIntentModel, "_model", model)
+
+    intent, confidence = predict("crea un evento per domenica")
+    assert intent == "event"
+    assert confidence >= LOCAL_INTENT_THRESHOLD
@@ -0,0 +1,45 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ai_backend"))
+
+import pytest
+
+from utils.pricingCompletion import PRICE_FUNCTION, extract_price, parse_price_text, price_bounds, resolve_price
+
+
+def _message(content=None, arguments=None):
+    calls = [SimpleNamespace(function=SimpleNamespace(name=PRICE_FUNCTION, arguments=arguments))] if arguments else None
+    return SimpleNamespace(content=content, tool_calls=calls)
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("Consiglio 129,90 € a notte", 129.90),
+    ("Suggested price: 1,234.50 EUR", 1234.50),
+    ("prezzo 1.234,50 €", 1234.50),
+    ('{"price": 142.5, "reason": "alta stagione"}', 142.5),
+    ('{"prezzo": "135,00 €"}', 135.0),
+])
+def test_parse_price_formats(text, expected):
+    assert parse_price_text(text) == pytest.approx(expected)
+
+
+def test_percentages_are_not_prices():
+    assert parse_price_text("Occupazione al 85%, consiglio 130") == 130
+
+
+def test_closest_to_base_price_without_currency():
+    assert parse_price_text("Tra 90 e 128 direi 128", base_price=125) == 128
+
+
+def test_tool_call_arguments_win_over_content():
+    assert extract_price(_message("forse 99 €", '{"price": 131}'), 120) == 131
+
+
+def test_resolve_price_sources():
+    lower, upper = price_bounds(100)
+    assert resolve_price(_message("119 €"), 100, 105) == (119, "llm")
+    assert resolve_price(_message("999 €"), 100, 105) == (upper, "llm_clamped")
+    assert resolve_price(_message("1 €"), 100, 105) == (lower, "llm_clamped")
+    assert resolve_price(_message("non saprei"), 100, 105.123) == (105.12, "local_fallback")
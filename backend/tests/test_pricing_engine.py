@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ai_backend"))
+
+import numpy as np
+import pytest
+
+from utils.pricingEngine import MAX_INCREASE, compute_prices, local_price, price_calendar, summarize
+
+
+def _calendar(**overrides):
+    calendar = {
+        "property_id": "main",
+        "start_date": "2026-07-01",
+        "days": 3,
+        "rooms": [{"room_id": "std", "current_price": 100}, {"room_id": "suite", "current_price": 200, "max_price": 210}],
+        "occupancy": [0.5, 0.7, 0.95],
+        "competitor_prices": [110, 130],
+    }
+    calendar.update(overrides)
+    return calendar
+
+
+def test_calendar_shapes_and_dates():
+    priced = price_calendar(_calendar())
+    assert priced["optimized_price"].shape == (2, 3)
+    assert priced["dates"] == ["2026-07-01", "2026-07-02", "2026-07-03"]
+    assert np.isfinite(priced["optimized_price"]).all()
+
+
+def test_guard_rails_cap_increase():
+    priced = price_calendar(_calendar(occupancy=1.0, competitor_prices=[1000]))
+    assert (priced["optimized_price"][0] <= 100 * (1 + MAX_INCREASE) + 1e-9).all()
+    assert (priced["optimized_price"][1] <= 210).all()
+    assert priced["clamped"].all()
+
+
+@pytest.mark.parametrize("price", [None, 0, -10, "n/d"])
+def test_missing_or_invalid_current_price_is_rejected(price):
+    rooms = [{"room_id": "std", "current_price": 100}, {"room_id": "broken", "current_price": price}]
+    with pytest.raises(ValueError, match="broken"):
+        price_calendar(_calendar(rooms=rooms))
+
+
+def test_summary_ignores_non_finite_cells():
+    priced = price_calendar(_calendar())
+    priced["optimized_price"] = priced["optimized_price"].copy()
+    priced["optimized_price"][0, 0] = np.nan
+    summary = summarize(priced)
+    assert np.isfinite(summary["avg_optimized_price"])
+
+
+def test_small_changes_keep_current_price():
+    result = compute_prices(100, 0.7, [100])
+    assert not result["changed"].any()
+    assert local_price(100, 0.7, [100]) == 100